@@ -0,0 +1,78 @@
+"""Measure in-process throughput of the ingest pipeline (normalize + analytics).
+
+Usage:
+    python benchmarks/bench_ingest_pipeline.py [--lines 200000] [--batch-size 200] [--workers 4]
+
+Feeds synthetic batches through IngestPipeline with the same in-memory
+consumers the engine uses (LogStore, LogAnalytics, RollupEngine) and a
+no-op persist, so the number is the per-process ceiling before Mongo and
+HTTP parsing. Compare it with the 50k lines/s target.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.ingest_pipeline import IngestPipeline  # noqa: E402
+from utils.log_analytics import LogAnalytics  # noqa: E402
+from utils.log_store import LogStore  # noqa: E402
+from utils.rollups import RollupEngine  # noqa: E402
+
+SERVICES = ["auth_service", "order_service", "catalog_service"]
+LEVELS = ["info", "INFO", "warn", "ERROR"]
+
+
+def make_batches(lines, batch_size):
+    now = datetime.utcnow()
+    batches = []
+    for start in range(0, lines, batch_size):
+        batches.append([{
+            "timestamp": (now - timedelta(seconds=random.randint(0, 3600))).isoformat() + "Z",
+            "level": random.choice(LEVELS),
+            "service": random.choice(SERVICES),
+            "message": "GET /api/items 200",
+            "status_code": random.choice([200, 200, 404, 500]),
+            "latency_ms": round(random.expovariate(1 / 120), 2),
+        } for _ in range(min(batch_size, lines - start))])
+    return batches
+
+
+async def run(args):
+    store = LogStore(max_entries=args.lines)
+    analytics = LogAnalytics()
+    rollups = RollupEngine()
+
+    def process(logs):
+        store.extend(logs)
+        analytics.add_many(logs)
+        rollups.add_many(logs)
+
+    async def persist(logs):
+        return None
+
+    pipeline = IngestPipeline(process, persist, workers=args.workers, max_pending=args.lines + 1)
+    batches = make_batches(args.lines, args.batch_size)
+    runner = asyncio.create_task(pipeline.run())
+    started = time.perf_counter()
+    for batch in batches:
+        pipeline.submit(batch)
+    while pipeline.pending:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - started
+    runner.cancel()
+    await asyncio.gather(runner, return_exceptions=True)
+    print(f"{pipeline.processed:,} lines in {elapsed:.2f}s -> {pipeline.processed / elapsed:,.0f} lines/s "
+          f"({args.workers} workers, batches of {args.batch_size})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,108 @@
+"""Aggregation over the log store: NumPy columns versus the pure-Python paths.
+
+Usage:
+    python benchmarks/bench_log_columns.py [--rows 1000000] [--interval 300]
+
+Fills a LogStore with ``--rows`` logs spread over the last 24 hours, then
+times three queries:
+
+- service summary: requests, errors, avg/p95/p99 latency for one service
+- bucketed: the same figures per ``--interval`` bucket across all services
+- per service and bucket
+
+each computed three ways: iterating the stored records and sorting in
+Python (what the handlers did before), utils.log_columns on ``array``
+columns without NumPy, and utils.log_columns with NumPy (boolean masks,
+floor_divide + bincount, one lexsort for every group's percentiles).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import log_columns  # noqa: E402
+from utils.log_store import LogStore  # noqa: E402
+from utils.timeparse import EPOCH_FIELD  # noqa: E402
+
+SERVICES = ["auth_service", "order_service", "catalog_service", "payment_service", "search_service"]
+
+
+def fill(rows):
+    store = LogStore(max_entries=rows, max_age_seconds=None)
+    start = time.time() - 24 * 3600
+    step = 24 * 3600 / rows
+    for i in range(rows):
+        failed = random.random() < 0.05
+        store.append({
+            "timestamp": "",
+            EPOCH_FIELD: start + i * step,
+            "level": "ERROR" if failed else "INFO",
+            "service": random.choice(SERVICES),
+            "message": "request",
+            "status_code": 500 if failed else 200,
+            "latency_ms": random.expovariate(1 / 120),
+            "error_type": "http_500" if failed else None,
+            "is_error": failed,
+        })
+    return store
+
+
+def records_baseline(store, service=None, interval=None, by_service=False):
+    """Dict-of-lists grouping and sorted percentiles over the stored records."""
+    groups = {}
+    for record in store.query(service=service, records=True):
+        key = (record.service if by_service else None, int(record.ts // interval) * interval if interval else None)
+        group = groups.setdefault(key, [0, 0, []])
+        group[0] += 1
+        group[1] += bool(record.is_error)
+        if record.latency_ms is not None:
+            group[2].append(record.latency_ms)
+    for group in groups.values():
+        values = sorted(group[2])
+        group[2] = [values[int((len(values) - 1) * p / 100)] for p in (50, 95, 99)] if values else None
+    return groups
+
+
+def best_of(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--interval", type=int, default=300)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    store = fill(args.rows)
+    print(f"filled {args.rows:,} rows in {time.perf_counter() - started:.1f}s")
+
+    queries = (
+        ("service summary", dict(service=SERVICES[1])),
+        ("bucketed", dict(interval=args.interval)),
+        ("service x bucket", dict(interval=args.interval, by_service=True)),
+    )
+    for label, kwargs in queries:
+        print(f"\n{label}")
+        baseline = best_of(lambda: records_baseline(store, **kwargs))
+        print(f"  {'records':<8} {baseline * 1000:9.1f} ms")
+        for backend in ("python", "numpy"):
+            if log_columns.use_backend(backend) != backend:
+                print(f"  {backend:<8} (not installed)")
+                continue
+            seconds = best_of(lambda: store.aggregate(**kwargs))
+            print(f"  {backend:<8} {seconds * 1000:9.1f} ms  {baseline / seconds:6.1f}x")
+    log_columns.use_backend()
+
+
+if __name__ == "__main__":
+    main()
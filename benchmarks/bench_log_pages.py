@@ -0,0 +1,90 @@
+"""Cost of deep /api/logs pages: cursor versus offset versus the old tail-and-filter path.
+
+Usage:
+    python benchmarks/bench_log_pages.py [--rows 200000] [--limit 100]
+
+Fills a LogStore with ``--rows`` logs and fetches a filtered page
+(``service`` + ``level=ERROR``) at increasing depths three ways:
+
+- cursor: ``LogStore.page(before=...)`` with the cursor of the page above
+- offset: ``LogStore.page(offset=...)``
+- scan: what the handler did before, i.e. take the newest ``offset+limit``
+  entries, filter them and slice (which also returns short pages once the
+  filter drops rows)
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.log_store import LogStore  # noqa: E402
+from utils.timeparse import EPOCH_FIELD  # noqa: E402
+
+SERVICES = ["auth_service", "order_service", "catalog_service"]
+
+
+def fill(rows):
+    store = LogStore(max_entries=rows, max_age_seconds=None)
+    start = time.time() - 3600
+    for i in range(rows):
+        store.append({
+            "timestamp": "",
+            EPOCH_FIELD: start + i * 3600 / rows,
+            "level": "ERROR" if random.random() < 0.1 else "INFO",
+            "service": random.choice(SERVICES),
+            "message": f"request {i}",
+        })
+    return store
+
+
+def timed(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    store = fill(args.rows)
+    filters = dict(service="order_service", level="ERROR")
+    matching = store.count(**filters)
+    print(f"{args.rows:,} rows, {matching:,} match service=order_service level=ERROR, pages of {args.limit}")
+
+    # Cursors for each depth, collected by walking the pages once
+    cursors = {0: None}
+    cursor, depth = None, 0
+    while True:
+        records, cursor = store.page(args.limit, before=cursor, **filters)
+        depth += len(records)
+        if cursor is None:
+            break
+        cursors[depth] = cursor
+
+    print(f"{'depth':>8} {'cursor':>10} {'offset':>10} {'scan':>10}  scan page size")
+    for depth in sorted(cursors):
+        if depth not in (0, args.limit * 10, args.limit * 100) and depth != max(cursors):
+            continue
+        cursor_time, _ = timed(lambda: store.page(args.limit, before=cursors[depth], **filters))
+        offset_time, _ = timed(lambda: store.page(args.limit, offset=depth, **filters))
+
+        def scan():
+            logs = list(reversed(store.tail(depth + args.limit)))
+            logs = [log for log in logs if log["service"] == filters["service"] and log["level"] == filters["level"]]
+            return logs[depth:depth + args.limit]
+        scan_time, page = timed(scan, repeat=1)
+        print(f"{depth:>8,} {cursor_time * 1000:>8.2f}ms {offset_time * 1000:>8.2f}ms {scan_time * 1000:>8.1f}ms  {len(page)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Memory held by parsed logs as plain dicts versus the LogStore's compact records.
+
+Usage:
+    python benchmarks/bench_log_store_memory.py [--logs 200000]
+
+Generates ``--logs`` parsed logs (the shape parse_log_line produces: raw
+fields, normalized level/service, classifier tags and the cached epoch),
+then reports with tracemalloc the bytes retained by a list of those dicts
+and by a LogStore holding the same logs, plus the cost of appending and of
+reading entries back as dicts and as records.
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.log_store import LogStore  # noqa: E402
+from utils.timeparse import log_epoch  # noqa: E402
+
+SERVICES = ["auth_service", "order_service", "catalog_service"]
+
+
+def make_log(start, i):
+    status = random.choice([200, 200, 200, 404, 500])
+    log = {
+        "timestamp": (start + timedelta(milliseconds=i * 10)).isoformat() + "Z",
+        # Fresh string objects per log, as the JSON decoder produces them
+        "level": "".join(random.choice(["INFO", "INFO", "WARNING", "ERROR"])),
+        "service": "".join(random.choice(SERVICES)),
+        "message": f"GET /api/orders/{random.randint(1, 10000)} {status} in {random.randint(1, 900)}ms",
+        "status_code": status,
+        "latency_ms": round(random.expovariate(1 / 120), 2),
+        "error_type": "http_500" if status == 500 else None,
+        "is_error": status == 500,
+    }
+    log_epoch(log)
+    return log
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logs", type=int, default=200000)
+    args = parser.parse_args()
+
+    start = datetime.utcnow() - timedelta(hours=1)
+
+    dict_bytes, dicts = measure(lambda: [make_log(start, i) for i in range(args.logs)])
+
+    def build_store():
+        store = LogStore(max_entries=args.logs, max_age_seconds=None)
+        for i in range(args.logs):
+            store.append(make_log(start, i))  # each dict is dropped once stored, as in record_logs
+        return store
+    store_bytes, store = measure(build_store)
+
+    print(f"{args.logs:,} parsed logs")
+    print(f"  list of dicts  {dict_bytes / 2**20:8.1f} MiB  {dict_bytes / args.logs:6.0f} B/log")
+    print(f"  LogStore       {store_bytes / 2**20:8.1f} MiB  {store_bytes / args.logs:6.0f} B/log  "
+          f"({dict_bytes / store_bytes:.1f}x smaller)")
+
+    fresh = LogStore(max_entries=args.logs, max_age_seconds=None)
+    started = time.perf_counter()
+    fresh.extend(dicts)
+    append = time.perf_counter() - started
+    started = time.perf_counter()
+    as_dicts = list(store.query(service="order_service"))
+    read_dicts = time.perf_counter() - started
+    started = time.perf_counter()
+    as_records = list(store.query(service="order_service", records=True))
+    read_records = time.perf_counter() - started
+    print(f"  append         {args.logs / append:12,.0f} logs/s")
+    print(f"  query (dicts)  {len(as_dicts) / read_dicts:12,.0f} logs/s")
+    print(f"  query (records){len(as_records) / read_records:12,.0f} logs/s")
+
+
+if __name__ == "__main__":
+    main()
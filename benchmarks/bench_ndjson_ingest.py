@@ -0,0 +1,92 @@
+"""Compare request size and server-side decode cost of the two ingest formats.
+
+Usage:
+    python benchmarks/bench_ndjson_ingest.py [--logs 50000] [--chunk 65536]
+
+Builds one batch of synthetic logs and reports, for a ``{"logs": [...]}``
+JSON body and for gzip-compressed NDJSON: bytes on the wire and the time to
+turn the body into log dicts. JSON is decoded in one ``json.loads`` of the
+fully buffered body (what /api/ingest_log does); NDJSON is inflated and
+parsed in ``--chunk`` sized pieces like /api/ingest_ndjson reads them, and
+the peak size of the buffered partial line is reported alongside.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.ndjson_stream import NDJSONDecoder, decompressor_for  # noqa: E402
+
+
+def make_logs(count):
+    now = datetime.utcnow().isoformat() + "Z"
+    return [{
+        "timestamp": now,
+        "level": random.choice(["INFO", "INFO", "WARNING", "ERROR"]),
+        "service": random.choice(["auth_service", "order_service", "catalog_service"]),
+        "message": f"GET /api/orders/{random.randint(1, 10000)} completed",
+        "status_code": random.choice([200, 200, 404, 500]),
+        "latency_ms": round(random.expovariate(1 / 120), 2),
+        "metadata": {"request_id": f"{random.getrandbits(64):016x}"},
+    } for _ in range(count)]
+
+
+def best_of(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def decode_json(body):
+    return json.loads(body)["logs"]
+
+
+def decode_ndjson(body, encoding, chunk):
+    decompressor = decompressor_for(encoding)
+    decoder = NDJSONDecoder()
+    records = 0
+    peak = 0
+    for i in range(0, len(body), chunk):
+        for data in decompressor.decompress(body[i:i + chunk]):
+            records += len(decoder.feed(data))
+            peak = max(peak, len(decoder._partial))
+    for data in decompressor.flush():
+        records += len(decoder.feed(data))
+    records += len(decoder.close())
+    return records, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logs", type=int, default=50000)
+    parser.add_argument("--chunk", type=int, default=65536, help="bytes per request body chunk")
+    args = parser.parse_args()
+
+    logs = make_logs(args.logs)
+    json_body = json.dumps({"logs": logs}).encode()
+    ndjson_body = "\n".join(json.dumps(log) for log in logs).encode() + b"\n"
+    ndjson_gzip = gzip.compress(ndjson_body, compresslevel=6)
+
+    rows = (
+        ("json body", json_body, lambda: (len(decode_json(json_body)), len(json_body))),
+        ("ndjson", ndjson_body, lambda: decode_ndjson(ndjson_body, None, args.chunk)),
+        ("ndjson + gzip", ndjson_gzip, lambda: decode_ndjson(ndjson_gzip, "gzip", args.chunk)),
+    )
+    for label, body, fn in rows:
+        seconds, (records, peak) = best_of(fn)
+        print(f"{label:<14} {len(body) / 1024:10,.0f} KiB on the wire  {seconds * 1000:8.1f} ms  "
+              f"{records / seconds:12,.0f} logs/s  buffered {peak / 1024:8,.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
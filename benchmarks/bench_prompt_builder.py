@@ -0,0 +1,98 @@
+"""Size and build time of the AI prompt's log section: deduplicated and budgeted versus the old per-log JSON.
+
+Usage:
+    python benchmarks/bench_prompt_builder.py [--logs 500] [--budget 1000] [--templates 12]
+
+Generates ``--logs`` logs drawn from ``--templates`` message shapes (ids,
+counts and latencies vary, about a third are errors), then builds the log
+section two ways:
+
+- old: the last 20-30 logs, each ``json.dumps``-ed up to three times and
+  cut at 200 characters
+- new: utils.prompt_builder.build_log_section over all of them within
+  ``--budget`` estimated tokens
+
+and reports estimated tokens, logs represented and build time.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.prompt_builder import build_log_section, estimate_tokens  # noqa: E402
+from utils.timeparse import EPOCH_FIELD  # noqa: E402
+
+SERVICES = ["auth_service", "order_service", "catalog_service", "payment_service"]
+SHAPES = [
+    "Order {n} failed: connection pool exhausted after {ms}ms",
+    "GET /api/v1/item/{n} 200 in {ms}ms",
+    "User {n} signed in from 10.0.{a}.{b}",
+    "Payment {n} declined by provider (code {c})",
+    "Cache miss for product {n}, loaded in {ms}ms",
+    "Retrying request {n} (attempt {a})",
+]
+
+
+def make_logs(count, templates):
+    now = time.time()
+    shapes = [(SHAPES[i % len(SHAPES)], SERVICES[i // len(SHAPES) % len(SERVICES)], "ERROR" if i % 3 == 0 else "INFO")
+              for i in range(templates)]
+    logs = []
+    for i in range(count):
+        shape, service, level = random.choice(shapes)
+        message = shape.format(n=random.randint(1, 99999), ms=random.randint(1, 999), a=random.randint(0, 255),
+                               b=random.randint(0, 255), c=random.randint(100, 999))
+        logs.append({
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(now - count + i)),
+            EPOCH_FIELD: now - count + i,
+            "level": level,
+            "service": service,
+            "message": message,
+            "status_code": 500 if level == "ERROR" else 200,
+            "latency_ms": random.expovariate(1 / 120),
+            "error_type": "http_500" if level == "ERROR" else None,
+            "is_error": level == "ERROR",
+        })
+    return logs
+
+
+def old_section(logs, max_logs):
+    recent_logs = logs[-max_logs:]
+    return "\n".join([json.dumps(log, default=str)[:200] + "..." if len(json.dumps(log, default=str)) > 200
+                      else json.dumps(log, default=str) for log in recent_logs])
+
+
+def best_of(fn, repeat=20):
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logs", type=int, default=500)
+    parser.add_argument("--budget", type=int, default=1000)
+    parser.add_argument("--templates", type=int, default=12)
+    args = parser.parse_args()
+
+    logs = make_logs(args.logs, args.templates)
+    print(f"{args.logs} logs from {args.templates} message shapes, budget {args.budget} tokens\n")
+    print(f"{'':<10} {'tokens':>7} {'logs':>6} {'lines':>6} {'build':>9}")
+    for max_logs in (20, 30):
+        seconds, text = best_of(lambda: old_section(logs, max_logs))
+        print(f"{'old ' + str(max_logs):<10} {estimate_tokens(text):>7} {max_logs:>6} {max_logs:>6} {seconds * 1000:>7.2f}ms")
+    seconds, section = best_of(lambda: build_log_section(logs, args.budget))
+    print(f"{'new':<10} {section.tokens:>7} {section.included_logs:>6} {section.included_templates:>6} "
+          f"{seconds * 1000:>7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
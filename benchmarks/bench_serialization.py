@@ -0,0 +1,107 @@
+"""Compare JSON backends for log parsing and for the heavy API responses.
+
+Usage:
+    python benchmarks/bench_serialization.py [--lines 50000] [--logs 10000]
+
+Decoding: parses ``--lines`` structured log lines with each available
+backend of utils.serialization (orjson, msgspec, json) and reports lines/s.
+
+Encoding: renders three representative payloads (the /api/analytics body
+built from a populated LogAnalytics snapshot, a /api/logs page of ``--logs``
+parsed logs, and a Prometheus metrics dict) two ways:
+
+- current path: FastAPI's ``jsonable_encoder`` followed by Starlette's
+  ``JSONResponse.render`` (what a handler returning a dict costs)
+- fast path: ``FastJSONResponse(payload)`` returned directly, per backend
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from utils import serialization  # noqa: E402
+from utils.log_analytics import LogAnalytics  # noqa: E402
+from utils.serialization import FastJSONResponse  # noqa: E402
+
+SERVICES = ["auth_service", "order_service", "catalog_service"]
+
+
+def make_logs(count):
+    start = datetime.utcnow() - timedelta(minutes=30)
+    return [{
+        "timestamp": (start + timedelta(milliseconds=i * 50)).isoformat() + "Z",
+        "level": random.choice(["INFO", "INFO", "WARNING", "ERROR"]),
+        "service": random.choice(SERVICES),
+        "message": f"GET /api/orders/{random.randint(1, 10000)} {random.choice([200, 200, 404, 500])}",
+        "status_code": random.choice([200, 200, 404, 500]),
+        "latency_ms": round(random.expovariate(1 / 120), 2),
+        "metadata": {"request_id": f"{random.getrandbits(64):016x}", "tags": ["api", "v1"]},
+    } for i in range(count)]
+
+
+def make_prometheus(series):
+    return {
+        name: [{"metric": {"job": random.choice(SERVICES), "instance": f"10.0.0.{i % 250}:8000", "path": f"/api/{i}"},
+                "value": [time.time(), str(random.random() * 1000)]} for i in range(series)]
+        for name in ("http_requests_total", "http_request_duration_seconds", "errors_total", "db_operations_total")
+    }
+
+
+def best_of(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=50000, help="log lines to decode")
+    parser.add_argument("--logs", type=int, default=10000, help="logs in the /api/logs payload")
+    parser.add_argument("--series", type=int, default=2000, help="series per Prometheus metric")
+    args = parser.parse_args()
+
+    backends = [name for name, available in serialization.available_backends().items() if available]
+    print(f"backends available: {', '.join(backends)}")
+
+    lines = [json.dumps(log) for log in make_logs(args.lines)]
+    print(f"\ndecode {args.lines:,} log lines")
+    for name in backends:
+        serialization.use_backend(name)
+        loads = serialization.loads
+        seconds = best_of(lambda: [loads(line) for line in lines])
+        print(f"  {name:<10} {seconds * 1000:9.1f} ms  {args.lines / seconds:12,.0f} lines/s")
+
+    analytics = LogAnalytics()
+    analytics.add_many(make_logs(50000))
+    snapshot = analytics.snapshot()
+    payloads = {
+        "/api/analytics": {"log_analytics": snapshot, "anomalies": [], "recent_errors": snapshot.get("last_10_errors", [])},
+        "/api/logs": {"logs": make_logs(args.logs), "total": args.logs, "offset": 0, "limit": args.logs},
+        "prometheus": make_prometheus(args.series),
+    }
+    for label, payload in payloads.items():
+        size = len(serialization.dumps(payload))
+        print(f"\nencode {label} ({size / 1024:,.0f} KiB)")
+        baseline = best_of(lambda: JSONResponse(jsonable_encoder(payload)))
+        print(f"  {'current':<10} {baseline * 1000:9.1f} ms  (jsonable_encoder + JSONResponse)")
+        for name in backends:
+            serialization.use_backend(name)
+            seconds = best_of(lambda: FastJSONResponse(payload))
+            print(f"  {name:<10} {seconds * 1000:9.1f} ms  {baseline / seconds:6.1f}x")
+    serialization.use_backend()
+
+
+if __name__ == "__main__":
+    main()
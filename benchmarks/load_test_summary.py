@@ -0,0 +1,114 @@
+"""Measure /api/summary latency while /api/ingest_log is under heavy load.
+
+Usage:
+    python benchmarks/load_test_summary.py --base-url http://localhost:8000 \
+        --duration 30 --ingest-workers 32 --batch-size 200
+
+Runs two phases against a live monitoring engine: a baseline with only
+/api/summary probes, then the same probes while ``--ingest-workers``
+clients post batches to /api/ingest_log as fast as they can. Prints
+p50/p95/p99/max latency of /api/summary for each phase plus ingest
+throughput. If handlers block the event loop on Mongo, the p99 of the
+second phase grows with the ingest load.
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+
+import httpx
+
+SERVICES = ["auth_service", "order_service", "catalog_service"]
+LEVELS = ["INFO", "INFO", "INFO", "WARNING", "ERROR"]
+
+
+def make_batch(size):
+    now = datetime.utcnow().isoformat() + "Z"
+    return {"logs": [{
+        "timestamp": now,
+        "level": random.choice(LEVELS),
+        "service": random.choice(SERVICES),
+        "message": "load test request",
+        "status_code": random.choice([200, 200, 200, 404, 500]),
+        "latency_ms": round(random.expovariate(1 / 120), 2),
+    } for _ in range(size)]}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+async def probe_summary(client, stop_at, interval, latencies, errors):
+    while time.perf_counter() < stop_at:
+        started = time.perf_counter()
+        try:
+            resp = await client.get("/api/summary")
+            if resp.status_code != 200:
+                errors.append(resp.status_code)
+        except Exception as e:
+            errors.append(str(e))
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+async def ingest_worker(client, stop_at, batch_size, counters):
+    while time.perf_counter() < stop_at:
+        try:
+            resp = await client.post("/api/ingest_log", json=make_batch(batch_size))
+            # The endpoint reports failures (e.g. Mongo unavailable) in the body with a 200
+            if resp.status_code < 300 and resp.json().get("status", "success") in ("success", "accepted"):
+                counters["logs"] += batch_size
+                counters["requests"] += 1
+            else:
+                counters["rejected"] += 1
+        except Exception:
+            counters["failed"] += 1
+
+
+async def run_phase(args, with_ingest):
+    latencies, errors = [], []
+    counters = {"logs": 0, "requests": 0, "rejected": 0, "failed": 0}
+    limits = httpx.Limits(max_connections=args.ingest_workers + args.probes + 4)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30.0, limits=limits) as client:
+        stop_at = time.perf_counter() + args.duration
+        tasks = [probe_summary(client, stop_at, args.probe_interval, latencies, errors) for _ in range(args.probes)]
+        if with_ingest:
+            tasks += [ingest_worker(client, stop_at, args.batch_size, counters) for _ in range(args.ingest_workers)]
+        await asyncio.gather(*tasks)
+    return latencies, errors, counters
+
+
+def report(name, latencies, errors, counters, duration):
+    fmt = lambda v: f"{v:8.1f}" if v is not None else "     n/a"  # noqa: E731
+    print(f"{name:<18} n={len(latencies):<6} p50={fmt(percentile(latencies, 0.50))} ms  "
+          f"p95={fmt(percentile(latencies, 0.95))} ms  p99={fmt(percentile(latencies, 0.99))} ms  "
+          f"max={fmt(max(latencies) if latencies else None)} ms  errors={len(errors)}")
+    if counters["requests"] or counters["rejected"] or counters["failed"]:
+        print(f"{'':<18} ingest: {counters['logs'] / duration:,.0f} logs/s in {counters['requests']} requests, "
+              f"{counters['rejected']} rejected, {counters['failed']} failed")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per phase")
+    parser.add_argument("--ingest-workers", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--probes", type=int, default=4, help="concurrent /api/summary clients")
+    parser.add_argument("--probe-interval", type=float, default=0.05)
+    parser.add_argument("--skip-baseline", action="store_true")
+    args = parser.parse_args()
+
+    if not args.skip_baseline:
+        latencies, errors, counters = await run_phase(args, with_ingest=False)
+        report("baseline", latencies, errors, counters, args.duration)
+    latencies, errors, counters = await run_phase(args, with_ingest=True)
+    report("under ingest load", latencies, errors, counters, args.duration)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,8 +2,8 @@ import asyncio
 import logging
 from pathlib import Path
 from typing import List, Dict, Any
-from fastapi import FastAPI, BackgroundTasks, HTTPException, Query, Depends, Body
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Query, Depends, Body, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, EmailStr
 import httpx
 import time
@@ -16,14 +16,37 @@ from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 from fastapi.middleware.cors import CORSMiddleware
 import psutil
-from dateutil import parser as dateutil_parser
-from collections import defaultdict, OrderedDict  # Add this import at the top if not present
+from collections import OrderedDict
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pymongo import MongoClient
 import pymongo
+from bson import ObjectId
+from bson.errors import InvalidId
 from passlib.hash import bcrypt
 from urllib.parse import urlparse
 import pytz  # Add this import at the top if not present
+from utils import log_columns
+from utils.analysis_jobs import AnalysisJobs, anomaly_key
+from utils.anomaly_windows import AnomalyWindows
+from utils.ingest_pipeline import IngestPipeline
+from utils.llm_gateway import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, LLMError, LLMGateway
+from utils.log_analytics import LogAnalytics
+from utils.log_classifier import LogClassifier
+from utils.log_store import LogStore
+from utils.log_templates import anomalies_fingerprint, digest, templates_fingerprint
+from utils.log_tailer import LogTailer
+from utils.ndjson_stream import CorruptStream, NDJSONDecoder, UnsupportedEncoding, decompressor_for
+from utils.pagination import InvalidCursor, decode_cursor, encode_cursor
+from utils.prompt_builder import build_log_section, focus_logs
+from utils.prometheus_parser import parse_aggregation_rules, parse_prometheus_flat
+from utils.repositories import Repositories
+from utils.rollups import RollupEngine
+from utils.scrape_scheduler import ScrapeScheduler, ScrapeTarget
+from utils.serialization import DECODE_ERRORS, FastJSONResponse, loads, use_backend
+from utils.sse import SSE_HEADERS, sse_event
+from utils.timeparse import log_epoch, parse_timestamp
+from utils.ttl_cache import TTLCache
+from utils.write_behind import WriteBehindBuffer
 
 # Optional: pip install ollama
 try:
@@ -55,192 +78,184 @@ OLLAMA_URL = os.getenv("OLLAMA_URL", "http://host.docker.internal:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_MODEL = os.getenv("GROQ_MODEL", "llama3-8b-8192")
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq").lower()  # groq | ollama, for the AI analysis endpoints
 
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 ALERT_EMAIL_FROM = os.getenv("ALERT_EMAIL_FROM")
 ALERT_EMAIL_TO = os.getenv("ALERT_EMAIL_TO")
 
+# Latency percentile sketches: relative error bound and max buckets per sketch
+LATENCY_SKETCH_ACCURACY = float(os.getenv("LATENCY_SKETCH_ACCURACY", "0.01"))
+LATENCY_SKETCH_MAX_BINS = int(os.getenv("LATENCY_SKETCH_MAX_BINS", "2048"))
+
+# In-memory log store limits (oldest entries are evicted first)
+LOG_STORE_MAX_ENTRIES = int(os.getenv("LOG_STORE_MAX_ENTRIES", "200000"))
+LOG_STORE_MAX_AGE_HOURS = float(os.getenv("LOG_STORE_MAX_AGE_HOURS", "24"))
+# AI root-cause results: LRU + TTL, optionally persisted to a JSON file (e.g. /app/data/root_cause_cache.json)
+ROOT_CAUSE_CACHE_TTL_SECONDS = float(os.getenv("ROOT_CAUSE_CACHE_TTL_SECONDS", "120"))
+ROOT_CAUSE_CACHE_MAX_ENTRIES = int(os.getenv("ROOT_CAUSE_CACHE_MAX_ENTRIES", "256"))
+ROOT_CAUSE_CACHE_PATH = os.getenv("ROOT_CAUSE_CACHE_PATH", "")
+# LLM gateway: concurrent upstream calls per provider (the rest queue) and how long an Ollama health probe is trusted
+LLM_MAX_CONCURRENCY_GROQ = int(os.getenv("LLM_MAX_CONCURRENCY_GROQ", "4"))
+LLM_MAX_CONCURRENCY_OLLAMA = int(os.getenv("LLM_MAX_CONCURRENCY_OLLAMA", "1"))
+OLLAMA_HEALTH_TTL_SECONDS = float(os.getenv("OLLAMA_HEALTH_TTL_SECONDS", "30"))
+# Root-cause analyses started by the background scanner when a new anomaly fires (LLM spend: concurrency + per hour)
+ANALYSIS_PRECOMPUTE = os.getenv("ANALYSIS_PRECOMPUTE", "true").lower() in ("1", "true", "yes")
+ANALYSIS_JOBS_MAX_CONCURRENT = int(os.getenv("ANALYSIS_JOBS_MAX_CONCURRENT", "1"))
+ANALYSIS_JOBS_MAX_PER_HOUR = int(os.getenv("ANALYSIS_JOBS_MAX_PER_HOUR", "20"))
+ANALYSIS_JOBS_RESULT_TTL_SECONDS = float(os.getenv("ANALYSIS_JOBS_RESULT_TTL_SECONDS", "300"))
+# AI prompts: logs considered, and the estimated tokens their (deduplicated, ranked) lines may take
+PROMPT_MAX_LOGS = int(os.getenv("PROMPT_MAX_LOGS", "500"))
+PROMPT_LOG_TOKEN_BUDGET = int(os.getenv("PROMPT_LOG_TOKEN_BUDGET", "1000"))
+
+# Word index over log messages for /api/logs?q= (in-memory store and a Mongo text index); costs memory and insert time
+LOG_TEXT_INDEX = os.getenv("LOG_TEXT_INDEX", "false").lower() in ("1", "true", "yes")
+
+# Scraping of user-registered services (per-service overrides: scrape_interval / scrape_timeout)
+SCRAPE_INTERVAL_SECONDS = float(os.getenv("SCRAPE_INTERVAL_SECONDS", "30"))
+SCRAPE_TIMEOUT_SECONDS = float(os.getenv("SCRAPE_TIMEOUT_SECONDS", "5"))
+SCRAPE_MAX_CONCURRENCY = int(os.getenv("SCRAPE_MAX_CONCURRENCY", "50"))
+SCRAPE_JITTER = float(os.getenv("SCRAPE_JITTER", "0.1"))
+# Dashboard endpoints re-scrape a service only when its cached metrics are older than this
+SCRAPE_CACHE_MAX_AGE_SECONDS = float(os.getenv("SCRAPE_CACHE_MAX_AGE_SECONDS", "60"))
+
+# Write-behind buffer for metrics_history: flush by size or time, bounded memory
+METRICS_HISTORY_BATCH_SIZE = int(os.getenv("METRICS_HISTORY_BATCH_SIZE", "500"))
+METRICS_HISTORY_FLUSH_SECONDS = float(os.getenv("METRICS_HISTORY_FLUSH_SECONDS", "2"))
+METRICS_HISTORY_MAX_PENDING = int(os.getenv("METRICS_HISTORY_MAX_PENDING", "20000"))
+
+# Anomaly detection: sliding 1m/5m/15m windows per service compared against EWMA baselines
+ANOMALY_SLOT_SECONDS = int(os.getenv("ANOMALY_SLOT_SECONDS", "10"))
+ANOMALY_BASELINE_HALFLIFE_SECONDS = float(os.getenv("ANOMALY_BASELINE_HALFLIFE_SECONDS", "1800"))
+ANOMALY_MIN_REQUESTS = int(os.getenv("ANOMALY_MIN_REQUESTS", "20"))  # per window, below this a window is not judged
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "3.0"))
+ANOMALY_MIN_ERROR_RATE = float(os.getenv("ANOMALY_MIN_ERROR_RATE", "0.05"))  # rates below this never fire
+ANOMALY_MAX_ERROR_RATE = float(os.getenv("ANOMALY_MAX_ERROR_RATE", "0.25"))  # rates above this always fire
+ANOMALY_LATENCY_MS = float(os.getenv("ANOMALY_LATENCY_MS", "1000"))
+
+# Ingest pipeline: /api/ingest_log queues batches (202) and a worker pool normalizes, analyzes and persists them
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "200000"))  # queued log lines before answering 429
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))
+INGEST_MAX_LINE_BYTES = int(os.getenv("INGEST_MAX_LINE_BYTES", str(1024 * 1024)))  # longer NDJSON lines are skipped
+
+# JSON backend for log parsing, ingest bodies and the heavy API responses: auto (orjson, then msgspec, then json), orjson, msgspec or json
+JSON_BACKEND = use_backend(os.getenv("JSON_BACKEND", "auto"))
+
+# Aggregation over the in-memory log store: auto (numpy when installed), numpy or python
+ANALYTICS_BACKEND = log_columns.use_backend(os.getenv("ANALYTICS_BACKEND", "auto"))
+
+# How labelled series collapse into the flat metrics dict, e.g. "db_operations_total=sum,*_bytes=max"
+PROMETHEUS_AGGREGATION_RULES = parse_aggregation_rules(os.getenv("PROMETHEUS_AGGREGATION_RULES", ""))
+
 user_service_metrics = {}  # {service_name: {metrics, status, last_scraped, error}}
 
-async def background_user_service_metrics_scraper():
-    """Periodically scrape /metrics from user-registered services and cache results."""
-    global user_service_metrics, service_uptime_tracker
-    while True:
-        try:
-            # Get all registered services from all users
-            all_services = list(services_collection.find({}))
-            for svc in all_services:
-                name = svc["name"]
-                url = svc["url"].rstrip("/")
-                owner = svc["owner"]
-                metrics_url = f"{url}/metrics"
-                current_time = time.time()
-                
-                try:
-                    async with httpx.AsyncClient(timeout=5.0) as client:
-                        resp = await client.get(metrics_url)
-                    if resp.status_code == 200:
-                        # Parse Prometheus metrics text format
-                        metrics = parse_prometheus_metrics(resp.text)
-                        
-                        # Track uptime internally
-                        if name not in service_uptime_tracker:
-                            service_uptime_tracker[name] = {
-                                "first_seen": current_time,
-                                "last_healthy": current_time
-                            }
-                        else:
-                            service_uptime_tracker[name]["last_healthy"] = current_time
-                        
-                        # Calculate uptime from Prometheus process_start_time_seconds
-                        uptime = None
-                        if "process_start_time_seconds" in metrics:
-                            process_start_time = metrics["process_start_time_seconds"]
-                            if process_start_time > 0:
-                                uptime = (current_time - process_start_time) / 60  # in minutes
-                        
-                        # Store historical metrics for load forecasting
-                        save_metrics_history(name, metrics, current_time)
-                        
-                        user_service_metrics[name] = {
-                            "metrics": metrics,
-                            "status": "healthy",
-                            "last_scraped": current_time,
-                            "error": None,
-                            "owner": owner,
-                            "url": url,
-                            "uptime": uptime
-                        }
-                    else:
-                        user_service_metrics[name] = {
-                            "metrics": {},
-                            "status": "unhealthy",
-                            "last_scraped": current_time,
-                            "error": f"Status {resp.status_code}",
-                            "owner": owner,
-                            "url": url
-                        }
-                except Exception as e:
-                    user_service_metrics[name] = {
-                        "metrics": {},
-                        "status": "unhealthy",
-                        "last_scraped": current_time,
-                        "error": str(e),
-                        "owner": owner,
-                        "url": url
-                    }
-        except Exception as e:
-            print(f"[User Service Metrics Scraper] Error: {e}")
+async def handle_scrape_result(target: ScrapeTarget, resp, error, current_time: float, duration: float):
+    """Update user_service_metrics, the uptime tracker and metrics history from one scrape."""
+    name = target.name
+    url = target.url
+    owner = target.owner
+    scrape_duration_ms = round(duration * 1000, 2)
+    if error is None and resp.status_code == 200:
+        # Parse Prometheus metrics text format
+        metrics = parse_prometheus_metrics(resp.text)
         
-        # Save uptime tracker periodically (every 10 minutes)
-        if int(time.time()) % 600 == 0:  # Every 10 minutes
-            save_uptime_tracker()
-            
-        # Clean up old metrics data periodically (every 6 hours)
-        if int(time.time()) % 21600 == 0:  # Every 6 hours
-            cleanup_old_metrics_history(days_to_keep=30)
-            
-        await asyncio.sleep(30)  # Scrape every 30 seconds
-
-# Add a new function to scrape metrics for a specific user
-async def scrape_metrics_for_user(user_email: str):
-    """Scrape metrics for a specific user's services."""
-    global service_uptime_tracker
-    services = get_registered_services_for_user(user_email)
-    for svc in services:
-        name = svc["name"]
-        url = svc["url"].rstrip("/")
-        metrics_url = f"{url}/metrics"
-        current_time = time.time()
+        # Track uptime internally
+        if name not in service_uptime_tracker:
+            service_uptime_tracker[name] = {
+                "first_seen": current_time,
+                "last_healthy": current_time
+            }
+        else:
+            service_uptime_tracker[name]["last_healthy"] = current_time
         
+        # Calculate uptime from Prometheus process_start_time_seconds
+        uptime = None
+        if "process_start_time_seconds" in metrics:
+            process_start_time = metrics["process_start_time_seconds"]
+            if process_start_time > 0:
+                uptime = (current_time - process_start_time) / 60  # in minutes
+        
+        # Store historical metrics for load forecasting; waits briefly for room when Mongo falls behind,
+        # which keeps this target from being re-scraped until the write buffer drains
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                resp = await client.get(metrics_url)
-            if resp.status_code == 200:
-                metrics = parse_prometheus_metrics(resp.text)
-                
-                # Track uptime internally
-                if name not in service_uptime_tracker:
-                    service_uptime_tracker[name] = {
-                        "first_seen": current_time,
-                        "last_healthy": current_time
-                    }
-                else:
-                    service_uptime_tracker[name]["last_healthy"] = current_time
-                
-                # Calculate uptime from Prometheus process_start_time_seconds
-                uptime = None
-                if "process_start_time_seconds" in metrics:
-                    process_start_time = metrics["process_start_time_seconds"]
-                    if process_start_time > 0:
-                        uptime = (current_time - process_start_time) / 60  # in minutes
-                
-                # Store historical metrics for load forecasting
-                save_metrics_history(name, metrics, current_time)
-                
-                user_service_metrics[name] = {
-                    "metrics": metrics,
-                    "status": "healthy",
-                    "last_scraped": current_time,
-                    "error": None,
-                    "owner": user_email,
-                    "url": url,
-                    "uptime": uptime
-                }
-            else:
-                user_service_metrics[name] = {
-                    "metrics": {},
-                    "status": "unhealthy",
-                    "last_scraped": current_time,
-                    "error": f"Status {resp.status_code}",
-                    "owner": user_email,
-                    "url": url
-                }
+            await metrics_history_writer.put(build_metrics_history_doc(name, metrics, current_time))
         except Exception as e:
-            user_service_metrics[name] = {
-                "metrics": {},
-                "status": "unhealthy",
-                "last_scraped": current_time,
-                "error": str(e),
-                "owner": user_email,
-                "url": url
-            }
+            print(f"Error saving metrics history for {name}: {e}")
+        
+        user_service_metrics[name] = {
+            "metrics": metrics,
+            "status": "healthy",
+            "last_scraped": current_time,
+            "scrape_duration_ms": scrape_duration_ms,
+            "error": None,
+            "owner": owner,
+            "url": url,
+            "uptime": uptime
+        }
+    else:
+        user_service_metrics[name] = {
+            "metrics": {},
+            "status": "unhealthy",
+            "last_scraped": current_time,
+            "scrape_duration_ms": scrape_duration_ms,
+            "error": error if error is not None else f"Status {resp.status_code}",
+            "owner": owner,
+            "url": url
+        }
+
+def load_registered_services() -> List[Dict]:
+    """All registered services (blocking; runs in the scheduler's worker thread).
+
+    The log classifier is rebuilt from the same documents, so new services,
+    endpoints and aliases are recognized in logs after the next refresh.
+    """
+    docs = list(services_collection.find({}))
+    log_classifier.rebuild(docs)
+    return docs
+
+scrape_scheduler = ScrapeScheduler(
+    load_targets=load_registered_services,
+    on_result=handle_scrape_result,
+    default_interval=SCRAPE_INTERVAL_SECONDS,
+    default_timeout=SCRAPE_TIMEOUT_SECONDS,
+    max_concurrency=SCRAPE_MAX_CONCURRENCY,
+    jitter=SCRAPE_JITTER,
+)
+
+async def background_user_service_metrics_scraper():
+    """Scrape /metrics from user-registered services on per-service intervals and cache results."""
+    scheduler_task = asyncio.create_task(scrape_scheduler.run())
+    last_uptime_save = last_cleanup = time.time()
+    try:
+        while True:
+            await asyncio.sleep(30)
+            now = time.time()
+            # Save uptime tracker periodically (every 10 minutes)
+            if now - last_uptime_save >= 600:
+                save_uptime_tracker()
+                last_uptime_save = now
+            # Clean up old metrics data periodically (every 6 hours)
+            if now - last_cleanup >= 21600:
+                await cleanup_old_metrics_history(days_to_keep=30)
+                last_cleanup = now
+    finally:
+        scheduler_task.cancel()
+
+async def refresh_stale_service_metrics(services: List[Dict]):
+    """Serve cached scrape results, re-scraping only services older than SCRAPE_CACHE_MAX_AGE_SECONDS."""
+    try:
+        await scrape_scheduler.refresh_stale(services, SCRAPE_CACHE_MAX_AGE_SECONDS)
+    except Exception as e:
+        print(f"[User Service Metrics Scraper] Refresh error: {e}")
 
 def parse_prometheus_metrics(metrics_text):
-    """Parse Prometheus text format into a dict of metric_name: value."""
-    metrics = {}
-    # Track metrics that need to be summed (like http_requests_total with different labels)
-    summable_metrics = {}
-    
-    for line in metrics_text.splitlines():
-        line = line.strip()
-        if not line or line.startswith("#"):
-            continue
-        try:
-            parts = line.split()
-            if len(parts) == 2:
-                key, value = parts
-                # Check if this is a metric with labels
-                if "{" in key:
-                    # Extract the base metric name (without labels)
-                    base_key = key.split("{")[0]
-                    # For metrics that should be summed across all labels
-                    if base_key in ["http_requests_total", "errors_total"]:
-                        if base_key not in summable_metrics:
-                            summable_metrics[base_key] = 0
-                        summable_metrics[base_key] += float(value)
-                    else:
-                        # For other metrics with labels, keep the last value (existing behavior)
-                        metrics[base_key] = float(value)
-                else:
-                    # No labels, store directly
-                    metrics[key] = float(value)
-        except Exception:
-            continue
+    """Parse Prometheus/OpenMetrics text into a dict of metric_name: value.
 
-    # Add the summed metrics to the result
-    for metric_name, total_value in summable_metrics.items():
-        metrics[metric_name] = total_value
+    Label sets are collapsed per PROMETHEUS_AGGREGATION_RULES (request and
+    error counters are summed, other metrics keep the last series).
+    """
+    metrics = parse_prometheus_flat(metrics_text, PROMETHEUS_AGGREGATION_RULES)
 
     # --- Compute average latency (seconds) ---
     avg_latency = None
@@ -267,10 +282,19 @@ async def lifespan(app: FastAPI):
     task1 = asyncio.create_task(background_log_scanner())
     task2 = asyncio.create_task(background_user_service_metrics_scraper())
     task3 = asyncio.create_task(background_db_health_checker())
+    task4 = asyncio.create_task(metrics_history_writer.run())
+    task5 = asyncio.create_task(ingest_pipeline.run())
     yield
     task1.cancel()
     task2.cancel()
     task3.cancel()
+    task4.cancel()
+    task5.cancel()
+    # Drain queued ingest batches and write out buffered metrics history before exiting
+    await asyncio.gather(task5, return_exceptions=True)
+    await metrics_history_writer.close()
+    await analysis_jobs.aclose()
+    await llm_gateway.aclose()
     
     # Save uptime tracking data on shutdown
     save_uptime_tracker()
@@ -287,16 +311,49 @@ app.add_middleware(
 )
 
 # In-memory store for parsed log data and detected anomalies
-parsed_logs: List[Dict[str, Any]] = []
-metrics_summary: Dict[str, Any] = {}
+parsed_logs = LogStore(max_entries=LOG_STORE_MAX_ENTRIES, max_age_seconds=LOG_STORE_MAX_AGE_HOURS * 3600,
+                       text_index=LOG_TEXT_INDEX)
+log_analytics = LogAnalytics(  # Incrementally updated summary served by the analytics endpoints
+    relative_accuracy=LATENCY_SKETCH_ACCURACY,
+    max_bins=LATENCY_SKETCH_MAX_BINS
+)
+log_rollups = RollupEngine()  # Pre-aggregated (service, time bucket) stats for the timeseries endpoints
+log_classifier = LogClassifier()  # Service / error type / status tagging, rebuilt from registered services
+anomaly_windows = AnomalyWindows(  # Sliding per-service counters the anomaly detectors run over
+    slot_seconds=ANOMALY_SLOT_SECONDS,
+    baseline_halflife=ANOMALY_BASELINE_HALFLIFE_SECONDS,
+    min_requests=ANOMALY_MIN_REQUESTS,
+    z_threshold=ANOMALY_Z_THRESHOLD,
+    min_error_rate=ANOMALY_MIN_ERROR_RATE,
+    max_error_rate=ANOMALY_MAX_ERROR_RATE,
+    latency_threshold_ms=ANOMALY_LATENCY_MS
+)
 anomaly_cache: List[str] = []
 prometheus_metrics: Dict[str, Any] = {}
 
-# --- In-memory cache for root cause analysis ---
-root_cause_cache = {}
-CACHE_TTL_SECONDS = 120  # 2 minutes
+# --- Cache for root cause analysis, keyed on what the prompt is built from (see ai_incident_analysis) ---
+root_cause_cache = TTLCache(
+    max_entries=ROOT_CAUSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=ROOT_CAUSE_CACHE_TTL_SECONDS,
+    path=ROOT_CAUSE_CACHE_PATH or None,
+    name="Root Cause Cache",
+)
+
+# --- LLM calls: identical in-flight prompts share one upstream request, per-provider concurrency caps ---
+llm_gateway = LLMGateway(
+    limits={"groq": LLM_MAX_CONCURRENCY_GROQ, "ollama": LLM_MAX_CONCURRENCY_OLLAMA},
+    health_ttl=OLLAMA_HEALTH_TTL_SECONDS,
+)
+
+# --- Root-cause analyses precomputed per anomaly by the background scanner (see precompute_incident_analysis) ---
+analysis_jobs = AnalysisJobs(
+    run=lambda anomaly: precompute_incident_analysis(anomaly),
+    max_concurrent=ANALYSIS_JOBS_MAX_CONCURRENT,
+    max_per_hour=ANALYSIS_JOBS_MAX_PER_HOUR,
+    result_ttl=ANALYSIS_JOBS_RESULT_TTL_SECONDS,
+)
 
-# Track sent anomalies to avoid duplicate emails (in-memory, resets on restart)
+# anomaly_key of the active anomalies already emailed about (in-memory, resets on restart)
 sent_anomalies = set()
 
 # --- Service uptime tracking (AppVital internal) ---
@@ -374,243 +431,58 @@ def send_email_alert(subject, content):
         print(f"[Email Alert] Failed: {e}")
 
 # --- Enhanced Log Parsing ---
+UNSTRUCTURED_LOG_PATTERN = re.compile(r"(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d+) \[(?P<level>\w+)\] (?P<message>.*)")
+
 def parse_log_line(line: str) -> Dict[str, Any]:
-    """Parse structured and unstructured log lines, normalize level and service, always set message."""
-    try:
-        if line.strip().startswith('{'):
-            data = json.loads(line)
-            # Normalize level and service
+    """Parse structured and unstructured log lines, normalize level and service, always set message.
+
+    Service, error type and status code are tagged in one pass by ``log_classifier``
+    (see utils.log_classifier); the timestamp is converted to an epoch float once
+    here (see utils.timeparse).
+    """
+    stripped = line.strip()
+    if stripped.startswith('{'):
+        try:
+            data = loads(stripped)
+        except DECODE_ERRORS:
+            data = None
+        if isinstance(data, dict):
+            # Normalize level; the classifier infers the service if missing or unknown
             if 'level' in data:
-                data['level'] = data['level'].upper()
-            # Try to infer service if missing or unknown
-            if 'service' not in data or not data['service'] or data['service'].lower() == 'unknown':
-                msg = data.get('message', '')
-                path = data.get('path', '')
-                event = data.get('event', '')
-                # Improved service inference
-                if 'auth_service' in msg or 'auth_service' in event or '/auth' in path or 'auth' in msg.lower():
-                    data['service'] = 'auth_service'
-                elif 'order_service' in msg or 'order_service' in event or '/order' in path or 'order' in msg.lower():
-                    data['service'] = 'order_service'
-                elif 'catalog_service' in msg or 'catalog_service' in event or '/catalog' in path or 'catalog' in msg.lower() or 'product' in msg.lower():
-                    data['service'] = 'catalog_service'
-                elif 'controller' in msg.lower() or 'controller' in event.lower():
-                    data['service'] = 'controller'
-                else:
-                    data['service'] = 'unknown'
+                data['level'] = str(data['level']).upper()
+            log_classifier.tag(data)
             # Always ensure message field exists
             if 'message' not in data or not data['message']:
                 # Try to use event or raw
                 data['message'] = data.get('event', '') or str(data)
+            log_epoch(data)
             return data
-    except json.JSONDecodeError:
-        pass
     # Fallback to regex parsing for unstructured logs
-    log_pattern = re.compile(r"(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d+) \[(?P<level>\w+)\] (?P<message>.*)")
-    match = log_pattern.match(line)
+    match = UNSTRUCTURED_LOG_PATTERN.match(line)
     if match:
         data = match.groupdict()
         data['level'] = data.get('level', '').upper()
-        msg = data.get('message', '')
-        # Improved service inference
-        if 'auth_service' in msg or '/auth' in msg or 'auth' in msg.lower():
-            data['service'] = 'auth_service'
-        elif 'order_service' in msg or '/order' in msg or 'order' in msg.lower():
-            data['service'] = 'order_service'
-        elif 'catalog_service' in msg or '/catalog' in msg or 'catalog' in msg.lower() or 'product' in msg.lower():
-            data['service'] = 'catalog_service'
-        elif 'controller' in msg.lower():
-            data['service'] = 'controller'
-        else:
-            data['service'] = 'unknown'
+        log_classifier.tag(data)
         # Always ensure message field exists
-        if 'message' not in data or not data['message']:
+        if not data.get('message'):
             data['message'] = str(data)
+        log_epoch(data)
         return data
     # Always set message for raw logs
-    return {"raw": line, "timestamp": datetime.now().isoformat(), "level": "INFO", "service": "unknown", "message": line}
-
-def load_logs() -> List[Dict[str, Any]]:
-    """Load and parse logs from all service log files"""
-    log_files = [
-        Path("/app/logs/metrics.log"),  # Main log file (controller)
-        Path("/app/logs/auth_service.log"),  # Auth service logs
-        Path("/app/logs/catalog_service.log"),  # Catalog service logs
-        Path("/app/logs/order_service.log"),  # Order service logs
-    ]
-    
-    logs = []
-    for log_file in log_files:
-        if not log_file.exists():
-            continue
-        
-        try:
-            # Try different encodings
-            encodings = ['utf-8', 'utf-16', 'latin-1']
-            file_content = None
-            
-            for encoding in encodings:
-                try:
-                    with log_file.open("r", encoding=encoding) as f:
-                        file_content = f.read()
-                    break
-                except UnicodeDecodeError:
-                    continue
-            
-            if file_content is None:
-                print(f"Could not read {log_file} with any encoding")
-                continue
-                
-            for line in file_content.split('\n'):
-                line = line.strip()
-                if line:
-                    parsed = parse_log_line(line)
-                    if parsed:
-                        logs.append(parsed)
-                        
-        except Exception as e:
-            print(f"Error loading logs from {log_file}: {e}")
-    
-    return logs
-
-# --- Enhanced Metrics Analysis ---
-def analyze_logs(logs: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Comprehensive log analysis with industry-standard metrics"""
-    stats = {
-        "total": len(logs),
-        "errors": 0,
-        "auth_failures": 0,
-        "http_500": 0,
-        "order_404": 0,
-        "latencies": [],
-        "last_10_errors": [],
-        "error_types": {},
-        "response_codes": {},
-        "services": {},
-        "time_series": {},
-        "performance_metrics": {
-            "avg_latency_ms": None,
-            "min_latency_ms": None,
-            "max_latency_ms": None,
-            "p95_latency_ms": None,
-            "p99_latency_ms": None,
-            "error_rate": 0.0,
-            "success_rate": 0.0
-        }
-    }
-    
-    # Time-based analysis (fix: each window is exclusive, not cumulative)
-    current_time = datetime.now()
-    time_windows = {
-        "last_1h": current_time - timedelta(hours=1),
-        "last_15m": current_time - timedelta(minutes=15),
-        "last_5m": current_time - timedelta(minutes=5)
-    }
-    
-    # Prepare time series buckets
-    for window_name in time_windows:
-        stats["time_series"][window_name] = {"total": 0, "errors": 0}
-    
-    for log in logs:
-        msg = log.get("message", "")
-        level = log.get("level", "")
-        service = log.get("service", "unknown")
-        status_code = log.get("status_code")
-        latency = log.get("latency_ms")
-        if latency is None:
-            latency = log.get("duration_ms")
-        timestamp_str = log.get("timestamp", "")
-        
-        # Service tracking
-        if service not in stats["services"]:
-            stats["services"][service] = {
-                "total_requests": 0,
-                "errors": 0,
-                "avg_latency": 0,
-                "latencies": []
-            }
-        
-        stats["services"][service]["total_requests"] += 1
-        
-        # Count errors
-        if "error" in msg.lower() or level == "ERROR":
-            stats["errors"] += 1
-            stats["services"][service]["errors"] += 1
-            if len(stats["last_10_errors"]) < 10:
-                stats["last_10_errors"].append(log)
-        
-        # Count specific error types
-        if "401" in msg or "authentication failed" in msg.lower():
-            stats["auth_failures"] += 1
-            stats["error_types"]["auth_failure"] = stats["error_types"].get("auth_failure", 0) + 1
-        if "500" in msg or (status_code and status_code == 500):
-            stats["http_500"] += 1
-            stats["error_types"]["http_500"] = stats["error_types"].get("http_500", 0) + 1
-        if "404" in msg and "order" in msg.lower():
-            stats["order_404"] += 1
-            stats["error_types"]["order_404"] = stats["error_types"].get("order_404", 0) + 1
-        
-        # Latency analysis
-        if latency is not None:
-            stats["latencies"].append(latency)
-            stats["services"][service]["latencies"].append(latency)
-        
-        # Response code analysis
-        if status_code:
-            stats["response_codes"][str(status_code)] = stats["response_codes"].get(str(status_code), 0) + 1
-        
-        # Time series analysis (fix: each window is exclusive)
-        try:
-            if timestamp_str:
-                log_time = dateutil_parser.parse(timestamp_str)
-                for window_name, window_start in time_windows.items():
-                    # Only count logs within this window (not cumulative)
-                    if log_time >= window_start and log_time <= current_time:
-                        # For each window, check if log_time is within window's range only
-                        # For last_5m: >= now-5m and <= now
-                        # For last_15m: >= now-15m and < now-5m
-                        # For last_1h: >= now-1h and < now-15m
-                        if window_name == "last_5m":
-                            if log_time >= current_time - timedelta(minutes=5):
-                                stats["time_series"][window_name]["total"] += 1
-                                if "error" in msg.lower() or level == "ERROR":
-                                    stats["time_series"][window_name]["errors"] += 1
-                        elif window_name == "last_15m":
-                            if current_time - timedelta(minutes=15) <= log_time < current_time - timedelta(minutes=5):
-                                stats["time_series"][window_name]["total"] += 1
-                                if "error" in msg.lower() or level == "ERROR":
-                                    stats["time_series"][window_name]["errors"] += 1
-                        elif window_name == "last_1h":
-                            if current_time - timedelta(hours=1) <= log_time < current_time - timedelta(minutes=15):
-                                stats["time_series"][window_name]["total"] += 1
-                                if "error" in msg.lower() or level == "ERROR":
-                                    stats["time_series"][window_name]["errors"] += 1
-        except Exception:
-            pass
-    
-    # Calculate performance metrics
-    if stats["latencies"]:
-        latencies = sorted(stats["latencies"])
-        stats["performance_metrics"].update({
-            "avg_latency_ms": sum(latencies) / len(latencies),
-            "min_latency_ms": min(latencies),
-            "max_latency_ms": max(latencies),
-            "p95_latency_ms": latencies[int(len(latencies) * 0.95)],
-            "p99_latency_ms": latencies[int(len(latencies) * 0.99)]
-        })
-    
-    # Calculate rates
-    if stats["total"] > 0:
-        stats["performance_metrics"]["error_rate"] = (stats["errors"] / stats["total"]) * 100
-        stats["performance_metrics"]["success_rate"] = 100 - stats["performance_metrics"]["error_rate"]
-    
-    # Calculate service-specific metrics
-    for service in stats["services"]:
-        service_data = stats["services"][service]
-        if service_data["latencies"]:
-            service_data["avg_latency"] = sum(service_data["latencies"]) / len(service_data["latencies"])
-    
-    return stats
+    data = {"raw": line, "timestamp": datetime.now().isoformat(), "level": "INFO", "service": "unknown", "message": line}
+    log_classifier.tag(data)
+    log_epoch(data)
+    return data
+
+LOG_FILES = [
+    Path("/app/logs/metrics.log"),  # Main log file (controller)
+    Path("/app/logs/auth_service.log"),  # Auth service logs
+    Path("/app/logs/catalog_service.log"),  # Catalog service logs
+    Path("/app/logs/order_service.log"),  # Order service logs
+]
+
+# Incremental reader used by the background scanner (only parses newly appended lines)
+log_tailer = LogTailer(LOG_FILES, parse_log_line)
 
 async def scrape_prometheus() -> Dict[str, Any]:
     """Enhanced Prometheus metrics scraping with industry-standard queries"""
@@ -665,69 +537,41 @@ async def scrape_prometheus() -> Dict[str, Any]:
     return metrics
 
 # --- Enhanced Anomaly Detection ---
-def detect_anomalies(logs: List[Dict[str, Any]]) -> List[str]:
-    """Advanced anomaly detection with multiple algorithms"""
-    anomalies = []
-    
-    # Check last 100 logs for anomalies
-    recent_logs = logs[-100:] if len(logs) > 100 else logs
-    
-    # 1. Error rate anomaly
-    error_count = sum(1 for log in recent_logs if log.get("level") == "ERROR")
-    if error_count > 10:
-        anomalies.append(f"High error rate detected: {error_count} errors in last 100 logs")
-    
-    # 2. HTTP 500 anomaly
-    http_500_count = sum(1 for log in recent_logs if "500" in log.get("message", ""))
-    if http_500_count > 5:
-        anomalies.append(f"Spike in HTTP 500 errors: {http_500_count} in last 100 logs")
-    
-    # 3. Authentication failures anomaly
-    auth_failures = sum(1 for log in recent_logs if "401" in log.get("message", ""))
-    if auth_failures > 5:
-        anomalies.append(f"Spike in authentication failures: {auth_failures} in last 100 logs")
-    
-    # 4. Latency anomaly detection
-    latencies = []
-    for log in recent_logs:
-        latency = log.get("latency_ms")
-        if latency:
-            latencies.append(latency)
-    
-    if latencies:
-        avg_latency = sum(latencies) / len(latencies)
-        if avg_latency > 1000:  # More than 1 second average
-            anomalies.append(f"High average latency detected: {avg_latency:.2f}ms")
-        
-        # Detect latency spikes (values > 2x average)
-        threshold = avg_latency * 2
-        spikes = [l for l in latencies if l > threshold]
-        if len(spikes) > 3:
-            anomalies.append(f"Latency spikes detected: {len(spikes)} requests > {threshold:.2f}ms")
-    
-    # 5. Service-specific anomalies
-    service_errors = {}
-    for log in recent_logs:
-        service = log.get("service", "unknown")
-        if "error" in log.get("message", "").lower() or log.get("level") == "ERROR":
-            service_errors[service] = service_errors.get(service, 0) + 1
-    
-    for service, error_count in service_errors.items():
-        if error_count > 3:
-            anomalies.append(f"Service {service} has high error rate: {error_count} errors")
+def detect_anomalies() -> List[str]:
+    """Rate- and baseline-based anomaly detection over the per-service 1m/5m/15m windows.
+
+    The windows are updated as logs are recorded (see record_logs), so this only reads counters.
+    """
+    anomalies = anomaly_windows.detect()
     
     # --- Email alert for new anomalies ---
+    # Keyed on the normalized text: the live rates, counts and z-scores in the message don't re-alert
+    active = set()
     for anomaly in anomalies:
-        if anomaly not in sent_anomalies:
+        key = anomaly_key(anomaly)
+        active.add(key)
+        if key not in sent_anomalies:
             send_email_alert(
                 subject=f"[Health Monitor] Anomaly Detected",
                 content=f"Anomaly detected:\n{anomaly}\n\nSee dashboard for details."
             )
-            sent_anomalies.add(anomaly)
+            sent_anomalies.add(key)
+    # Forget anomalies that cleared, so the set stays small and a recurrence alerts again
+    sent_anomalies.intersection_update(active)
     return anomalies
 
 # --- Enhanced Ollama Integration with better error handling
-async def ask_ollama_for_root_cause_httpx(prompt: str) -> str:
+async def check_ollama_health(client: httpx.AsyncClient):
+    """[status_code, error] of Ollama's /api/tags; cached by the LLM gateway between generations"""
+    url = OLLAMA_URL.rstrip('/')
+    try:
+        health_resp = await client.get(f"{url}/api/tags", timeout=5.0)
+        print(f"Ollama health check status: {health_resp.status_code}")
+        return [health_resp.status_code, None]
+    except Exception as e:
+        return [None, str(e)]
+
+async def ask_ollama_for_root_cause_httpx(prompt: str, priority: int = PRIORITY_INTERACTIVE) -> str:
     """Direct HTTP call to Ollama API with comprehensive error handling"""
     url = OLLAMA_URL.rstrip('/')  # Remove trailing slash
     data = {
@@ -740,23 +584,23 @@ async def ask_ollama_for_root_cause_httpx(prompt: str) -> str:
             "max_tokens": 500
         }
     }
-    try:
-        print(f"Attempting to connect to Ollama at: {url}/api/generate")
-        print(f"Using model: {OLLAMA_MODEL}")
-        async with httpx.AsyncClient(timeout=httpx.Timeout(120.0)) as client:
-            # Health check
-            try:
-                health_resp = await client.get(f"{url}/api/tags", timeout=5.0)
-                print(f"Ollama health check status: {health_resp.status_code}")
-                if health_resp.status_code != 200:
-                    return f"Ollama is not responding properly. Status: {health_resp.status_code}"
-            except Exception as e:
-                return f"Cannot reach Ollama server at {url}. Error: {str(e)}"
+
+    async def generate(client: httpx.AsyncClient) -> str:
+        try:
+            print(f"Attempting to connect to Ollama at: {url}/api/generate")
+            print(f"Using model: {OLLAMA_MODEL}")
+            # Health check (cached for OLLAMA_HEALTH_TTL_SECONDS)
+            status_code, error = await llm_gateway.probe(url, check_ollama_health, lambda r: r[0] == 200)
+            if error is not None:
+                return f"Cannot reach Ollama server at {url}. Error: {error}"
+            if status_code != 200:
+                return f"Ollama is not responding properly. Status: {status_code}"
             # Generation request
             resp = await client.post(
                 f"{url}/api/generate",
                 json=data,
-                headers={"Content-Type": "application/json"}
+                headers={"Content-Type": "application/json"},
+                timeout=120.0
             )
             print(f"Ollama generate response status: {resp.status_code}")
             if resp.status_code == 200:
@@ -769,12 +613,15 @@ async def ask_ollama_for_root_cause_httpx(prompt: str) -> str:
             else:
                 error_text = resp.text
                 return f"Ollama API error (HTTP {resp.status_code}): {error_text}"
-    except httpx.TimeoutException:
-        return f"Timeout connecting to Ollama at {url}. The model might be loading or the server is slow."
-    except httpx.ConnectError:
-        return f"Connection failed to Ollama at {url}. Check if Ollama is running and accessible from the container."
-    except Exception as e:
-        return f"Unexpected error calling Ollama: {str(e)}"
+        except httpx.TimeoutException:
+            return f"Timeout connecting to Ollama at {url}. The model might be loading or the server is slow."
+        except httpx.ConnectError:
+            llm_gateway.invalidate(url)  # re-probe next time instead of trusting the cached health check
+            return f"Connection failed to Ollama at {url}. Check if Ollama is running and accessible from the container."
+        except Exception as e:
+            return f"Unexpected error calling Ollama: {str(e)}"
+
+    return await llm_gateway.call("ollama", data, generate, priority=priority)
 
 def get_groq_headers():
     return {
@@ -782,7 +629,7 @@ def get_groq_headers():
         "Content-Type": "application/json"
     }
 
-async def ask_llm_groq(prompt: str) -> str:
+async def ask_llm_groq(prompt: str, priority: int = PRIORITY_INTERACTIVE) -> str:
     if not GROQ_API_KEY:
         return "Error: GROQ_API_KEY not configured. Please set the GROQ_API_KEY environment variable."
     
@@ -794,10 +641,11 @@ async def ask_llm_groq(prompt: str) -> str:
             {"role": "user", "content": prompt}
         ]
     }
-    try:
-        print(f"Calling Groq API with model: {GROQ_MODEL}")
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            resp = await client.post(url, headers=headers, json=data)
+
+    async def complete(client: httpx.AsyncClient) -> str:
+        try:
+            print(f"Calling Groq API with model: {GROQ_MODEL}")
+            resp = await client.post(url, headers=headers, json=data, timeout=60.0)
             print(f"Groq API response status: {resp.status_code}")
             
             if resp.status_code != 200:
@@ -816,50 +664,140 @@ async def ask_llm_groq(prompt: str) -> str:
                 print(f"Unexpected Groq API response format: {result}")
                 return f"Unexpected Groq API response format: {result}"
                 
-    except httpx.TimeoutException:
-        return "Error: Groq API request timed out after 60 seconds."
-    except httpx.ConnectError:
-        return "Error: Cannot connect to Groq API. Check your internet connection."
-    except Exception as e:
-        print(f"Groq API exception: {str(e)}")
-        return f"Groq API error: {str(e)}"
+        except httpx.TimeoutException:
+            return "Error: Groq API request timed out after 60 seconds."
+        except httpx.ConnectError:
+            return "Error: Cannot connect to Groq API. Check your internet connection."
+        except Exception as e:
+            print(f"Groq API exception: {str(e)}")
+            return f"Groq API error: {str(e)}"
+
+    return await llm_gateway.call("groq", data, complete, priority=priority)
+
+async def stream_ollama(prompt: str, priority: int = PRIORITY_INTERACTIVE):
+    """Text chunks from Ollama's streaming /api/generate (one JSON object per line)"""
+    url = OLLAMA_URL.rstrip('/')
+    data = {
+        "model": OLLAMA_MODEL,
+        "prompt": prompt,
+        "stream": True,
+        "options": {
+            "temperature": 0.1,
+            "top_p": 0.9,
+            "max_tokens": 500
+        }
+    }
+
+    async def open_stream(client: httpx.AsyncClient):
+        status_code, error = await llm_gateway.probe(url, check_ollama_health, lambda r: r[0] == 200)
+        if error is not None:
+            raise LLMError(f"Cannot reach Ollama server at {url}. Error: {error}")
+        if status_code != 200:
+            raise LLMError(f"Ollama is not responding properly. Status: {status_code}")
+        try:
+            async with client.stream("POST", f"{url}/api/generate", json=data, timeout=120.0) as resp:
+                if resp.status_code != 200:
+                    error_text = (await resp.aread()).decode("utf-8", "replace")
+                    raise LLMError(f"Ollama API error (HTTP {resp.status_code}): {error_text}")
+                async for line in resp.aiter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = loads(line)
+                    if chunk.get("error"):
+                        raise LLMError(f"Ollama API error: {chunk['error']}")
+                    yield chunk.get("response", "")
+                    if chunk.get("done"):
+                        break
+        except httpx.TimeoutException:
+            raise LLMError(f"Timeout connecting to Ollama at {url}. The model might be loading or the server is slow.")
+        except httpx.ConnectError:
+            llm_gateway.invalidate(url)
+            raise LLMError(f"Connection failed to Ollama at {url}. Check if Ollama is running and accessible from the container.")
+
+    async for text in llm_gateway.stream("ollama", data, open_stream, priority=priority):
+        yield text
+
+async def stream_llm_groq(prompt: str, priority: int = PRIORITY_INTERACTIVE):
+    """Text chunks from Groq's chat completions with ``stream: true`` (SSE ``data:`` lines)"""
+    if not GROQ_API_KEY:
+        raise LLMError("Error: GROQ_API_KEY not configured. Please set the GROQ_API_KEY environment variable.")
+    url = "https://api.groq.com/openai/v1/chat/completions"
+    data = {
+        "model": GROQ_MODEL,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+        "stream": True
+    }
+
+    async def open_stream(client: httpx.AsyncClient):
+        try:
+            async with client.stream("POST", url, headers=get_groq_headers(), json=data, timeout=60.0) as resp:
+                if resp.status_code != 200:
+                    error_text = (await resp.aread()).decode("utf-8", "replace")
+                    raise LLMError(f"Groq API error (HTTP {resp.status_code}): {error_text}")
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == "[DONE]":
+                        break
+                    choices = loads(payload).get("choices") or [{}]
+                    yield (choices[0].get("delta") or {}).get("content") or ""
+        except httpx.TimeoutException:
+            raise LLMError("Error: Groq API request timed out after 60 seconds.")
+        except httpx.ConnectError:
+            raise LLMError("Error: Cannot connect to Groq API. Check your internet connection.")
+
+    async for text in llm_gateway.stream("groq", data, open_stream, priority=priority):
+        yield text
+
+async def ask_llm(prompt: str, priority: int = PRIORITY_INTERACTIVE) -> str:
+    """Complete ``prompt`` with the configured LLM_PROVIDER"""
+    if LLM_PROVIDER == "ollama":
+        return await ask_ollama_for_root_cause_httpx(prompt, priority=priority)
+    return await ask_llm_groq(prompt, priority=priority)
+
+def stream_llm(prompt: str, priority: int = PRIORITY_INTERACTIVE):
+    """Streaming counterpart of ask_llm: text chunks as they are generated; raises LLMError on failure"""
+    if LLM_PROVIDER == "ollama":
+        return stream_ollama(prompt, priority=priority)
+    return stream_llm_groq(prompt, priority=priority)
 
 # --- Focused log selection for root cause analysis ---
-def select_focused_logs_for_anomaly(logs, anomaly_text=None, window=10, max_logs=20):
-    # If anomaly_text is provided, try to find the log index with matching message
-    if anomaly_text:
-        for i, log in enumerate(reversed(logs)):
-            if anomaly_text.lower() in json.dumps(log, default=str).lower():
-                # Found anomaly log, select window around it
-                start = max(0, len(logs) - i - window)
-                end = min(len(logs), len(logs) - i + window)
-                return logs[start:end]
-    # If no anomaly or not found, fallback to last N error logs
-    error_logs = [log for log in logs if log.get("level") == "ERROR" or "error" in log.get("message", "").lower()]
-    if error_logs:
-        return error_logs[-max_logs:]
-    # Fallback: last N logs
-    return logs[-max_logs:]
-
-async def ai_incident_analysis(anomaly, logs, metrics, dependencies=None, cache_key=None):
-    # --- Caching logic ---
-    now = time.time()
-    if cache_key and cache_key in root_cause_cache:
-        cached = root_cause_cache[cache_key]
-        if now - cached["timestamp"] < CACHE_TTL_SECONDS:
-            return cached["result"]
-    # --- Flexible log selection ---
+def root_cause_cache_key(prompt_type: str, anomaly: str, focused_logs, dependencies=None) -> str:
+    """Fingerprint of what the analysis prompt is built from.
+
+    Anomalies are normalized (rates, counts and z-scores stripped) and the
+    logs in the prompt reduced to their set of (service, level, message
+    template), so requests that would get the same answer share one cache
+    entry.
+    """
+    anomalies = [part for part in (anomaly or "").split("; ") if part]
+    return "|".join((prompt_type, anomalies_fingerprint(anomalies), templates_fingerprint(focused_logs),
+                     digest([dependencies or ""])))
+
+AI_ANALYSIS_DEPENDENCIES = "auth_service -> order_service -> catalog_service (example)"
+AI_ANALYSIS_WINDOW_MINUTES = 15  # logs the root-cause endpoints (and the precomputed analyses) look at
+
+def focus_incident_logs(anomaly, logs):
+    """(prompt type, log section) of a root-cause analysis: the logs of the services named in the anomaly, else recent errors.
+
+    The section collapses repeated messages and keeps the most informative
+    lines within PROMPT_LOG_TOKEN_BUDGET (see build_log_section).
+    """
     if anomaly and anomaly != "No anomalies detected, manual analysis":
-        focused_logs = select_focused_logs_for_anomaly(logs, anomaly_text=anomaly)
+        focused_logs = focus_logs(logs, anomaly, PROMPT_MAX_LOGS)
         prompt_type = "incident"
     else:
         # No anomaly: use last N error logs, or last N logs if no errors
-        error_logs = [log for log in logs if log.get("level") == "ERROR" or "error" in log.get("message", "").lower()]
-        focused_logs = error_logs[-20:] if error_logs else logs[-20:]
+        focused_logs = focus_logs(logs, None, PROMPT_MAX_LOGS)
         prompt_type = "general"
-    recent_logs = focused_logs[-20:]
-    if not recent_logs:
-        recent_logs = [{"message": "No recent logs available."}]
+    section = build_log_section(focused_logs, PROMPT_LOG_TOKEN_BUDGET,
+                                focus=anomaly if prompt_type == "incident" else None)
+    return prompt_type, section
+
+def incident_prompt(prompt_type, anomaly, section, metrics, dependencies=None):
     if not metrics:
         metrics = {"total": 0, "errors": 0, "performance_metrics": {"error_rate": 0}}
     # --- Updated prompt for strict JSON output ---
@@ -868,7 +806,7 @@ async def ai_incident_analysis(anomaly, logs, metrics, dependencies=None, cache_
 
 INCIDENT DETAILS:\nAnomaly: {anomaly}
 
-RECENT LOGS (last {len(recent_logs)}):\n{chr(10).join([json.dumps(log, default=str)[:200] + '...' if len(json.dumps(log, default=str)) > 200 else json.dumps(log, default=str) for log in recent_logs])}
+RECENT LOGS ({section.header}; repeats shown once with ×count):\n{section.text}
 
 METRICS SUMMARY:\n- Total requests: {metrics.get('total', 0)}\n- Error count: {metrics.get('errors', 0)}\n- Error rate: {metrics.get('performance_metrics', {}).get('error_rate', 0):.2f}%
 
@@ -885,22 +823,32 @@ Respond ONLY with valid JSON. Do NOT include any explanation, markdown, or comme
 }}
 """
     else:
-        prompt = f"""You are an SRE reviewing system logs. No explicit anomaly was detected, but please review the following logs and metrics for any issues, unusual patterns, or potential risks.\n\nLOG SAMPLE (last {len(recent_logs)}):\n{chr(10).join([json.dumps(log, default=str)[:200] + '...' if len(json.dumps(log, default=str)) > 200 else json.dumps(log, default=str) for log in recent_logs])}\n\nMETRICS SUMMARY:\n- Total requests: {metrics.get('total', 0)}\n- Error count: {metrics.get('errors', 0)}\n- Error rate: {metrics.get('performance_metrics', {}).get('error_rate', 0):.2f}%\n\nSERVICE DEPENDENCIES: {dependencies or 'N/A'}\n\nRespond ONLY with valid JSON. Do NOT include any explanation, markdown, or comments. Your entire response must be a single valid JSON object, with no text before or after.\n{{\n  \"summary\": \"...\",\n  \"root_cause\": \"...\",\n  \"actions\": [\"...\", \"...\"],\n  \"prevention\": [\"...\", \"...\"],\n  \"confidence\": \"...\",\n  \"evidence\": [\"...\", \"...\"]\n}}\n"""
-    ai_result = await ask_llm_groq(prompt)
-    # --- Try to parse as JSON, removing comment lines ---
-    parsed_result = None
-    if isinstance(ai_result, str):
-        try:
-            # Extract JSON block
-            start = ai_result.find('{')
-            end = ai_result.rfind('}')
-            if start != -1 and end != -1:
-                json_str = ai_result[start:end+1]
-                # Remove lines starting with // (comments)
-                json_str = '\n'.join(line for line in json_str.splitlines() if not line.strip().startswith('//'))
-                parsed_result = json.loads(json_str)
-        except Exception as e:
-            parsed_result = None
+        prompt = f"""You are an SRE reviewing system logs. No explicit anomaly was detected, but please review the following logs and metrics for any issues, unusual patterns, or potential risks.\n\nLOG SAMPLE ({section.header}; repeats shown once with ×count):\n{section.text}\n\nMETRICS SUMMARY:\n- Total requests: {metrics.get('total', 0)}\n- Error count: {metrics.get('errors', 0)}\n- Error rate: {metrics.get('performance_metrics', {}).get('error_rate', 0):.2f}%\n\nSERVICE DEPENDENCIES: {dependencies or 'N/A'}\n\nRespond ONLY with valid JSON. Do NOT include any explanation, markdown, or comments. Your entire response must be a single valid JSON object, with no text before or after.\n{{\n  \"summary\": \"...\",\n  \"root_cause\": \"...\",\n  \"actions\": [\"...\", \"...\"],\n  \"prevention\": [\"...\", \"...\"],\n  \"confidence\": \"...\",\n  \"evidence\": [\"...\", \"...\"]\n}}\n"""
+    return prompt
+
+def parse_incident_analysis(ai_result):
+    """The JSON object in an LLM reply (comment lines removed), or None if there is none"""
+    if not isinstance(ai_result, str):
+        return None
+    try:
+        # Extract JSON block
+        start = ai_result.find('{')
+        end = ai_result.rfind('}')
+        if start != -1 and end != -1:
+            json_str = ai_result[start:end+1]
+            # Remove lines starting with // (comments)
+            json_str = '\n'.join(line for line in json_str.splitlines() if not line.strip().startswith('//'))
+            return json.loads(json_str)
+    except Exception:
+        pass
+    return None
+
+def incident_analysis_result(ai_result, cache_key=None):
+    """Response body for an LLM reply; well-formed answers are also cached under ``cache_key``"""
+    parsed_result = parse_incident_analysis(ai_result)
+    # Only well-formed answers are cached; errors and unparseable replies are retried next time
+    if cache_key and parsed_result:
+        root_cause_cache.set(cache_key, parsed_result)
     # If parsing failed, fallback to string in a single field
     if not parsed_result:
         parsed_result = {
@@ -911,27 +859,53 @@ Respond ONLY with valid JSON. Do NOT include any explanation, markdown, or comme
             "confidence": None,
             "evidence": []
         }
-    result = {
+    return {
         "anomalies": anomaly_cache,
-        "root_cause": parsed_result
+        "root_cause": parsed_result,
+        "cached": False
     }
-    # Cache the result
-    if cache_key:
-        root_cause_cache[cache_key] = {"timestamp": now, "result": result}
-    return result
 
-async def ai_log_summary(logs, metrics, dependencies=None):
-    # Limit to last 20 logs, and truncate each log string
-    max_logs = 30
-    recent_logs = logs[-max_logs:]
-    if not recent_logs:
-        recent_logs = [{"message": "No recent logs available."}]
+async def ai_incident_analysis(anomaly, logs, metrics, dependencies=None, use_cache=True):
+    prompt_type, section = focus_incident_logs(anomaly, logs)
+    # --- Caching: same anomalies and log templates -> same answer ---
+    cache_key = root_cause_cache_key(prompt_type, anomaly, section.logs, dependencies) if use_cache else None
+    if cache_key:
+        cached = root_cause_cache.get(cache_key)
+        if cached is not None:
+            return {"anomalies": anomaly_cache, "root_cause": cached, "cached": True}
+    prompt = incident_prompt(prompt_type, anomaly, section, metrics, dependencies)
+    ai_result = await ask_llm(prompt)
+    return incident_analysis_result(ai_result, cache_key)
+
+async def precompute_incident_analysis(anomaly):
+    """Analysis job body: what /api/root_cause would return for ``anomaly`` now, at background LLM priority.
+
+    Replies that aren't well-formed JSON fail the job (it is retried after a
+    while) instead of being served for the result TTL.
+    """
+    logs_window = list(parsed_logs.query(since=time.time() - AI_ANALYSIS_WINDOW_MINUTES * 60))
+    prompt_type, section = focus_incident_logs(anomaly, logs_window)
+    cache_key = root_cause_cache_key(prompt_type, anomaly, section.logs, AI_ANALYSIS_DEPENDENCIES)
+    cached = root_cause_cache.get(cache_key)
+    if cached is not None:
+        return {"anomalies": anomaly_cache, "root_cause": cached, "cached": True}
+    prompt = incident_prompt(prompt_type, anomaly, section, log_analytics.snapshot().copy(), AI_ANALYSIS_DEPENDENCIES)
+    ai_result = await ask_llm(prompt, priority=PRIORITY_BACKGROUND)
+    if parse_incident_analysis(ai_result) is None:
+        raise LLMError(ai_result[:300] if isinstance(ai_result, str) else "No analysis returned")
+    return incident_analysis_result(ai_result, cache_key)
+
+def llm_configured() -> bool:
+    return LLM_PROVIDER == "ollama" or bool(GROQ_API_KEY)
+
+def log_summary_prompt(logs, metrics, dependencies=None):
+    section = build_log_section(logs[-PROMPT_MAX_LOGS:], PROMPT_LOG_TOKEN_BUDGET)
     if not metrics:
         metrics = {"total": 0, "errors": 0, "performance_metrics": {"error_rate": 0}}
-    prompt = f"""You are an SRE reviewing system logs. Please provide a concise summary of the last {len(recent_logs)} logs.
+    prompt = f"""You are an SRE reviewing system logs. Please provide a concise summary of the last {section.total_logs} logs.
 
-LOG SAMPLE (last {len(recent_logs)}):
-{chr(10).join([json.dumps(log, default=str)[:200] + "..." if len(json.dumps(log, default=str)) > 200 else json.dumps(log, default=str) for log in recent_logs])}
+LOG SAMPLE ({section.header}; repeats shown once with ×count):
+{section.text}
 
 METRICS SUMMARY:
 - Total requests: {metrics.get('total', 0)}
@@ -947,26 +921,100 @@ Please provide:
 
 Keep response under 300 words.
 """
-    ai_result = await ask_llm_groq(prompt)
+    return prompt
+
+async def ai_log_summary(logs, metrics, dependencies=None):
+    ai_result = await ask_llm(log_summary_prompt(logs, metrics, dependencies))
     return {
         "summary": ai_result
     }
 
+async def ai_analysis_events(mode, anomaly, time_window_minutes, logs_window, metrics, dependencies=None,
+                             use_job=False):
+    """SSE stream for /api/ai_analysis?stream=true
+
+    ``start`` is sent right away, then one ``token`` event per generated
+    chunk, then ``result`` with the same body the non-streaming endpoint
+    returns (the JSON is parsed once generation is done), or ``error``.
+    A cached root-cause analysis is sent as ``start`` + ``result``; with
+    ``use_job``, so is a precomputed one once its job finishes.
+    """
+    if mode == "summary":
+        yield sse_event("start", {"mode": mode, "log_count": len(logs_window), "provider": LLM_PROVIDER})
+        prompt, cache_key = log_summary_prompt(logs_window, metrics, dependencies), None
+    else:
+        anomaly = anomaly or "Manual analysis requested"
+        job = analysis_jobs.get(anomaly) if use_job else None
+        prompt_type, section = focus_incident_logs(anomaly, logs_window)
+        cache_key = root_cause_cache_key(prompt_type, anomaly, section.logs, dependencies)
+        cached = root_cause_cache.get(cache_key)
+        yield sse_event("start", {"anomaly": anomaly, "time_window_minutes": time_window_minutes,
+                                  "log_count": len(logs_window), "provider": LLM_PROVIDER,
+                                  "cached": cached is not None,
+                                  "analysis_job": job.to_dict() if job is not None else None})
+        if job is not None:
+            # Precomputed (or being computed) in the background: wait for it rather than asking the LLM again
+            await analysis_jobs.wait(job)
+            if job.status == "done":
+                yield sse_event("result", {"anomaly": anomaly, "time_window_minutes": time_window_minutes,
+                                           "log_count": len(logs_window), "ai_analysis": job.result,
+                                           "analysis_job": job.to_dict()})
+                return
+        if cached is not None:
+            yield sse_event("result", {"anomaly": anomaly, "time_window_minutes": time_window_minutes,
+                                       "log_count": len(logs_window),
+                                       "ai_analysis": {"anomalies": anomaly_cache, "root_cause": cached, "cached": True}})
+            return
+        prompt = incident_prompt(prompt_type, anomaly, section, metrics, dependencies)
+    parts = []
+    try:
+        async for text in stream_llm(prompt):
+            parts.append(text)
+            yield sse_event("token", {"text": text})
+    except LLMError as e:
+        yield sse_event("error", {"message": str(e)})
+        return
+    except Exception as e:
+        print(f"[AI Analysis] Stream error: {e}")
+        yield sse_event("error", {"message": f"LLM stream failed: {str(e)}"})
+        return
+    ai_result = "".join(parts)
+    if mode == "summary":
+        yield sse_event("result", {"mode": mode, "log_count": len(logs_window), "ai_summary": {"summary": ai_result}})
+    else:
+        yield sse_event("result", {"anomaly": anomaly, "time_window_minutes": time_window_minutes,
+                                   "log_count": len(logs_window),
+                                   "ai_analysis": incident_analysis_result(ai_result, cache_key)})
+
+def record_logs(logs: List[Dict]):
+    """Add parsed logs to the in-memory store, the running summary, the timeseries rollups and the anomaly windows."""
+    parsed_logs.extend(logs)
+    log_analytics.add_many(logs)
+    log_rollups.add_many(logs)
+    anomaly_windows.add_many(logs)
+
 # --- Background Task ---
 async def background_log_scanner():
     """Enhanced background log scanner with Prometheus integration"""
-    global parsed_logs, metrics_summary, anomaly_cache, prometheus_metrics
-    last_size = 0
+    global anomaly_cache, prometheus_metrics
+    seen_anomalies = set()
     
     while True:
         try:
-            # Load and parse logs
-            logs = load_logs()
-            if len(logs) != last_size:
-                parsed_logs = logs
-                metrics_summary = analyze_logs(logs)
-                anomaly_cache = detect_anomalies(logs)
-                last_size = len(logs)
+            # Parse only the lines appended to the log files since the last cycle
+            new_logs = log_tailer.poll()
+            if new_logs:
+                record_logs(new_logs)
+            parsed_logs.evict()
+            log_rollups.prune()
+            # The windows slide with time, so re-check every cycle (it only reads counters)
+            anomaly_cache = detect_anomalies()
+            # A new anomaly starts its root-cause analysis right away, so it's ready when someone asks
+            current = {anomaly_key(anomaly) for anomaly in anomaly_cache}
+            if ANALYSIS_PRECOMPUTE and current - seen_anomalies and llm_configured():
+                analysis_jobs.submit("; ".join(anomaly_cache))
+            seen_anomalies = current
+            analysis_jobs.prune()
             
             # Scrape Prometheus metrics
             prometheus_metrics = await scrape_prometheus()
@@ -980,7 +1028,7 @@ async def background_log_scanner():
 @app.post("/register")
 async def register_user(data: RegisterModel):
     """Register a new user (persistent, MongoDB)"""
-    existing = users_collection.find_one({"email": data.email})
+    existing = await repos.users.get_by_email(data.email)
     if existing:
         return {"status": "error", "msg": "Email already registered"}
     hashed_pw = bcrypt.hash(data.password)
@@ -991,50 +1039,55 @@ async def register_user(data: RegisterModel):
         "lastLoginAt": None,
         "sessionCount": 0
     }
-    users_collection.insert_one(user_doc)
+    await repos.users.create(user_doc)
     return {"status": "success", "msg": "User registered successfully"}
 
 @app.post("/login")
 async def login_user(data: LoginModel):
     """Login a user (persistent, MongoDB)"""
-    user = users_collection.find_one({"email": data.email})
+    user = await repos.users.get_by_email(data.email)
     if not user or not bcrypt.verify(data.password, user["passwordHash"]):
         return {"status": "error", "msg": "Invalid credentials"}
     # Update user stats
-    users_collection.update_one({"_id": user["_id"]}, {"$set": {"lastLoginAt": datetime.utcnow()}, "$inc": {"sessionCount": 1}})
+    await repos.users.record_login(user["_id"], datetime.utcnow())
     # Create JWT token
     token = create_access_token({"email": data.email})
     return {"status": "success", "access_token": token}
 
 # --- API Endpoints ---
-@app.get("/api/summary")
+@app.get("/api/summary", response_class=FastJSONResponse)
 async def api_summary():
-    return {"summary": metrics_summary, "anomalies": anomaly_cache}
+    return FastJSONResponse({"summary": log_analytics.snapshot(), "anomalies": anomaly_cache})
 
-@app.get("/api/metrics")
+@app.get("/api/metrics", response_class=FastJSONResponse)
 async def api_metrics():
-    return {
-        "log_metrics": metrics_summary, 
+    return FastJSONResponse({
+        "log_metrics": log_analytics.snapshot(), 
         "prometheus_metrics": prometheus_metrics
-    }
+    })
 
 @app.get("/api/ai_analysis")
 async def api_ai_analysis(
     time_window_minutes: int = Query(15, ge=1, le=120),
     log_count: int = Query(None, ge=1, le=1000),
     anomaly: str = Query(None, description="Optional anomaly description"),
-    mode: str = Query("root_cause", description="Analysis mode: 'root_cause' or 'summary'")
+    mode: str = Query("root_cause", description="Analysis mode: 'root_cause' or 'summary'"),
+    stream: bool = Query(False, description="Stream tokens as Server-Sent Events (start, token..., result | error)")
 ):
-    now = datetime.now()
-    window_start = now - timedelta(minutes=time_window_minutes)
-    logs_window = [
-        log for log in parsed_logs
-        if "timestamp" in log and dateutil_parser.parse(log["timestamp"]).replace(tzinfo=None) >= window_start.replace(tzinfo=None)
-    ]
+    logs_window = list(parsed_logs.query(since=time.time() - time_window_minutes * 60))
     if log_count is not None:
         logs_window = parsed_logs[-log_count:]
-    metrics_snapshot = metrics_summary.copy() if metrics_summary else {}
-    dependencies = "auth_service -> order_service -> catalog_service (example)"
+    metrics_snapshot = log_analytics.snapshot().copy()
+    dependencies = AI_ANALYSIS_DEPENDENCIES
+    # Precomputed analyses cover the default window only
+    use_job = bool(anomaly) and log_count is None and time_window_minutes == AI_ANALYSIS_WINDOW_MINUTES
+    if stream:
+        return StreamingResponse(
+            ai_analysis_events(mode, anomaly, time_window_minutes, logs_window, metrics_snapshot, dependencies,
+                               use_job=use_job),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS
+        )
     if mode == "summary":
         ai_result = await ai_log_summary(logs_window, metrics_snapshot, dependencies)
         return {
@@ -1043,37 +1096,52 @@ async def api_ai_analysis(
             "ai_summary": ai_result
         }
     else:
-        # --- Use anomaly and time window as cache key ---
-        cache_key = f"{anomaly or 'manual'}|{window_start.isoformat()}|{len(logs_window)}"
-        ai_result = await ai_incident_analysis(anomaly or "Manual analysis requested", logs_window, metrics_snapshot, dependencies, cache_key=cache_key)
+        job = analysis_jobs.get(anomaly) if use_job else None
+        if job is not None and job.status != "failed":
+            # Precomputed in the background: the result, or its progress while it is queued / running
+            return {
+                "anomaly": anomaly,
+                "time_window_minutes": time_window_minutes,
+                "log_count": len(logs_window),
+                "ai_analysis": job.result,
+                "analysis_job": job.to_dict()
+            }
+        # Cached on the anomaly and the templates of the focused logs (see root_cause_cache_key)
+        ai_result = await ai_incident_analysis(anomaly or "Manual analysis requested", logs_window, metrics_snapshot, dependencies)
         return {
             "anomaly": anomaly or "Manual analysis requested",
             "time_window_minutes": time_window_minutes,
             "log_count": len(logs_window),
-            "ai_analysis": ai_result
+            "ai_analysis": ai_result,
+            "analysis_job": None
         }
 
 @app.get("/api/root_cause")
 async def api_root_cause():
     # Always run AI analysis, even if no anomalies detected
-    now = datetime.now()
-    window_start = now - timedelta(minutes=15)
-    logs_window = [
-        log for log in parsed_logs
-        if "timestamp" in log and dateutil_parser.parse(log["timestamp"]).replace(tzinfo=None) >= window_start.replace(tzinfo=None)
-    ]
-    metrics_snapshot = metrics_summary.copy() if metrics_summary else {}
-    dependencies = "auth_service -> order_service -> catalog_service (example)"
     anomaly_text = "; ".join(anomaly_cache) if anomaly_cache else "No anomalies detected, manual analysis"
+    job = analysis_jobs.get(anomaly_text) if anomaly_cache else None
+    if job is not None and job.status != "failed":
+        # Started by the background scanner when the anomaly fired: the result, or its progress
+        return {
+            "anomalies": anomaly_cache,
+            "root_cause": job.result,
+            "analysis_job": job.to_dict()
+        }
+    logs_window = list(parsed_logs.query(since=time.time() - AI_ANALYSIS_WINDOW_MINUTES * 60))
+    metrics_snapshot = log_analytics.snapshot().copy()
+    dependencies = AI_ANALYSIS_DEPENDENCIES
     ai_result = await ai_incident_analysis(anomaly_text, logs_window, metrics_snapshot, dependencies)
     return {
         "anomalies": anomaly_cache,
-        "root_cause": ai_result
+        "root_cause": ai_result,
+        "analysis_job": None
     }
 
 @app.get("/api/health")
 async def api_health():
     """Comprehensive health check endpoint"""
+    metrics_summary = log_analytics.snapshot()
     prometheus_healthy = "prometheus_error" not in prometheus_metrics
     logs_healthy = len(parsed_logs) > 0
     
@@ -1101,10 +1169,11 @@ async def api_health():
         }
     }
 
-@app.get("/api/analytics")
+@app.get("/api/analytics", response_class=FastJSONResponse)
 async def api_analytics():
     """Detailed analytics endpoint"""
-    return {
+    metrics_summary = log_analytics.snapshot()
+    return FastJSONResponse({
         "log_analytics": {
             "total_requests": metrics_summary.get("total", 0),
             "error_rate": f"{(metrics_summary.get('errors', 0) / max(metrics_summary.get('total', 1), 1)) * 100:.2f}%",
@@ -1116,7 +1185,7 @@ async def api_analytics():
         },
         "anomalies": anomaly_cache,
         "recent_errors": metrics_summary.get("last_10_errors", [])
-    }
+    })
 
 @app.get("/api/prometheus/status")
 async def api_prometheus_status():
@@ -1137,6 +1206,7 @@ async def api_prometheus_status():
 @app.get("/api/performance")
 async def api_performance():
     """Performance-focused analytics"""
+    metrics_summary = log_analytics.snapshot()
     perf_metrics = metrics_summary.get("performance_metrics", {})
     return {
         "latency_analysis": {
@@ -1158,6 +1228,7 @@ async def api_performance():
 @app.get("/api/errors/analysis")
 async def api_errors_analysis():
     """Detailed error analysis"""
+    metrics_summary = log_analytics.snapshot()
     return {
         "error_summary": {
             "total_errors": metrics_summary.get("errors", 0),
@@ -1245,65 +1316,94 @@ async def api_ollama_test():
             "model": OLLAMA_MODEL
         }
 
-def tail_log_file(path: Path, n: int) -> list:
-    """Efficiently read the last n lines from a file."""
-    with path.open('rb') as f:
-        f.seek(0, 2)
-        filesize = f.tell()
-        blocksize = 1024
-        data = b''
-        lines = []
-        while len(lines) <= n and f.tell() > 0:
-            seek_offset = min(f.tell(), blocksize)
-            f.seek(-seek_offset, 1)
-            data = f.read(seek_offset) + data
-            f.seek(-seek_offset, 1)
-            lines = data.split(b'\n')
-        # Only keep the last n lines
-        return [line.decode('utf-8', errors='replace') for line in lines[-n:] if line.strip()]
-
-@app.get("/api/logs")
+@app.get("/api/logs", response_class=FastJSONResponse)
 async def api_logs(
     offset: int = Query(0, ge=0),
     limit: int = Query(1000, ge=1, le=10000),  # Reduced back to 1000 for faster loading
     level: str = Query(None),
     service: str = Query(None),
     time_start: str = Query(None),
-    time_end: str = Query(None)
+    time_end: str = Query(None),
+    q: str = Query(None, description="Only logs whose message contains every word of this"),
+    cursor: str = Query(None, description="next_cursor from the previous page"),
+    source: str = Query("memory", description="memory (recent logs from every file and ingest) or mongo (persisted ingested logs)")
 ):
-    """Efficiently stream and filter logs from disk with pagination and filtering."""
-    # Read last (offset+limit) lines from the log file
-    n = offset + limit
-    lines = tail_log_file(LOG_PATH, n)
-    logs = [parse_log_line(line) for line in lines]
-    logs = logs[::-1]  # Newest first
-
-    # Apply filters
-    if level:
-        logs = [log for log in logs if log.get("level", "").upper() == level.upper()]
-    if service:
-        logs = [log for log in logs if log.get("service", "").lower() == service.lower()]
-    if time_start:
+    """Newest-first logs with index-backed filtering and cursor pagination.
+
+    Filters run on the store's service/level/time indexes before any entry is
+    read, so pages are always full; pass ``next_cursor`` back as ``cursor`` to
+    get the next page at the same cost as the first. ``offset`` still works
+    for the in-memory source.
+    """
+    if source not in ("memory", "mongo"):
+        raise HTTPException(status_code=400, detail="source must be 'memory' or 'mongo'")
+    start_ts = parse_timestamp(time_start) if time_start else None
+    end_ts = parse_timestamp(time_end) if time_end else None
+    position = None
+    if cursor:
         try:
-            start_dt = dateutil_parser.parse(time_start)
-            logs = [log for log in logs if "timestamp" in log and dateutil_parser.parse(log["timestamp"]) >= start_dt]
-        except Exception:
-            pass
-    if time_end:
+            cursor_source, position = decode_cursor(cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if cursor_source != source:
+            raise HTTPException(status_code=400, detail=f"Cursor belongs to source '{cursor_source}'")
+
+    if source == "mongo":
+        if offset:
+            raise HTTPException(status_code=400, detail="offset is not supported for source=mongo; use cursor")
         try:
-            end_dt = dateutil_parser.parse(time_end)
-            logs = [log for log in logs if "timestamp" in log and dateutil_parser.parse(log["timestamp"]) <= end_dt]
-        except Exception:
-            pass
-
-    paginated_logs = logs[offset:offset+limit]
-    return {
-        "logs": paginated_logs,
-        "total": len(logs),
+            before_id = ObjectId(position) if position is not None else None
+        except (InvalidId, TypeError):
+            raise HTTPException(status_code=400, detail="Malformed cursor")
+        try:
+            docs, next_id = await repos.logs.page(limit, service=service, level=level, since=start_ts,
+                                                  until=end_ts, text=q, before_id=before_id)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Log database unavailable: {e}")
+        logs = docs
+        next_cursor = encode_cursor("mongo", str(next_id)) if next_id is not None else None
+        total = None
+    else:
+        if position is not None and not isinstance(position, int):
+            raise HTTPException(status_code=400, detail="Malformed cursor")
+        records, next_seq = parsed_logs.page(limit, service=service, level=level, since=start_ts, until=end_ts,
+                                             text=q, before=position, offset=0 if position is not None else offset)
+        logs = [record.to_dict() for record in records]
+        next_cursor = encode_cursor("memory", next_seq) if next_seq is not None else None
+        # Counted from the index lists; a text search would have to visit every message
+        total = parsed_logs.count(service=service, level=level, since=start_ts, until=end_ts) if not q else None
+
+    return FastJSONResponse({
+        "logs": logs,
+        "total": total,
         "offset": offset,
         "limit": limit,
+        "next_cursor": next_cursor,
+        "source": source,
         "last_updated": datetime.now().isoformat()
-    }
+    })
+
+@app.get("/api/logs/stats")
+async def api_logs_stats(
+    service: str = Query(None),
+    level: str = Query(None),
+    window: str = Query("1h", description="Time window, e.g. 15m, 1h, 24h"),
+    interval: str = Query(None, description="Optional bucket size, e.g. 1m, 5m, 1h"),
+    by_service: bool = Query(False, description="Also break the figures down per service")
+):
+    """Request/error counts and latency avg/p50/p95/p99 over the in-memory logs, optionally per time bucket and service."""
+    stats = parsed_logs.aggregate(
+        service=service,
+        level=level,
+        since=time.time() - parse_duration(window, 3600),
+        interval=parse_duration(interval, 0) if interval else None,
+        by_service=by_service,
+    )
+    for group in stats.get("groups", []):
+        if "start" in group:
+            group["time"] = format_bucket_time(group["start"])
+    stats["backend"] = ANALYTICS_BACKEND
+    return stats
 
 @app.get("/api/services")
 async def api_services():
@@ -1327,15 +1427,12 @@ async def api_services():
                     continue
         return 0
     for name in service_names:
-        logs = [log for log in parsed_logs if log.get("service") == name]
-        errors = [log for log in logs if log.get("level") == "ERROR"]
-        latencies = [
-            (log.get("latency_ms") if log.get("latency_ms") is not None else log.get("duration_ms"))
-            for log in logs
-            if (log.get("latency_ms") is not None or log.get("duration_ms") is not None)
-        ]
-        latencies = [l for l in latencies if l is not None]
-        avg_latency = sum(latencies) / len(latencies) if latencies else None
+        total_requests = parsed_logs.count(service=name)
+        error_count = parsed_logs.count(service=name, level="ERROR")
+        latency = log_analytics.service_latency(name)
+        avg_latency = latency.avg if latency else None
+        p95_latency = latency.quantile(0.95) if latency else None
+        p99_latency = latency.quantile(0.99) if latency else None
         # Uptime: use process_start_time_seconds from Prometheus
         process_start_time = get_prom_value("process_start_time_seconds", name)
         if process_start_time > 0:
@@ -1347,14 +1444,16 @@ async def api_services():
         service_metrics[name] = {
             "name": name,
             "displayName": name.replace("_", " ").title(),
-            "status": "healthy" if len(errors) == 0 else "warning",
+            "status": "healthy" if error_count == 0 else "warning",
             "uptime": round(uptime, 2) if uptime else None,  # in minutes
             "avg_latency": round(avg_latency, 2) if avg_latency else None,
+            "p95_latency": round(p95_latency, 2) if p95_latency else None,
+            "p99_latency": round(p99_latency, 2) if p99_latency else None,
             "memory_mb": round(mem, 2),
             "cpu_percent": round(cpu, 2),
-            "error_rate": round((len(errors)/max(len(logs),1))*100, 2) if logs else 0,
-            "total_requests": len(logs),
-            "errors": len(errors),
+            "error_rate": round((error_count/max(total_requests,1))*100, 2) if total_requests else 0,
+            "total_requests": total_requests,
+            "errors": error_count,
         }
     return {"services": list(service_metrics.values())}
 
@@ -1366,6 +1465,24 @@ services_collection = mongo_db["registered_services"]
 logs_collection = mongo_db["logs"]  # <-- Add this line
 users_collection = mongo_db["users"]  # <-- Add this line
 metrics_history_collection = mongo_db["metrics_history"]  # <-- NEW: For historical metrics storage
+# Async (motor) access used by request handlers so Mongo round-trips never block the event loop;
+# the sync collections above are only used from worker threads and at startup
+repos = Repositories(MONGO_URI, os.getenv("MONGO_DB", "appvital"), sync_db=mongo_db)
+# Scraped history is written in batches off the event loop (see handle_scrape_result)
+metrics_history_writer = WriteBehindBuffer(
+    lambda docs, ordered=False: metrics_history_collection.insert_many(docs, ordered=ordered),
+    batch_size=METRICS_HISTORY_BATCH_SIZE,
+    flush_interval=METRICS_HISTORY_FLUSH_SECONDS,
+    max_pending=METRICS_HISTORY_MAX_PENDING,
+    name="Metrics History Writer",
+)
+ingest_pipeline = IngestPipeline(
+    process=lambda logs: record_logs(log_classifier.tag_many(logs)),
+    persist=lambda logs: repos.logs.insert_many(logs),
+    workers=INGEST_WORKERS,
+    max_pending=INGEST_MAX_PENDING,
+    batch_size=INGEST_BATCH_SIZE,
+)
 
 # Create indexes for efficient querying
 try:
@@ -1382,6 +1499,17 @@ try:
 except Exception as e:
     print(f"Error creating indexes: {e}")
 
+try:
+    # /api/logs?source=mongo pages newest-first on _id within the service/level filters
+    logs_collection.create_index([("service", pymongo.ASCENDING), ("level", pymongo.ASCENDING), ("_id", pymongo.DESCENDING)])
+    logs_collection.create_index([("level", pymongo.ASCENDING), ("_id", pymongo.DESCENDING)])
+    logs_collection.create_index([("timestamp_epoch", pymongo.DESCENDING)])
+    if LOG_TEXT_INDEX:
+        logs_collection.create_index([("message", pymongo.TEXT)])
+    print("Created indexes for logs collection")
+except Exception as e:
+    print(f"Error creating indexes: {e}")
+
 security = HTTPBearer()
 
 def get_current_user_email(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -1393,8 +1521,8 @@ def get_current_user_email(credentials: HTTPAuthorizationCredentials = Depends(s
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-def get_registered_services_for_user(user_email: str):
-    return list(services_collection.find({"owner": user_email}))
+async def get_registered_services_for_user(user_email: str):
+    return await repos.services.list_for_owner(user_email)
 
 def mongo_to_dict(doc):
     doc = dict(doc)
@@ -1405,10 +1533,10 @@ def mongo_to_dict(doc):
 @app.get("/api/registered_services")
 async def api_registered_services(user_email: str = Depends(get_current_user_email)):
     """Return registered services for the current user (MongoDB) with live metrics and status"""
-    # Trigger metrics scraping for this user
-    await scrape_metrics_for_user(user_email)
+    services = await get_registered_services_for_user(user_email)
+    # Only stale or never-scraped services are scraped; the rest come from the background scraper
+    await refresh_stale_service_metrics(services)
     
-    services = get_registered_services_for_user(user_email)
     result = []
     for svc in services:
         svc_dict = mongo_to_dict(svc)
@@ -1445,7 +1573,7 @@ async def register_service(data: dict, user_email: str = Depends(get_current_use
     if not name or not url:
         return {"status": "error", "message": "Name and URL are required"}
     # Check if service already exists for this user
-    existing = services_collection.find_one({"name": name, "owner": user_email})
+    existing = await repos.services.get(name, user_email)
     if existing:
         return {"status": "error", "message": f"Service '{name}' already exists"}
     doc = {
@@ -1455,7 +1583,7 @@ async def register_service(data: dict, user_email: str = Depends(get_current_use
         "createdAt": datetime.utcnow(),
         "endpoints": endpoints  # Store endpoints if provided
     }
-    services_collection.insert_one(doc)
+    await repos.services.create(doc)
     return {"status": "success", "message": f"Service '{name}' registered successfully"}
 
 @app.post("/api/registered_services/{service_name}/endpoints")
@@ -1464,11 +1592,8 @@ async def add_or_update_service_endpoints(
     endpoints: list = Body(...),
     user_email: str = Depends(get_current_user_email)
 ):
-    result = services_collection.update_one(
-        {"name": service_name, "owner": user_email},
-        {"$set": {"endpoints": endpoints}}
-    )
-    if result.matched_count == 0:
+    matched = await repos.services.update(service_name, user_email, {"$set": {"endpoints": endpoints}})
+    if matched == 0:
         raise HTTPException(status_code=404, detail="Service not found")
     return {"status": "success", "message": "Endpoints updated", "endpoints": endpoints}
 
@@ -1478,11 +1603,8 @@ async def delete_service_endpoint(
     path: str = Query(...),
     user_email: str = Depends(get_current_user_email)
 ):
-    result = services_collection.update_one(
-        {"name": service_name, "owner": user_email},
-        {"$pull": {"endpoints": {"path": path}}}
-    )
-    if result.matched_count == 0:
+    matched = await repos.services.update(service_name, user_email, {"$pull": {"endpoints": {"path": path}}})
+    if matched == 0:
         raise HTTPException(status_code=404, detail="Service not found")
     return {"status": "success", "message": f"Endpoint {path} removed"}
 
@@ -1498,7 +1620,7 @@ async def register_demo_services(data: dict):
         return {"status": "error", "message": "Name and URL are required"}
     
     # Check if service already exists (demo services are global)
-    existing = services_collection.find_one({"name": name})
+    existing = await repos.services.get(name)
     if existing:
         return {"status": "error", "message": f"Service '{name}' already exists"}
     
@@ -1509,14 +1631,14 @@ async def register_demo_services(data: dict):
         "createdAt": datetime.utcnow(),
         "is_demo": True
     }
-    services_collection.insert_one(doc)
+    await repos.services.create(doc)
     return {"status": "success", "message": f"Demo service '{name}' registered successfully"}
 
 @app.delete("/api/registered_services")
 async def delete_registered_service(name: str, user_email: str = Depends(get_current_user_email)):
     """Delete a registered service for the current user (MongoDB)"""
-    result = services_collection.delete_one({"name": name, "owner": user_email})
-    if result.deleted_count == 0:
+    deleted = await repos.services.delete(name, user_email)
+    if deleted == 0:
         return {"status": "error", "message": f"Service '{name}' not found for user"}
     return {"status": "success", "message": f"Service '{name}' deleted successfully"}
 
@@ -1535,10 +1657,9 @@ async def test_metrics_endpoint(url: str):
 
 @app.get("/api/system_overview")
 async def api_system_overview(user_email: str = Depends(get_current_user_email)):
-    # Trigger metrics scraping for this user
-    await scrape_metrics_for_user(user_email)
-    
-    services_response = get_registered_services_for_user(user_email)
+    services_response = await get_registered_services_for_user(user_email)
+    # Only stale or never-scraped services are scraped; the rest come from the background scraper
+    await refresh_stale_service_metrics(services_response)
     services = []
     for svc in services_response:
         svc_dict = mongo_to_dict(svc)
@@ -1559,7 +1680,7 @@ async def api_system_overview(user_email: str = Depends(get_current_user_email))
     unhealthy_count = len([s for s in services if s.get("status") != "healthy"])
 
     # --- NEW: Fetch all databases for this user ---
-    dbs = list(db_mgmt_collection.find({"owner": user_email}))
+    dbs = await repos.databases.list_for_owner(user_email)
     for db in dbs:
         db["_id"] = str(db["_id"])
     total = len(dbs)
@@ -1582,7 +1703,7 @@ async def api_system_overview(user_email: str = Depends(get_current_user_email))
 @app.get("/api/databases")
 async def api_databases(user_email: str = Depends(get_current_user_email)):
     """Return registered databases for the current user"""
-    dbs = list(db_mgmt_collection.find({"owner": user_email}))
+    dbs = await repos.databases.list_for_owner(user_email)
     for db in dbs:
         db["_id"] = str(db["_id"])
     return {"databases": dbs}
@@ -1708,10 +1829,10 @@ async def add_database(data: dict, user_email: str = Depends(get_current_user_em
     db_type = data.get("type", "mongodb")
     if not name or not uri or not db_type:
         return {"status": "error", "message": "Name, URI, and type are required"}
-    existing = db_mgmt_collection.find_one({"name": name, "owner": user_email})
+    existing = await repos.databases.get(name, user_email)
     if existing:
         return {"status": "error", "message": f"Database '{name}' already exists"}
-    health = check_database_health(db_type, uri)
+    health = await asyncio.to_thread(check_database_health, db_type, uri)
     db_doc = {
         "name": name,
         "uri": uri,
@@ -1719,65 +1840,160 @@ async def add_database(data: dict, user_email: str = Depends(get_current_user_em
         "owner": user_email,
         **health
     }
-    result = db_mgmt_collection.insert_one(db_doc)
-    db_doc["_id"] = str(result.inserted_id)
+    inserted_id = await repos.databases.create(db_doc)
+    db_doc["_id"] = str(inserted_id)
     return {"status": "success", "message": f"Database '{name}' added successfully", **db_doc}
 
 
 @app.get("/api/databases")
 async def api_databases():
     """Return all registered databases with their latest status."""
-    dbs = list(db_mgmt_collection.find({}))
+    dbs = await repos.databases.list_all()
     for db in dbs:
         db["_id"] = str(db["_id"])
     return {"databases": dbs}
 
 @app.delete("/api/databases")
 async def remove_database(name: str, user_email: str = Depends(get_current_user_email)):
-       result = db_mgmt_collection.delete_one({"name": name, "owner": user_email})
-       if result.deleted_count == 0:
+       deleted = await repos.databases.delete(name, user_email)
+       if deleted == 0:
            return {"status": "error", "message": f"Database '{name}' not found for user"}
        return {"status": "success", "message": f"Database '{name}' removed successfully"}
 
 # --- Periodic Health Check ---
 async def background_db_health_checker():
     while True:
-        dbs = list(db_mgmt_collection.find({}))
-        for db in dbs:
-            uri = db.get("uri")
-            db_type = db.get("type", "mongodb")
-            if not uri:
-                continue
-            health = check_database_health(db_type, uri)
-            db_mgmt_collection.update_one({"_id": db["_id"]}, {"$set": health})
+        try:
+            dbs = await repos.databases.list_all()
+            for db in dbs:
+                uri = db.get("uri")
+                db_type = db.get("type", "mongodb")
+                if not uri:
+                    continue
+                # Driver connects block, so each check runs in a worker thread
+                health = await asyncio.to_thread(check_database_health, db_type, uri)
+                await repos.databases.update_health(db["_id"], health)
+        except Exception as e:
+            print(f"[DB Health Checker] Error: {e}")
         await asyncio.sleep(60)  # Check every 60 seconds
 
+def queue_logs(logs: List[Any]) -> JSONResponse:
+    """Hand logs to the ingest pipeline: 202 once queued, 429 with Retry-After when it is full."""
+    if not ingest_pipeline.submit(logs):
+        retry_after = ingest_pipeline.retry_after()
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": str(retry_after)},
+            content={"status": "error", "message": f"Ingest queue is full, retry in {retry_after}s"}
+        )
+    return JSONResponse(
+        status_code=202,
+        content={"status": "accepted", "message": f"Accepted {len(logs)} logs for ingestion"}
+    )
+
 @app.post("/api/ingest_log")
-async def ingest_logs(data: dict):
-    """Ingest logs from services"""
+async def ingest_logs(request: Request):
+    """Ingest logs from services (queued; normalized, analyzed and stored by the ingest workers)"""
     try:
-        logs = data.get("logs", [])
-        if not logs:
-            return {"status": "error", "message": "No logs provided"}
-        # Insert logs into MongoDB
-        if logs:
-            logs_collection.insert_many(logs)
-        # Add logs to the parsed_logs list for analysis (optional, keep for in-memory analytics)
-        for log in logs:
-            parsed_logs.append(log)
-        return {"status": "success", "message": f"Successfully ingested {len(logs)} logs"}
-    except Exception as e:
-        return {"status": "error", "message": f"Failed to ingest logs: {str(e)}"}
+        data = loads(await request.body())
+    except DECODE_ERRORS:
+        return JSONResponse(status_code=400, content={"status": "error", "message": "Request body is not valid JSON"})
+    logs = data.get("logs") if isinstance(data, dict) else None
+    if not logs or not isinstance(logs, list):
+        return {"status": "error", "message": "No logs provided"}
+    return queue_logs(logs)
 
 @app.post("/api/ingest_single_log")
-async def ingest_single_log(log_entry: dict):
+async def ingest_single_log(request: Request):
     """Ingest a single log entry"""
     try:
-        logs_collection.insert_one(log_entry)
-        parsed_logs.append(log_entry)
-        return {"status": "success", "message": "Log ingested successfully"}
-    except Exception as e:
-        return {"status": "error", "message": f"Failed to ingest log: {str(e)}"}
+        log_entry = loads(await request.body())
+    except DECODE_ERRORS:
+        return JSONResponse(status_code=400, content={"status": "error", "message": "Request body is not valid JSON"})
+    if not isinstance(log_entry, dict):
+        return {"status": "error", "message": "Log entry must be a JSON object"}
+    return queue_logs([log_entry])
+
+@app.post("/api/ingest_ndjson")
+async def ingest_ndjson(request: Request):
+    """Ingest newline-delimited JSON logs (application/x-ndjson), optionally gzip/deflate/zstd compressed.
+
+    The body is decompressed and parsed chunk by chunk as it arrives and handed to the ingest
+    pipeline in INGEST_BATCH_SIZE slices, so memory stays bounded for large bodies; reading pauses
+    while the pipeline is full. Bad lines are counted and skipped instead of failing the batch.
+    """
+    try:
+        decompressor = decompressor_for(request.headers.get("content-encoding"))
+    except UnsupportedEncoding as e:
+        return JSONResponse(status_code=415, content={"status": "error", "message": str(e)})
+    decoder = NDJSONDecoder(max_line_bytes=INGEST_MAX_LINE_BYTES)
+    batch: List[Dict] = []
+    accepted = 0
+
+    def result(status: str, message: str) -> Dict[str, Any]:
+        return {
+            "status": status,
+            "message": message,
+            "accepted": accepted,
+            "lines": decoder.lines,
+            "errors": decoder.errors,
+            "error_samples": decoder.samples,
+        }
+
+    try:
+        async for chunk in request.stream():
+            for data in decompressor.decompress(chunk):
+                batch.extend(decoder.feed(data))
+                if len(batch) >= INGEST_BATCH_SIZE:
+                    if not await ingest_pipeline.put(batch):
+                        return JSONResponse(
+                            status_code=429,
+                            headers={"Retry-After": str(ingest_pipeline.retry_after())},
+                            content=result("error", f"Ingest queue is full after {accepted} logs; resend the rest later")
+                        )
+                    accepted += len(batch)
+                    batch = []
+        for data in decompressor.flush():
+            batch.extend(decoder.feed(data))
+        batch.extend(decoder.close())
+    except CorruptStream as e:
+        return JSONResponse(status_code=400, content=result("error", f"Could not decompress body: {e}"))
+    if batch:
+        if not await ingest_pipeline.put(batch):
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": str(ingest_pipeline.retry_after())},
+                content=result("error", f"Ingest queue is full after {accepted} logs; resend the rest later")
+            )
+        accepted += len(batch)
+    if not decoder.lines:
+        return JSONResponse(status_code=400, content=result("error", "No logs provided"))
+    return JSONResponse(status_code=202, content=result("accepted", f"Accepted {accepted} logs for ingestion"))
+
+@app.get("/api/debug/anomaly-windows")
+async def api_debug_anomaly_windows():
+    """Per-service window counters and EWMA baselines behind the anomaly detectors"""
+    return anomaly_windows.snapshot()
+
+@app.get("/api/debug/root-cause-cache")
+async def api_debug_root_cause_cache():
+    """Size, hit rate and evictions of the AI root-cause cache"""
+    return root_cause_cache.stats()
+
+@app.get("/api/debug/llm-gateway")
+async def api_debug_llm_gateway():
+    """In-flight and queued LLM calls per provider, coalescing counters and cached Ollama health"""
+    return llm_gateway.stats()
+
+@app.get("/api/debug/analysis-jobs")
+async def api_debug_analysis_jobs():
+    """Precomputed root-cause analyses: status per anomaly and LLM budget use"""
+    return analysis_jobs.stats()
+
+@app.get("/api/debug/ingest-pipeline")
+async def api_debug_ingest_pipeline():
+    """Queue depth, throughput and error counters of the ingest pipeline"""
+    return {**ingest_pipeline.stats(), "json_backend": JSON_BACKEND}
 
 @app.get("/api/debug/service-log-counts")
 async def api_debug_service_log_counts():
@@ -1785,26 +2001,19 @@ async def api_debug_service_log_counts():
     service_counts = {}
     total_logs = len(parsed_logs)
     
-    # Count logs by service
-    for log in parsed_logs:
-        service = log.get("service", "unknown")
-        if service not in service_counts:
-            service_counts[service] = {"total": 0, "errors": 0, "info": 0, "warning": 0}
-        
-        service_counts[service]["total"] += 1
-        level = log.get("level", "").upper()
-        if level == "ERROR":
-            service_counts[service]["errors"] += 1
-        elif level == "INFO":
-            service_counts[service]["info"] += 1
-        elif level == "WARNING":
-            service_counts[service]["warning"] += 1
+    # Count logs by service straight from the store's service/level indexes
+    for service, levels in parsed_logs.counts_by_service_level().items():
+        service_counts[service] = {
+            "total": sum(levels.values()),
+            "errors": levels.get("ERROR", 0),
+            "info": levels.get("INFO", 0),
+            "warning": levels.get("WARNING", 0)
+        }
     
     # Get sample logs for each service
     sample_logs = {}
     for service in service_counts.keys():
-        service_logs = [log for log in parsed_logs if log.get("service") == service]
-        sample_logs[service] = service_logs[-5:] if service_logs else []  # Last 5 logs
+        sample_logs[service] = parsed_logs.tail(5, service=service)  # Last 5 logs
     
     return {
         "total_logs": total_logs,
@@ -1815,75 +2024,72 @@ async def api_debug_service_log_counts():
         "last_updated": datetime.now().isoformat()
     }
 
+@app.get("/api/debug/scrape-stats")
+async def api_debug_scrape_stats():
+    """Per-target scrape interval, timeout, last duration and failure counts"""
+    return scrape_scheduler.stats()
+
+@app.get("/api/debug/metrics-history-writer")
+async def api_debug_metrics_history_writer():
+    """Write-behind buffer counters: pending, written, dropped and flush latency"""
+    return metrics_history_writer.stats()
+
 @app.get("/api/debug/log-sample")
 async def api_debug_log_sample():
     # Return the last 20 error logs with service and level fields
-    error_logs = [log for log in parsed_logs if log.get("level") == "ERROR"]
-    return {"error_logs": error_logs[-20:]}
+    return {"error_logs": parsed_logs.tail(20, level="ERROR")}
 
 @app.get("/api/debug/service-error-counts")
 async def api_debug_service_error_counts():
     # Count ERROR logs per service
-    error_counts = {}
-    for log in parsed_logs:
-        if log.get("level") == "ERROR":
-            service = log.get("service", "unknown")
-            error_counts[service] = error_counts.get(service, 0) + 1
+    error_counts = {
+        service: levels["ERROR"]
+        for service, levels in parsed_logs.counts_by_service_level().items()
+        if levels.get("ERROR")
+    }
     return {"service_error_counts": error_counts}
 
+def parse_duration(value: str, default_seconds: int) -> int:
+    """Convert a window/interval string such as '15m', '6h' or '7d' to seconds."""
+    if value.endswith("h"):
+        return int(value[:-1]) * 3600
+    elif value.endswith("d"):
+        return int(value[:-1]) * 86400
+    elif value.endswith("m"):
+        return int(value[:-1]) * 60
+    return default_seconds
+
+def format_bucket_time(bucket_ts: int) -> str:
+    return datetime.utcfromtimestamp(bucket_ts).strftime("%Y-%m-%dT%H:%M:00Z")
+
+def latency_buckets_to_series(buckets) -> list:
+    """Average response time per rollup bucket, skipping buckets without latency data."""
+    result = []
+    for bucket_ts in sorted(buckets):
+        count = buckets[bucket_ts].latency_count
+        if not count:
+            continue
+        result.append({
+            "time": format_bucket_time(bucket_ts),
+            "avg_response_time_ms": round(buckets[bucket_ts].latency_sum / count, 2),
+            "count": count
+        })
+    return result
+
 @app.get("/api/metrics/error_rate_timeseries")
 async def error_rate_timeseries(
     window: str = Query("24h", description="Time window, e.g. 24h, 1h, 7d"),
     interval: str = Query("1h", description="Interval, e.g. 1h, 15m, 5m")
 ):
     """Return error rate over time as a list of time buckets."""
-    # Parse window and interval
-    now = datetime.utcnow()
-    if window.endswith("h"):
-        window_td = timedelta(hours=int(window[:-1]))
-    elif window.endswith("d"):
-        window_td = timedelta(days=int(window[:-1]))
-    elif window.endswith("m"):
-        window_td = timedelta(minutes=int(window[:-1]))
-    else:
-        window_td = timedelta(hours=24)
-    if interval.endswith("h"):
-        interval_td = timedelta(hours=int(interval[:-1]))
-    elif interval.endswith("d"):
-        interval_td = timedelta(days=int(interval[:-1]))
-    elif interval.endswith("m"):
-        interval_td = timedelta(minutes=int(interval[:-1]))
-    else:
-        interval_td = timedelta(hours=1)
-    start_time = now - window_td
-    # Prepare buckets
-    buckets = defaultdict(lambda: {"total": 0, "errors": 0})
-    logs = parsed_logs if parsed_logs else load_logs()
-    interval_seconds = int(interval_td.total_seconds())
-    for log in logs:
-        ts = log.get("timestamp")
-        if not ts:
-            continue
-        try:
-            log_time = dateutil_parser.parse(ts).replace(tzinfo=None)
-        except Exception:
-            continue
-        if log_time < start_time or log_time > now:
-            continue
-        # Robust bucket start calculation
-        bucket_start_ts = int((log_time.timestamp() // interval_seconds) * interval_seconds)
-        bucket_key = datetime.utcfromtimestamp(bucket_start_ts).strftime("%Y-%m-%dT%H:%M:00Z")
-        buckets[bucket_key]["total"] += 1
-        if log.get("level") == "ERROR" or ("error" in log.get("message", "").lower()):
-            buckets[bucket_key]["errors"] += 1
-    # Format result
+    buckets = log_rollups.query(parse_duration(window, 24 * 3600), parse_duration(interval, 3600))
     result = []
-    for bucket in sorted(buckets.keys()):
-        total = buckets[bucket]["total"]
-        errors = buckets[bucket]["errors"]
+    for bucket_ts in sorted(buckets):
+        total = buckets[bucket_ts].requests
+        errors = buckets[bucket_ts].errors
         error_rate = (errors / total * 100) if total > 0 else 0.0
         result.append({
-            "time": bucket,
+            "time": format_bucket_time(bucket_ts),
             "error_rate": round(error_rate, 2),
             "total": total,
             "errors": errors
@@ -1896,100 +2102,19 @@ async def http_requests_timeseries(
     window: str = Query("24h"),
     interval: str = Query("1h")
 ):
-    now = datetime.utcnow()
-    # Parse window and interval
-    if window.endswith("h"):
-        window_td = timedelta(hours=int(window[:-1]))
-    elif window.endswith("d"):
-        window_td = timedelta(days=int(window[:-1]))
-    elif window.endswith("m"):
-        window_td = timedelta(minutes=int(window[:-1]))
-    else:
-        window_td = timedelta(hours=24)
-    if interval.endswith("h"):
-        interval_td = timedelta(hours=int(interval[:-1]))
-    elif interval.endswith("d"):
-        interval_td = timedelta(days=int(interval[:-1]))
-    elif interval.endswith("m"):
-        interval_td = timedelta(minutes=int(interval[:-1]))
-    else:
-        interval_td = timedelta(hours=1)
-    start_time = now - window_td
-    buckets = defaultdict(lambda: {"total": 0})
-    logs = parsed_logs if parsed_logs else load_logs()
-    interval_seconds = int(interval_td.total_seconds())
-    for log in logs:
-        ts = log.get("timestamp")
-        if not ts:
-            continue
-        try:
-            log_time = dateutil_parser.parse(ts).replace(tzinfo=None)
-        except Exception:
-            continue
-        if log_time < start_time or log_time > now:
-            continue
-        bucket_start_ts = int((log_time.timestamp() // interval_seconds) * interval_seconds)
-        bucket_key = datetime.utcfromtimestamp(bucket_start_ts).strftime("%Y-%m-%dT%H:%M:00Z")
-        buckets[bucket_key]["total"] += 1
-    result = []
-    for bucket in sorted(buckets.keys()):
-        result.append({
-            "time": bucket,
-            "total": buckets[bucket]["total"]
-        })
-    return result
+    buckets = log_rollups.query(parse_duration(window, 24 * 3600), parse_duration(interval, 3600))
+    return [
+        {"time": format_bucket_time(bucket_ts), "total": buckets[bucket_ts].requests}
+        for bucket_ts in sorted(buckets)
+    ]
 
 @app.get("/api/metrics/response_time_timeseries")
 async def response_time_timeseries(
     window: str = Query("24h"),
     interval: str = Query("1h")
 ):
-    now = datetime.utcnow()
-    if window.endswith("h"):
-        window_td = timedelta(hours=int(window[:-1]))
-    elif window.endswith("d"):
-        window_td = timedelta(days=int(window[:-1]))
-    elif window.endswith("m"):
-        window_td = timedelta(minutes=int(window[:-1]))
-    else:
-        window_td = timedelta(hours=24)
-    if interval.endswith("h"):
-        interval_td = timedelta(hours=int(interval[:-1]))
-    elif interval.endswith("d"):
-        interval_td = timedelta(days=int(interval[:-1]))
-    elif interval.endswith("m"):
-        interval_td = timedelta(minutes=int(interval[:-1]))
-    else:
-        interval_td = timedelta(hours=1)
-    start_time = now - window_td
-    buckets = defaultdict(lambda: {"count": 0, "sum": 0.0})
-    logs = parsed_logs if parsed_logs else load_logs()
-    interval_seconds = int(interval_td.total_seconds())
-    for log in logs:
-        ts = log.get("timestamp")
-        latency = log.get("latency_ms") or log.get("duration_ms")
-        if not ts or latency is None:
-            continue
-        try:
-            log_time = dateutil_parser.parse(ts).replace(tzinfo=None)
-        except Exception:
-            continue
-        if log_time < start_time or log_time > now:
-            continue
-        bucket_start_ts = int((log_time.timestamp() // interval_seconds) * interval_seconds)
-        bucket_key = datetime.utcfromtimestamp(bucket_start_ts).strftime("%Y-%m-%dT%H:%M:00Z")
-        buckets[bucket_key]["count"] += 1
-        buckets[bucket_key]["sum"] += latency
-    result = []
-    for bucket in sorted(buckets.keys()):
-        count = buckets[bucket]["count"]
-        avg = buckets[bucket]["sum"] / count if count > 0 else 0
-        result.append({
-            "time": bucket,
-            "avg_response_time_ms": round(avg, 2),
-            "count": count
-        })
-    return result
+    buckets = log_rollups.query(parse_duration(window, 24 * 3600), parse_duration(interval, 3600))
+    return latency_buckets_to_series(buckets)
 
 @app.get("/api/metrics/cpu_usage_timeseries")
 async def cpu_usage_timeseries(
@@ -2108,31 +2233,7 @@ async def memory_usage_timeseries(
 async def response_code_distribution(
     window: str = Query("24h")
 ):
-    now = datetime.utcnow()
-    if window.endswith("h"):
-        window_td = timedelta(hours=int(window[:-1]))
-    elif window.endswith("d"):
-        window_td = timedelta(days=int(window[:-1]))
-    elif window.endswith("m"):
-        window_td = timedelta(minutes=int(window[:-1]))
-    else:
-        window_td = timedelta(hours=24)
-    start_time = now - window_td
-    logs = parsed_logs if parsed_logs else load_logs()
-    code_counts = {}
-    for log in logs:
-        ts = log.get("timestamp")
-        code = str(log.get("status_code"))
-        if not ts or not code:
-            continue
-        try:
-            log_time = dateutil_parser.parse(ts).replace(tzinfo=None)
-        except Exception:
-            continue
-        if log_time < start_time or log_time > now:
-            continue
-        code_counts[code] = code_counts.get(code, 0) + 1
-    return code_counts
+    return dict(log_rollups.total(parse_duration(window, 24 * 3600)).status_codes)
 
 # --- Expandable: Add more endpoints or analysis as needed --- 
 
@@ -2141,7 +2242,7 @@ async def api_all_registered_services():
     """Return ALL registered services from ALL users (for controller/demo purposes)"""
     try:
         # Get all registered services from all users
-        all_services = list(services_collection.find({}))
+        all_services = await repos.services.list_all()
         result = []
         for svc in all_services:
             svc_dict = mongo_to_dict(svc)
@@ -2203,7 +2304,7 @@ async def reset_service_uptime(service_name: str, user_email: str = Depends(get_
     global service_uptime_tracker
     
     # Verify service ownership
-    service_doc = services_collection.find_one({"name": service_name, "owner": user_email})
+    service_doc = await repos.services.get(service_name, user_email)
     if not service_doc:
         raise HTTPException(status_code=404, detail=f"Service {service_name} not found")
     
@@ -2221,7 +2322,7 @@ async def get_uptime_info(service_name: str, user_email: str = Depends(get_curre
     global service_uptime_tracker
     
     # Verify service ownership
-    service_doc = services_collection.find_one({"name": service_name, "owner": user_email})
+    service_doc = await repos.services.get(service_name, user_email)
     if not service_doc:
         raise HTTPException(status_code=404, detail=f"Service {service_name} not found")
     
@@ -2259,7 +2360,7 @@ async def api_service_metrics(
             raise HTTPException(status_code=404, detail=f"Service {service_name} not found")
         
         # Get the service from database to verify ownership
-        service_doc = services_collection.find_one({"name": service_name, "owner": user_email})
+        service_doc = await repos.services.get(service_name, user_email)
         if not service_doc:
             raise HTTPException(status_code=404, detail=f"Service {service_name} not found")
         
@@ -2404,28 +2505,23 @@ async def test_endpoint():
 @app.get("/api/service_metrics/{service_name}/summary")
 async def api_service_metrics_summary(service_name: str):
     """Return service-specific metrics summary from logs for the Metrics tab."""
-    # Filter logs for this service
-    logs = [log for log in parsed_logs if log.get("service") == service_name]
-    total_requests = len(logs)
-    errors = [log for log in logs if log.get("level") == "ERROR" or "error" in log.get("message", "").lower()]
-    error_count = len(errors)
-    latencies = [
-        (log.get("latency_ms") if log.get("latency_ms") is not None else log.get("duration_ms"))
-        for log in logs
-        if (log.get("latency_ms") is not None or log.get("duration_ms") is not None)
-    ]
-    latencies = [l for l in latencies if l is not None]
-    avg_latency = sum(latencies) / len(latencies) if latencies else None
+    # Counts and latency straight from the store's columns (vectorized when NumPy is installed)
+    stats = parsed_logs.aggregate(service=service_name)
+    total_requests = stats["requests"]
+    error_count = stats["errors"]
+    latency = stats["latency_ms"]
     error_rate = (error_count / total_requests * 100) if total_requests > 0 else 0.0
     # Status: healthy if no errors in last 10 logs, else warning/down
-    recent_logs = logs[-10:]
-    recent_errors = [log for log in recent_logs if log.get("level") == "ERROR" or "error" in log.get("message", "").lower()]
+    recent_logs = parsed_logs.tail(10, service=service_name, records=True)
+    recent_errors = [log for log in recent_logs if log.level == "ERROR" or "error" in (log.message or "").lower()]
     status = "healthy" if not recent_errors else ("warning" if error_count < total_requests else "down")
     return {
         "service": service_name,
         "total_requests": total_requests,
         "errors": error_count,
-        "avg_latency_ms": round(avg_latency, 2) if avg_latency is not None else None,
+        "avg_latency_ms": latency["avg"],
+        "p95_latency_ms": latency["p95"],
+        "p99_latency_ms": latency["p99"],
         "error_rate": round(error_rate, 2),
         "status": status
     }
@@ -2436,50 +2532,11 @@ async def service_requests_timeseries(
     window: str = Query("6h"),
     interval: str = Query("5m")
 ):
-    now = datetime.utcnow()
-    # Parse window and interval
-    if window.endswith("h"):
-        window_td = timedelta(hours=int(window[:-1]))
-    elif window.endswith("d"):
-        window_td = timedelta(days=int(window[:-1]))
-    elif window.endswith("m"):
-        window_td = timedelta(minutes=int(window[:-1]))
-    else:
-        window_td = timedelta(hours=6)
-    if interval.endswith("h"):
-        interval_td = timedelta(hours=int(interval[:-1]))
-    elif interval.endswith("d"):
-        interval_td = timedelta(days=int(interval[:-1]))
-    elif interval.endswith("m"):
-        interval_td = timedelta(minutes=int(interval[:-1]))
-    else:
-        interval_td = timedelta(minutes=5)
-    start_time = now - window_td
-    interval_seconds = int(interval_td.total_seconds())
-    # Filter logs for this service
-    logs = [log for log in parsed_logs if log.get("service") == service_name]
-    # Bucket by interval
-    buckets = defaultdict(lambda: {"total": 0})
-    for log in logs:
-        ts = log.get("timestamp")
-        if not ts:
-            continue
-        try:
-            log_time = dateutil_parser.parse(ts).replace(tzinfo=None)
-        except Exception:
-            continue
-        if log_time < start_time or log_time > now:
-            continue
-        bucket_start_ts = int((log_time.timestamp() // interval_seconds) * interval_seconds)
-        bucket_key = datetime.utcfromtimestamp(bucket_start_ts).strftime("%Y-%m-%dT%H:%M:00Z")
-        buckets[bucket_key]["total"] += 1
-    result = []
-    for bucket in sorted(buckets.keys()):
-        result.append({
-            "time": bucket,
-            "total": buckets[bucket]["total"]
-        })
-    return result
+    buckets = log_rollups.query(parse_duration(window, 6 * 3600), parse_duration(interval, 300), service=service_name)
+    return [
+        {"time": format_bucket_time(bucket_ts), "total": buckets[bucket_ts].requests}
+        for bucket_ts in sorted(buckets)
+    ]
 
 @app.get("/api/service_metrics/{service_name}/response_time_timeseries")
 async def service_response_time_timeseries(
@@ -2487,54 +2544,8 @@ async def service_response_time_timeseries(
     window: str = Query("6h"),
     interval: str = Query("5m")
 ):
-    now = datetime.utcnow()
-    if window.endswith("h"):
-        window_td = timedelta(hours=int(window[:-1]))
-    elif window.endswith("d"):
-        window_td = timedelta(days=int(window[:-1]))
-    elif window.endswith("m"):
-        window_td = timedelta(minutes=int(window[:-1]))
-    else:
-        window_td = timedelta(hours=6)
-    if interval.endswith("h"):
-        interval_td = timedelta(hours=int(interval[:-1]))
-    elif interval.endswith("d"):
-        interval_td = timedelta(days=int(interval[:-1]))
-    elif interval.endswith("m"):
-        interval_td = timedelta(minutes=int(interval[:-1]))
-    else:
-        interval_td = timedelta(minutes=5)
-    start_time = now - window_td
-    interval_seconds = int(interval_td.total_seconds())
-    # Filter logs for this service
-    logs = [log for log in parsed_logs if log.get("service") == service_name]
-    # Bucket by interval
-    buckets = defaultdict(lambda: {"count": 0, "sum": 0.0})
-    for log in logs:
-        ts = log.get("timestamp")
-        latency = log.get("latency_ms") or log.get("duration_ms")
-        if not ts or latency is None:
-            continue
-        try:
-            log_time = dateutil_parser.parse(ts).replace(tzinfo=None)
-        except Exception:
-            continue
-        if log_time < start_time or log_time > now:
-            continue
-        bucket_start_ts = int((log_time.timestamp() // interval_seconds) * interval_seconds)
-        bucket_key = datetime.utcfromtimestamp(bucket_start_ts).strftime("%Y-%m-%dT%H:%M:00Z")
-        buckets[bucket_key]["count"] += 1
-        buckets[bucket_key]["sum"] += latency
-    result = []
-    for bucket in sorted(buckets.keys()):
-        count = buckets[bucket]["count"]
-        avg = buckets[bucket]["sum"] / count if count > 0 else 0
-        result.append({
-            "time": bucket,
-            "avg_response_time_ms": round(avg, 2),
-            "count": count
-        })
-    return result
+    buckets = log_rollups.query(parse_duration(window, 6 * 3600), parse_duration(interval, 300), service=service_name)
+    return latency_buckets_to_series(buckets)
 
 @app.get("/api/service_metrics/{service_name}/errors_timeseries")
 async def service_errors_timeseries(
@@ -2542,87 +2553,42 @@ async def service_errors_timeseries(
     window: str = Query("6h"),
     interval: str = Query("5m")
 ):
-    now = datetime.utcnow()
-    # Parse window and interval
-    if window.endswith("h"):
-        window_td = timedelta(hours=int(window[:-1]))
-    elif window.endswith("d"):
-        window_td = timedelta(days=int(window[:-1]))
-    elif window.endswith("m"):
-        window_td = timedelta(minutes=int(window[:-1]))
-    else:
-        window_td = timedelta(hours=6)
-    if interval.endswith("h"):
-        interval_td = timedelta(hours=int(interval[:-1]))
-    elif interval.endswith("d"):
-        interval_td = timedelta(days=int(interval[:-1]))
-    elif interval.endswith("m"):
-        interval_td = timedelta(minutes=int(interval[:-1]))
-    else:
-        interval_td = timedelta(minutes=5)
-    start_time = now - window_td
-    interval_seconds = int(interval_td.total_seconds())
-    # Filter logs for this service
-    logs = [log for log in parsed_logs if log.get("service") == service_name]
-    # Bucket by interval
-    buckets = defaultdict(lambda: {"errors": 0})
-    for log in logs:
-        ts = log.get("timestamp")
-        if not ts:
-            continue
-        try:
-            log_time = dateutil_parser.parse(ts).replace(tzinfo=None)
-        except Exception:
-            continue
-        if log_time < start_time or log_time > now:
-            continue
-        if log.get("level") == "ERROR" or "error" in log.get("message", "").lower():
-            bucket_start_ts = int((log_time.timestamp() // interval_seconds) * interval_seconds)
-            bucket_key = datetime.utcfromtimestamp(bucket_start_ts).strftime("%Y-%m-%dT%H:%M:00Z")
-            buckets[bucket_key]["errors"] += 1
-    result = []
-    for bucket in sorted(buckets.keys()):
-        result.append({
-            "time": bucket,
-            "errors": buckets[bucket]["errors"]
-        })
-    return result
+    buckets = log_rollups.query(parse_duration(window, 6 * 3600), parse_duration(interval, 300), service=service_name)
+    return [
+        {"time": format_bucket_time(bucket_ts), "errors": buckets[bucket_ts].errors}
+        for bucket_ts in sorted(buckets)
+        if buckets[bucket_ts].errors
+    ]
 
-def save_metrics_history(service_name: str, metrics: dict, timestamp: float):
+def build_metrics_history_doc(service_name: str, metrics: dict, timestamp: float):
     """Store all metrics in a single document per timestamp, with rounded values and IST time, and in a specific field order."""
-    try:
-        # Convert timestamp to IST
-        utc_dt = datetime.fromtimestamp(timestamp)
-        ist = pytz.timezone('Asia/Kolkata')
-        ist_dt = utc_dt.astimezone(ist)
-        ist_str = ist_dt.strftime("%Y-%m-%d %H:%M:%S")
-
-        doc = OrderedDict()
-        doc["timestamp"] = ist_str
-        doc["service"] = service_name
-        # Add metrics in the required order
-        if 'errors_total' in metrics:
-            doc["errors_total"] = float(metrics['errors_total'])
-        if 'cpu_percent' in metrics:
-            doc["cpu_percent"] = round(metrics['cpu_percent'], 2)
-        if 'memory_used_mb' in metrics:
-            doc["memory_used_mb"] = round(metrics['memory_used_mb'], 2)
-        if 'http_requests_total' in metrics:
-            doc["http_requests_total"] = float(metrics['http_requests_total'])
-
-        metrics_history_collection.insert_one(doc)
-    except Exception as e:
-        print(f"Error saving metrics history for {service_name}: {e}")
+    # Convert timestamp to IST
+    utc_dt = datetime.fromtimestamp(timestamp)
+    ist = pytz.timezone('Asia/Kolkata')
+    ist_dt = utc_dt.astimezone(ist)
+    ist_str = ist_dt.strftime("%Y-%m-%d %H:%M:%S")
+
+    doc = OrderedDict()
+    doc["timestamp"] = ist_str
+    doc["service"] = service_name
+    # Add metrics in the required order
+    if 'errors_total' in metrics:
+        doc["errors_total"] = float(metrics['errors_total'])
+    if 'cpu_percent' in metrics:
+        doc["cpu_percent"] = round(metrics['cpu_percent'], 2)
+    if 'memory_used_mb' in metrics:
+        doc["memory_used_mb"] = round(metrics['memory_used_mb'], 2)
+    if 'http_requests_total' in metrics:
+        doc["http_requests_total"] = float(metrics['http_requests_total'])
+    return doc
 
-def cleanup_old_metrics_history(days_to_keep: int = 30):
+async def cleanup_old_metrics_history(days_to_keep: int = 30):
     """Clean up old metrics data to prevent database bloat"""
     try:
         cutoff_date = datetime.utcnow() - timedelta(days=days_to_keep)
-        result = metrics_history_collection.delete_many({
-            "timestamp": {"$lt": cutoff_date}
-        })
-        if result.deleted_count > 0:
-            print(f"Cleaned up {result.deleted_count} old metrics records")
+        deleted_count = await repos.metrics_history.delete_older_than(cutoff_date)
+        if deleted_count > 0:
+            print(f"Cleaned up {deleted_count} old metrics records")
     except Exception as e:
         print(f"Error cleaning up old metrics: {e}")
 
@@ -2642,10 +2608,7 @@ async def service_cpu_history(
         window_td = timedelta(hours=24)
     start_time = now - window_td
     # Query by service and timestamp (new format)
-    cursor = metrics_history_collection.find({
-        "service": service_name,
-        "timestamp": {"$gte": start_time.strftime("%Y-%m-%d %H:%M:%S")}
-    }).sort("timestamp", 1)
+    cursor = await repos.metrics_history.for_service_since(service_name, start_time.strftime("%Y-%m-%d %H:%M:%S"))
     data = [
         {"time": doc["timestamp"], "cpu_percent": doc.get("cpu_percent")}
         for doc in cursor if "cpu_percent" in doc
@@ -2673,10 +2636,7 @@ async def service_memory_history(
         window_td = timedelta(hours=24)
     start_time = now - window_td
     # Query by service and timestamp (new format)
-    cursor = metrics_history_collection.find({
-        "service": service_name,
-        "timestamp": {"$gte": start_time.strftime("%Y-%m-%d %H:%M:%S")}
-    }).sort("timestamp", 1)
+    cursor = await repos.metrics_history.for_service_since(service_name, start_time.strftime("%Y-%m-%d %H:%M:%S"))
     data = [
         {"time": doc["timestamp"], "memory_mb": doc.get("memory_used_mb")}
         for doc in cursor if "memory_used_mb" in doc
@@ -2697,7 +2657,7 @@ async def service_load_forecast(
     """Get load forecasting data for a specific service based on historical patterns"""
     try:
         # Verify service ownership
-        service_doc = services_collection.find_one({"name": service_name, "owner": user_email})
+        service_doc = await repos.services.get(service_name, user_email)
         if not service_doc:
             raise HTTPException(status_code=404, detail=f"Service {service_name} not found")
         
@@ -2706,17 +2666,8 @@ async def service_load_forecast(
         start_time = now - timedelta(days=7)
         
         # Get CPU and memory data
-        cpu_cursor = metrics_history_collection.find({
-            "service_name": service_name,
-            "metric_type": "cpu_percent",
-            "timestamp": {"$gte": start_time, "$lte": now}
-        }).sort("timestamp", 1)
-        
-        memory_cursor = metrics_history_collection.find({
-            "service_name": service_name,
-            "metric_type": "memory_used_mb",
-            "timestamp": {"$gte": start_time, "$lte": now}
-        }).sort("timestamp", 1)
+        cpu_cursor = await repos.metrics_history.by_metric_type(service_name, "cpu_percent", start_time, now)
+        memory_cursor = await repos.metrics_history.by_metric_type(service_name, "memory_used_mb", start_time, now)
         
         # Process historical data for pattern analysis
         cpu_data = [doc["value"] for doc in cpu_cursor]
@@ -2769,58 +2720,6 @@ async def service_load_forecast(
         print(f"Error in service_load_forecast: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
-@app.get("/api/service_metrics/{service_name}/errors_timeseries")
-async def service_errors_timeseries(
-    service_name: str,
-    window: str = Query("6h"),
-    interval: str = Query("5m")
-):
-    now = datetime.utcnow()
-    # Parse window and interval
-    if window.endswith("h"):
-        window_td = timedelta(hours=int(window[:-1]))
-    elif window.endswith("d"):
-        window_td = timedelta(days=int(window[:-1]))
-    elif window.endswith("m"):
-        window_td = timedelta(minutes=int(window[:-1]))
-    else:
-        window_td = timedelta(hours=6)
-    if interval.endswith("h"):
-        interval_td = timedelta(hours=int(interval[:-1]))
-    elif interval.endswith("d"):
-        interval_td = timedelta(days=int(interval[:-1]))
-    elif interval.endswith("m"):
-        interval_td = timedelta(minutes=int(interval[:-1]))
-    else:
-        interval_td = timedelta(minutes=5)
-    start_time = now - window_td
-    interval_seconds = int(interval_td.total_seconds())
-    # Filter logs for this service
-    logs = [log for log in parsed_logs if log.get("service") == service_name]
-    # Bucket by interval
-    buckets = defaultdict(lambda: {"errors": 0})
-    for log in logs:
-        ts = log.get("timestamp")
-        if not ts:
-            continue
-        try:
-            log_time = dateutil_parser.parse(ts).replace(tzinfo=None)
-        except Exception:
-            continue
-        if log_time < start_time or log_time > now:
-            continue
-        if log.get("level") == "ERROR" or "error" in log.get("message", "").lower():
-            bucket_start_ts = int((log_time.timestamp() // interval_seconds) * interval_seconds)
-            bucket_key = datetime.utcfromtimestamp(bucket_start_ts).strftime("%Y-%m-%dT%H:%M:00Z")
-            buckets[bucket_key]["errors"] += 1
-    result = []
-    for bucket in sorted(buckets.keys()):
-        result.append({
-            "time": bucket,
-            "errors": buckets[bucket]["errors"]
-        })
-    return result
-
 def parse_mongo_uri(uri):
     try:
         parsed = urlparse(uri)
@@ -2868,7 +2767,7 @@ async def test_database_connection(data: dict):
     uri = data.get("uri")
     if not uri or not db_type:
         return {"success": False, "message": "Type and URI are required"}
-    health = check_database_health(db_type, uri)
+    health = await asyncio.to_thread(check_database_health, db_type, uri)
     if health["status"] == "connected":
         return {"success": True, "message": f"Successfully connected to {db_type} database.", **health}
     else:
@@ -1,9 +1,226 @@
 import requests
+import atexit
+import gzip
 import json
+import os
+import random
 import time
 import threading
+from collections import deque
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+
+
+class BackgroundSender:
+    """Ships log entries from a bounded in-memory ring buffer on one background thread.
+
+    ``enqueue`` only appends to the buffer under a lock, so logging never
+    waits on the network; when the buffer is full the oldest entry is
+    dropped. The sender thread takes up to ``batch_size`` entries at a time
+    and posts them as gzip-compressed NDJSON over a single keep-alive
+    session, retrying with exponential backoff and full jitter (honouring
+    Retry-After on 429). Batches that still can't be delivered are appended
+    to ``spill_path`` and replayed once the engine accepts logs again.
+    """
+
+    def __init__(self, options: Dict[str, Any]):
+        self.api_url = options.get('api_url', 'http://localhost:8000').rstrip('/')
+        self.batch_size = options.get('batch_size', 500)
+        self.flush_interval = options.get('flush_interval', 2)  # seconds
+        self.buffer_size = options.get('buffer_size', 50000)
+        self.compress = options.get('compress', True)
+        self.timeout = options.get('timeout', 10)
+        self.max_retries = options.get('max_retries', 5)
+        self.backoff_base = options.get('backoff_base', 0.5)  # seconds
+        self.backoff_max = options.get('backoff_max', 30)  # seconds
+        self.spill_path = options.get('spill_path') or os.path.join(
+            os.getcwd(), f".appvital-{options.get('service_name', 'unknown_service')}.spill.ndjson")
+        self.spill_max_bytes = options.get('spill_max_bytes', 100 * 1024 * 1024)
+        self.replay_interval = options.get('replay_interval', 30)  # seconds
+
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = threading.Event()
+        self._session = requests.Session()
+        self._last_replay = 0.0
+        self._replay_offset = 0
+        self.sent = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.rejected_lines = 0
+
+        self._thread = threading.Thread(target=self._run, name='appvital-log-sender', daemon=True)
+        self._thread.start()
+
+    # --- Producer side (called from application threads) ---
+    def enqueue(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            if len(self._buffer) >= self.buffer_size:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(entry)
+            if len(self._buffer) >= self.batch_size:
+                self._wakeup.notify()
+
+    def flush(self) -> None:
+        """Ask the sender to ship what is buffered now (does not wait for it)."""
+        with self._lock:
+            self._wakeup.notify()
+
+    def stop(self, timeout: float = 10) -> None:
+        """Ship (or spill) what is buffered and stop the sender thread."""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        with self._lock:
+            self._wakeup.notify()
+        self._thread.join(timeout)
+        self._session.close()
+
+    # --- Sender thread ---
+    def _take(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            if len(self._buffer) < self.batch_size and not self._stopping.is_set():
+                self._wakeup.wait(self.flush_interval)
+            count = min(len(self._buffer), self.batch_size)
+            return [self._buffer.popleft() for _ in range(count)]
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            batch = self._take()
+            if batch:
+                self._deliver(batch)
+            elif time.monotonic() - self._last_replay >= self.replay_interval:
+                self._replay()
+        # Final drain: one attempt per batch, the rest goes to the spill file
+        while True:
+            with self._lock:
+                count = min(len(self._buffer), self.batch_size)
+                batch = [self._buffer.popleft() for _ in range(count)]
+            if not batch:
+                break
+            self._deliver(batch, retries=0)
+
+    def _deliver(self, batch: List[Dict[str, Any]], retries: Optional[int] = None) -> bool:
+        lines = [json.dumps(entry, default=str).encode('utf-8') for entry in batch]
+        if self._send(lines, self.max_retries if retries is None else retries):
+            if self._has_spill() and not self._stopping.is_set():
+                self._replay()
+            return True
+        self._spill(lines)
+        return False
+
+    def _send(self, lines: List[bytes], retries: int) -> bool:
+        """POST one batch; False only when it should be kept for later (engine unreachable or busy)."""
+        body = b'\n'.join(lines) + b'\n'
+        headers = {'Content-Type': 'application/x-ndjson'}
+        if self.compress:
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+        for attempt in range(retries + 1):
+            retry_after = None
+            try:
+                response = self._session.post(f'{self.api_url}/api/ingest_ndjson', data=body,
+                                              headers=headers, timeout=self.timeout)
+                if response.status_code in (200, 202):
+                    self.sent += len(lines)
+                    try:
+                        errors = response.json().get('errors', 0)
+                    except (ValueError, AttributeError):
+                        errors = 0  # accepted all the same; only the skipped-line count is unknown
+                    if errors:
+                        self.rejected_lines += errors
+                        print(f'[AppVital] Engine skipped {errors} malformed log lines')
+                    return True
+                if response.status_code == 429:
+                    retry_after = response.headers.get('Retry-After')
+                elif response.status_code < 500:
+                    # Not retryable (bad request); keeping it would only fail again
+                    print(f'[AppVital] HTTP error {response.status_code}: {response.text}; '
+                          f'dropping {len(lines)} logs')
+                    self.dropped += len(lines)
+                    return True
+            except requests.RequestException as e:
+                if attempt == retries:
+                    print(f'[AppVital] Error sending logs: {e}')
+            if attempt == retries:
+                break
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+            if self._stopping.wait(delay):
+                break
+        return False
+
+    # --- Disk spillover ---
+    def _spill(self, lines: List[bytes]) -> None:
+        try:
+            size = os.path.getsize(self.spill_path) if os.path.exists(self.spill_path) else 0
+            data = b'\n'.join(lines) + b'\n'
+            if size + len(data) > self.spill_max_bytes:
+                print(f'[AppVital] Spill file full, dropping {len(lines)} logs')
+                self.dropped += len(lines)
+                return
+            with open(self.spill_path, 'ab') as f:
+                f.write(data)
+                f.flush()
+            self.spilled += len(lines)
+        except OSError as e:
+            print(f'[AppVital] Could not spill {len(lines)} logs to {self.spill_path}: {e}')
+            self.dropped += len(lines)
+
+    def _has_spill(self) -> bool:
+        """Whether spilled logs are waiting, including a replay file a previous attempt left behind."""
+        return os.path.exists(self.spill_path) or os.path.exists(self.spill_path + '.replay')
+
+    def _replay(self) -> None:
+        """Resend spilled logs, resuming where the last attempt stopped; at-least-once across restarts."""
+        self._last_replay = time.monotonic()
+        replay_path = self.spill_path + '.replay'
+        try:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                # Take the file over so new spills start a fresh one
+                os.replace(self.spill_path, replay_path)
+                self._replay_offset = 0
+            with open(replay_path, 'rb') as f:
+                f.seek(self._replay_offset)
+                batch = []
+                while True:
+                    line = f.readline()
+                    if line.strip():
+                        batch.append(line.rstrip(b'\n'))
+                    if batch and (len(batch) >= self.batch_size or not line):
+                        if not self._send(batch, retries=0):
+                            return  # engine still unavailable; try again later from the same offset
+                        self.replayed += len(batch)
+                        self._replay_offset = f.tell()
+                        batch = []
+                    if not line:
+                        break
+            os.remove(replay_path)
+            self._replay_offset = 0
+        except OSError as e:
+            print(f'[AppVital] Could not replay spilled logs: {e}')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            'buffered': buffered,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'spilled': self.spilled,
+            'replayed': self.replayed,
+            'rejected_lines': self.rejected_lines,
+        }
+
 
 class AppVitalLogShipper:
     def __init__(self, options: Dict[str, Any] = None):
@@ -17,6 +234,15 @@ class AppVitalLogShipper:
         self.log_buffer = []
         self.flush_timer = None
         self.running = True
+        # 'background': ring buffer + one sender thread (compressed NDJSON, retries, disk spillover);
+        # the default 'sync' mode posts from the logging thread whenever batch_size is reached
+        self.mode = options.get('mode', 'sync')
+        self.sender = None
+        
+        if self.mode == 'background':
+            self.sender = BackgroundSender(options)
+            atexit.register(self.stop)
+            return
         
         # Start flush timer in a separate thread
         self.flush_thread = threading.Thread(target=self._flush_timer_loop, daemon=True)
@@ -35,6 +261,10 @@ class AppVitalLogShipper:
             'metadata': metadata
         }
         
+        if self.sender is not None:
+            self.sender.enqueue(log_entry)
+            return
+        
         self.log_buffer.append(log_entry)
         
         # Flush immediately if buffer is full
@@ -59,6 +289,9 @@ class AppVitalLogShipper:
     
     def flush(self):
         """Flush logs to the API"""
+        if self.sender is not None:
+            self.sender.flush()
+            return
         if not self.log_buffer:
             return
         
@@ -73,12 +306,16 @@ class AppVitalLogShipper:
                 headers={'Content-Type': 'application/json'}
             )
             
-            if response.status_code == 200:
+            if response.status_code in (200, 202):
                 data = response.json()
-                if data.get('status') == 'success':
+                if data.get('status') in ('success', 'accepted'):
                     print(f'[AppVital] Successfully sent {len(logs_to_send)} logs')
                 else:
                     print(f'[AppVital] Failed to send logs: {data}')
+            elif response.status_code == 429:
+                # Engine's ingest queue is full; keep the logs for the next flush
+                print(f'[AppVital] Ingest busy, retrying in {response.headers.get("Retry-After", "?")}s')
+                self.log_buffer[:0] = logs_to_send
             else:
                 print(f'[AppVital] HTTP error {response.status_code}: {response.text}')
                 
@@ -97,6 +334,9 @@ class AppVitalLogShipper:
     def stop(self):
         """Stop the shipper"""
         self.running = False
+        if self.sender is not None:
+            self.sender.stop()
+            return
         # Flush any remaining logs
         self.flush()
 
@@ -112,6 +352,15 @@ logger = AppVitalLogShipper({
     'flush_interval': 3
 })
 
+# High-volume services: never block on the network, retry and spill to disk when the engine is down
+logger = AppVitalLogShipper({
+    'api_url': 'http://localhost:8000',
+    'service_name': 'my_python_service',
+    'mode': 'background',
+    'batch_size': 500,
+    'spill_path': '/var/tmp/my_python_service.spill.ndjson'
+})
+
 # Use the logger
 logger.info('User logged in', {'user_id': '123', 'ip': '192.168.1.1'})
 logger.error('Database connection failed', {'error': 'Connection timeout'})
@@ -0,0 +1,77 @@
+from utils.anomaly_windows import AnomalyWindows
+
+T0 = 1_700_000_000.0  # a multiple of the 10s slot
+
+
+def traffic(windows, start, seconds, per_slot, errors_per_slot=0, service="svc"):
+    """``per_slot`` requests (the first ``errors_per_slot`` of them errors) in every 10s slot."""
+    for offset in range(0, seconds, 10):
+        now = start + offset
+        for i in range(per_slot):
+            windows.add({"service": service, "timestamp_epoch": now, "is_error": i < errors_per_slot,
+                         "error_type": None}, now)
+
+
+def window_counts(windows, now, service="svc"):
+    return {label: w["requests"] for label, w in windows.snapshot(now)[service]["windows"].items()}
+
+
+def test_slots_roll_over_and_reuse_ring_positions():
+    windows = AnomalyWindows()
+    traffic(windows, T0, 60, per_slot=2)
+    assert window_counts(windows, T0 + 59) == {"1m": 12, "5m": 12, "15m": 12}
+    # Ten minutes later only the 15m window still covers the first minute
+    assert window_counts(windows, T0 + 660) == {"1m": 0, "5m": 0, "15m": 12}
+
+    # A full ring later the first slot's ring position is reused and starts from zero
+    later = T0 + windows.slots * windows.slot_seconds
+    traffic(windows, later, 10, per_slot=3)
+    ring = windows.services["svc"].ring
+    reused = ring[int(later // windows.slot_seconds) % len(ring)]
+    assert (reused.start, reused.requests) == (later, 3)
+    # The 15m window now holds the slots from T0+20s on (4 x 2) plus the new one
+    assert window_counts(windows, later) == {"1m": 3, "5m": 3, "15m": 11}
+
+
+def test_logs_older_than_the_longest_window_are_ignored():
+    windows = AnomalyWindows()
+    windows.add({"service": "svc", "timestamp_epoch": T0 - 3600}, T0)
+    assert "svc" not in windows.services
+
+
+def test_aged_out_slots_are_folded_into_the_baseline():
+    windows = AnomalyWindows()
+    traffic(windows, T0, 300, per_slot=10, errors_per_slot=1)
+    windows.detect(T0 + 300 + 900)
+    baseline = windows.snapshot(T0 + 1200)["svc"]["baseline"]
+    assert baseline["slots"] == 30
+    assert baseline["error_rate"] == 0.1
+
+
+def test_error_rate_shift_fires_only_against_a_warm_baseline():
+    windows = AnomalyWindows(min_error_rate=0.05, max_error_rate=0.5)
+    # 20 minutes of 2% errors, so the first 5 minutes have aged into the baseline
+    for minute in range(20):
+        start = T0 + minute * 60
+        traffic(windows, start, 60, per_slot=50, errors_per_slot=1)
+    now = T0 + 20 * 60
+    assert windows.detect(now) == []
+
+    # 20% errors for a minute: well under the absolute ceiling, but many deviations above the baseline
+    traffic(windows, now, 60, per_slot=50, errors_per_slot=10)
+    found = windows.detect(now + 59)
+    assert len(found) == 1
+    assert found[0].startswith("Service svc error rate 20.0% over last 1m")
+    assert "baseline 2.0%" in found[0]
+
+
+def test_quiet_service_and_absolute_ceiling():
+    windows = AnomalyWindows(min_requests=20)
+    traffic(windows, T0, 10, per_slot=5, errors_per_slot=5, service="quiet")
+    # Every request failed, but there are too few requests to judge
+    assert windows.detect(T0 + 9) == []
+
+    traffic(windows, T0, 60, per_slot=10, errors_per_slot=5, service="busy")
+    # No baseline yet; 50% errors is over the 25% ceiling regardless
+    found = windows.detect(T0 + 59)
+    assert found == ["Service busy error rate 50.0% over last 1m (30/60 requests; no baseline yet)"]
@@ -0,0 +1,63 @@
+import asyncio
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from utils.ingest_pipeline import IngestPipeline, normalize_log
+from utils.log_analytics import LogAnalytics
+
+
+def test_persisting_does_not_change_processed_logs():
+    analytics = LogAnalytics()
+    processed = []
+
+    def process(logs):
+        processed.extend(logs)
+        analytics.add_many(logs)
+
+    async def persist(logs):
+        for log in logs:  # like motor's insert_many
+            log["_id"] = ObjectId()
+
+    pipeline = IngestPipeline(process=process, persist=persist)
+    asyncio.run(pipeline._handle([{"level": "ERROR", "service": "order_service", "message": "boom"}]))
+
+    assert pipeline.persisted == 1
+    assert "_id" not in processed[0]
+    jsonable_encoder(analytics.snapshot())
+
+
+def test_client_epoch_is_ignored_and_timestamps_are_validated():
+    now = 1_700_000_000.0
+    log = normalize_log({"timestamp_epoch": "2024-01-01", "message": "x"}, now)
+    assert log["timestamp_epoch"] == now
+
+    cases = [
+        (1_700_000_000_000, 1_700_000_000.0),  # JavaScript milliseconds
+        (1_700_000_000_000_000, 1_700_000_000.0),  # microseconds
+        ("2023-11-14T22:13:20Z", 1_700_000_000.0),
+        (1e20, now),
+        (float("nan"), now),
+        (-5, now),
+        ("9999-01-01T00:00:00Z", now),
+    ]
+    for timestamp, expected in cases:
+        log = normalize_log({"timestamp": timestamp, "message": "x"}, now)
+        assert log["timestamp_epoch"] == expected, timestamp
+
+
+def test_processing_error_does_not_skip_persisting_the_batch():
+    persisted = []
+
+    def process(logs):
+        raise TypeError("must be real number, not str")
+
+    async def persist(logs):
+        persisted.extend(logs)
+
+    pipeline = IngestPipeline(process=process, persist=persist)
+    asyncio.run(pipeline._handle([{"message": str(i)} for i in range(3)]))
+
+    assert len(persisted) == 3
+    assert pipeline.persisted == 3
+    assert pipeline.process_errors == 1
@@ -0,0 +1,103 @@
+import asyncio
+
+from utils.llm_gateway import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PriorityLimiter
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_released_slot_goes_to_the_most_urgent_waiter_then_fifo():
+    async def run():
+        limiter = PriorityLimiter(1)
+        order = []
+
+        async def call(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+
+        await limiter.acquire()
+        tasks = [asyncio.create_task(call("background-1", PRIORITY_BACKGROUND)),
+                 asyncio.create_task(call("background-2", PRIORITY_BACKGROUND))]
+        await settle()
+        tasks += [asyncio.create_task(call("interactive-1", PRIORITY_INTERACTIVE)),
+                  asyncio.create_task(call("interactive-2", PRIORITY_INTERACTIVE))]
+        await settle()
+        assert limiter.queued == 4
+
+        for _ in range(4):
+            limiter.release()
+            await settle()
+        limiter.release()
+        await asyncio.gather(*tasks)
+        assert order == ["interactive-1", "interactive-2", "background-1", "background-2"]
+        assert limiter.active == 0
+
+    asyncio.run(run())
+
+
+def test_new_callers_queue_behind_waiters_instead_of_taking_a_free_slot():
+    async def run():
+        limiter = PriorityLimiter(1)
+        await limiter.acquire()
+        waiter = limiter.enqueue(PRIORITY_BACKGROUND)
+        limiter.release()  # handed to the waiter, not freed
+        assert limiter.active == 1
+        assert waiter.done()
+        assert limiter.enqueue(PRIORITY_INTERACTIVE) is not None
+
+    asyncio.run(run())
+
+
+def test_raise_priority_moves_a_waiter_up():
+    async def run():
+        limiter = PriorityLimiter(1)
+        await limiter.acquire()
+        early = limiter.enqueue(PRIORITY_BACKGROUND)
+        late = limiter.enqueue(PRIORITY_BACKGROUND)
+        limiter.raise_priority(late, PRIORITY_INTERACTIVE)
+        assert limiter.queued == 2
+        limiter.release()
+        assert late.done() and not early.done()
+        limiter.release()
+        assert early.done()
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_is_skipped():
+    async def run():
+        limiter = PriorityLimiter(1)
+        await limiter.acquire()
+        cancelled = asyncio.create_task(limiter.acquire(PRIORITY_INTERACTIVE))
+        waiting = asyncio.create_task(limiter.acquire(PRIORITY_BACKGROUND))
+        await settle()
+        cancelled.cancel()
+        await settle()
+        limiter.release()
+        await asyncio.wait_for(waiting, 1)
+        assert limiter.active == 1
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(run())
+
+
+def test_slot_handed_to_a_cancelled_caller_is_passed_on():
+    async def run():
+        limiter = PriorityLimiter(1)
+        await limiter.acquire()
+        first = asyncio.create_task(limiter.acquire(PRIORITY_INTERACTIVE))
+        second = asyncio.create_task(limiter.acquire(PRIORITY_BACKGROUND))
+        await settle()
+        limiter.release()  # the slot now belongs to ``first``, which hasn't resumed yet
+        first.cancel()
+        await settle()
+        assert first.cancelled()
+        await asyncio.wait_for(second, 1)
+        assert limiter.active == 1
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(run())
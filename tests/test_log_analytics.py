@@ -0,0 +1,41 @@
+import time
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from utils.log_analytics import LogAnalytics
+
+
+def error_log():
+    return {
+        "timestamp": "2024-01-01T00:00:00Z",
+        "timestamp_epoch": time.time(),
+        "level": "ERROR",
+        "service": "order_service",
+        "message": "order 404",
+        "status_code": 404,
+        "error_type": "order_404",
+        "is_error": True,
+    }
+
+
+def test_last_errors_do_not_share_the_ingested_dict():
+    analytics = LogAnalytics()
+    log = error_log()
+    analytics.add_many([log])
+    # What Mongo's insert_many does to the documents it is given
+    log["_id"] = ObjectId()
+
+    snapshot = analytics.snapshot()
+    assert "_id" not in snapshot["last_10_errors"][0]
+    encoded = jsonable_encoder(snapshot)
+    assert encoded["last_10_errors"][0]["message"] == "order 404"
+
+
+def test_ingested_id_is_dropped_from_last_errors():
+    analytics = LogAnalytics()
+    log = error_log()
+    log["_id"] = ObjectId()
+    analytics.add(log)
+    jsonable_encoder(analytics.snapshot())
+    assert "_id" not in analytics.snapshot()["last_10_errors"][0]
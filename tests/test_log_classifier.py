@@ -0,0 +1,42 @@
+from utils.anomaly_windows import AnomalyWindows
+from utils.log_classifier import LogClassifier, find_status
+
+
+def test_numbers_outside_http_context_are_not_status_codes():
+    classifier = LogClassifier()
+    for message in ("Request took 350 ms", "retrying in 300 seconds", "user 123 logged in",
+                    "Cache holds 500 entries"):
+        log = classifier.tag({"message": message})
+        assert "status_code" not in log, message
+        assert log["error_type"] is None, message
+
+
+def test_http_shaped_status_codes_are_tagged():
+    classifier = LogClassifier()
+    cases = [
+        ("status=500 while saving", 500, "http_500"),
+        ("status code: 401", 401, "auth_failure"),
+        ("HTTP/1.1 503 Service Unavailable", 503, None),
+        ("GET /orders/42 404", 404, "order_404"),
+        ('"GET /x HTTP/1.1" 500 12ms', 500, "http_500"),
+        ("Business event: /catalog - Status 500", 500, "http_500"),
+    ]
+    for message, status, error_type in cases:
+        log = classifier.tag({"message": message})
+        assert log["status_code"] == status, message
+        assert log["error_type"] == error_type, message
+
+
+def test_explicit_status_code_wins_over_the_message():
+    log = LogClassifier().tag({"message": "GET /orders 404", "status_code": "500"})
+    assert log["status_code"] == "500"
+    assert log["error_type"] == "http_500"
+
+
+def test_anomaly_windows_only_count_http_shaped_5xx_in_untagged_logs():
+    assert find_status("Cache holds 500 entries") is None
+    windows = AnomalyWindows()
+    now = 1_700_000_000.0
+    windows.add({"service": "svc", "message": "Cache holds 500 entries", "timestamp_epoch": now}, now)
+    windows.add({"service": "svc", "message": "upstream returned 502", "timestamp_epoch": now}, now)
+    assert sum(slot.http_5xx for slot in windows.services["svc"].ring) == 1
@@ -0,0 +1,55 @@
+import gzip
+import json
+
+from services.log_shipper import BackgroundSender
+
+
+class FakeResponse:
+    def __init__(self, status_code=202, body=b'{"accepted": 1, "errors": 0}'):
+        self.status_code = status_code
+        self.content = body
+        self.text = body.decode()
+        self.headers = {}
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+        self.bodies = []
+
+    def post(self, url, data=None, headers=None, timeout=None):
+        self.bodies.append(gzip.decompress(data))
+        return self.response
+
+    def close(self):
+        pass
+
+
+def make_sender(tmp_path, response):
+    sender = BackgroundSender({'spill_path': str(tmp_path / 'logs.spill.ndjson'), 'max_retries': 0})
+    sender.stop()
+    sender._stopping.clear()  # drive _deliver/_send by hand from here on
+    sender._session = FakeSession(response)
+    return sender
+
+
+def test_non_json_success_body_counts_as_sent(tmp_path):
+    sender = make_sender(tmp_path, FakeResponse(200, b'OK'))
+
+    assert sender._deliver([{'message': 'hello'}])
+    assert sender.sent == 1
+    assert sender.spilled == 0
+
+
+def test_leftover_replay_file_is_resent_after_a_delivery(tmp_path):
+    sender = make_sender(tmp_path, FakeResponse())
+    replay_path = tmp_path / 'logs.spill.ndjson.replay'
+    replay_path.write_bytes(b'{"message": "spilled"}\n')
+
+    assert sender._deliver([{'message': 'live'}])
+    assert sender.replayed == 1
+    assert not replay_path.exists()
+    assert sender._session.bodies[-1] == b'{"message": "spilled"}\n'
@@ -0,0 +1,101 @@
+from utils.log_store import LogStore
+
+T0 = 1_700_000_000.0
+
+
+def make_log(i, service=None, level=None, message=None):
+    return {
+        "timestamp_epoch": T0 + i,
+        "service": service or ("order_service" if i % 2 else "auth_service"),
+        "level": level or ("ERROR" if i % 3 == 0 else "INFO"),
+        "message": message or f"request {i}",
+        "latency_ms": float(i),
+    }
+
+
+def filled_store(n=20, **kwargs):
+    kwargs.setdefault("segment_size", 4)
+    kwargs.setdefault("max_age_seconds", None)
+    store = LogStore(**kwargs)
+    store.extend(make_log(i) for i in range(n))
+    return store
+
+
+def messages(records):
+    return [record.message for record in records]
+
+
+def test_page_is_newest_first_with_a_cursor_to_the_next_page():
+    store = filled_store()
+    first, cursor = store.page(5)
+    assert messages(first) == [f"request {i}" for i in range(19, 14, -1)]
+    second, cursor = store.page(5, before=cursor)
+    assert messages(second) == [f"request {i}" for i in range(14, 9, -1)]
+
+    pages = []
+    cursor = None
+    while True:
+        records, cursor = store.page(6, before=cursor)
+        pages.extend(messages(records))
+        if cursor is None:
+            break
+    assert pages == [f"request {i}" for i in range(19, -1, -1)]
+
+
+def test_cursor_is_stable_while_entries_are_appended():
+    store = filled_store()
+    first, cursor = store.page(5)
+    store.extend(make_log(i) for i in range(20, 30))
+    second, _ = store.page(5, before=cursor)
+    # Offsets would shift by the 10 new entries; the cursor keeps pointing at the same place
+    assert messages(second) == [f"request {i}" for i in range(14, 9, -1)]
+    assert messages(store.page(5, offset=5)[0]) == [f"request {i}" for i in range(24, 19, -1)]
+
+
+def test_page_filters_and_offset():
+    store = filled_store(text_index=True)
+    errors, _ = store.page(100, service="auth_service", level="error")
+    assert messages(errors) == ["request 18", "request 12", "request 6", "request 0"]
+
+    ranged, _ = store.page(100, since=T0 + 5, until=T0 + 8)
+    assert messages(ranged) == ["request 8", "request 7", "request 6", "request 5"]
+
+    assert messages(store.page(2, service="order_service", offset=3)[0]) == ["request 13", "request 11"]
+    assert messages(store.page(10, text="request 7")[0]) == ["request 7"]
+
+    unindexed = filled_store()
+    assert messages(unindexed.page(10, text="request 7")[0]) == ["request 7"]
+
+
+def test_evict_by_count_drops_whole_oldest_segments():
+    store = filled_store(n=14, max_entries=8)
+    # A segment goes only once the rest still holds max_entries, so 8-12 entries are kept
+    assert store.evicted == 4
+    assert len(store) == 10
+    assert store[0]["message"] == "request 4"
+    assert store.page(1)[0][0].message == "request 13"
+
+
+def test_evict_by_age_keeps_the_open_segment():
+    store = filled_store(n=12, max_age_seconds=5)
+    assert store.evict(now=T0 + 9) == 4  # segment 0-3 ended more than 5s ago, 4-7 didn't
+    assert store[0]["message"] == "request 4"
+    assert store.evict(now=T0 + 1000) == 4
+    assert len(store) == 4  # the newest segment is never evicted
+
+
+def test_count_and_aggregate():
+    store = filled_store()
+    assert store.count() == 20
+    assert store.count(service="auth_service") == 10
+    assert store.count(level="error") == 7
+    assert store.count(service="order_service", level="ERROR", since=T0 + 4, until=T0 + 16) == 2
+
+    summary = store.aggregate(since=T0 + 10)
+    assert summary["requests"] == 10
+    assert summary["errors"] == 3
+    assert summary["latency_ms"]["avg"] == 14.5
+
+    by_service = store.aggregate(by_service=True)
+    assert {group["service"]: group["requests"] for group in by_service["groups"]} == {
+        "auth_service": 10, "order_service": 10}
@@ -0,0 +1,68 @@
+import gzip
+import zlib
+
+import pytest
+
+from utils.ndjson_stream import _INFLATE_STEP, CorruptStream, NDJSONDecoder, decompressor_for
+
+
+def test_gzip_chunk_is_inflated_step_by_step():
+    body = gzip.compress(b"a" * (64 * 1024 * 1024))
+    pieces = decompressor_for("gzip").decompress(body[:64 * 1024])
+    first = next(pieces)
+    # Nothing beyond the first step has been inflated yet
+    assert len(first) <= _INFLATE_STEP
+    assert all(len(piece) <= _INFLATE_STEP for _, piece in zip(range(10), pieces))
+
+
+def test_gzip_round_trip_with_concatenated_members():
+    lines = b"".join(b'{"message": "m%d"}\n' % i for i in range(5000))
+    body = gzip.compress(lines[:40000]) + gzip.compress(lines[40000:])
+    decompressor = decompressor_for("gzip")
+    decoder = NDJSONDecoder()
+    records = []
+    for i in range(0, len(body), 4096):
+        for data in decompressor.decompress(body[i:i + 4096]):
+            records.extend(decoder.feed(data))
+    for data in decompressor.flush():
+        records.extend(decoder.feed(data))
+    records.extend(decoder.close())
+    assert len(records) == 5000 and decoder.errors == 0
+
+
+def test_deflate_and_identity():
+    raw = b'{"a": 1}\n{"a": 2}\n'
+    assert b"".join(decompressor_for("deflate").decompress(zlib.compress(raw))) == raw
+    assert b"".join(decompressor_for(None).decompress(raw)) == raw
+
+
+def test_truncated_gzip_body_is_corrupt():
+    body = gzip.compress(b'{"a": 1}\n' * 1000)
+    decompressor = decompressor_for("gzip")
+    list(decompressor.decompress(body[:len(body) // 2]))
+    with pytest.raises(CorruptStream):
+        list(decompressor.flush())
+
+
+def test_zstd_chunk_is_inflated_step_by_step_across_frames():
+    zstandard = pytest.importorskip("zstandard")
+    bomb = b"a" * (64 * 1024 * 1024)
+    lines = b"".join(b'{"message": "m%d"}\n' % i for i in range(5000))
+    body = (zstandard.ZstdCompressor().compress(bomb) + zstandard.ZstdCompressor().compress(lines[:40000])
+            + zstandard.ZstdCompressor().compress(lines[40000:]))
+    decompressor = decompressor_for("zstd")
+    size = 0
+    tail = bytearray()
+    for i in range(0, len(body), 4096):
+        for piece in decompressor.decompress(body[i:i + 4096]):
+            assert len(piece) <= _INFLATE_STEP
+            size += len(piece)
+            tail += piece
+            del tail[:-len(lines)]
+    for piece in decompressor.flush():
+        assert len(piece) <= _INFLATE_STEP
+        size += len(piece)
+        tail += piece
+        del tail[:-len(lines)]
+    assert size == len(bomb) + len(lines)
+    assert bytes(tail) == lines
@@ -0,0 +1,26 @@
+from utils.prometheus_parser import parse_prometheus_flat, parse_prometheus_text
+
+EXPOSITION = """# TYPE foo counter
+foo_total 17 # {trace_id="abc"} 1.0 1600000000
+bar_total{path="/a # b"} 3 # {trace_id="def"} 2.0
+baz {job="x"} 4
+plain 5 1600000000
+"""
+
+
+def test_exemplar_on_unlabelled_sample():
+    metrics = parse_prometheus_text(EXPOSITION)
+    assert metrics.samples["foo_total"] == 17
+    assert not any("#" in key and key.startswith("foo") for key in metrics.samples)
+    assert metrics.samples['bar_total{path="/a # b"}'] == 3
+    assert metrics.samples['baz{job="x"}'] == 4
+    assert metrics.samples["plain"] == 5
+
+
+def test_exemplar_on_unlabelled_sample_flat():
+    for _ in range(2):  # second pass goes through the series caches
+        flat = parse_prometheus_flat(EXPOSITION)
+        assert flat["foo_total"] == 17
+        assert flat["bar_total"] == 3
+        assert flat["baz"] == 4
+        assert set(flat) == {"foo_total", "bar_total", "baz", "plain"}
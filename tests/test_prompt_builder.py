@@ -0,0 +1,42 @@
+from utils.prompt_builder import build_log_section, focus_logs
+
+
+def make_log(service, message, level="INFO", **fields):
+    log = {"service": service, "level": level, "message": message, "is_error": level == "ERROR"}
+    log.update(fields)
+    return log
+
+
+def test_focus_logs_selects_the_named_service_by_tagged_fields():
+    logs = [
+        make_log("order_service", "GET /orders 200", status_code=200),
+        make_log("order_service", "GET /orders 503", status_code=503, error_type=None),
+        make_log("order_service", "payment failed", level="ERROR"),
+        make_log("catalog_service", "db error", level="ERROR"),
+        make_log("auth_service", "login ok", status_code=200),
+    ]
+    anomaly = "Service order_service HTTP 5xx rate 40.0% over last 1m (2/5 requests; baseline 1.0%, z=6.2)"
+
+    assert focus_logs(logs, anomaly, 10) == logs[1:3]
+
+
+def test_focus_logs_falls_back_to_errors_then_latest():
+    logs = [make_log("a", "ok"), make_log("b", "boom", level="ERROR"), make_log("c", "ok")]
+
+    assert focus_logs(logs, "Service unknown_svc error rate 50.0%", 10) == [logs[1]]
+    assert focus_logs(logs, None, 10) == [logs[1]]
+    assert focus_logs(logs[::2], None, 1) == [logs[2]]
+
+
+def test_focus_logs_picks_latency_logs_for_latency_anomalies():
+    logs = [make_log("svc", "slow", latency_ms=2500.0), make_log("svc", "no latency"), make_log("other", "x", latency_ms=1.0)]
+
+    assert focus_logs(logs, "Service svc average latency 2500ms over last 1m (threshold 1000ms)", 10) == [logs[0]]
+
+
+def test_build_log_section_collapses_repeats():
+    logs = [make_log("svc", f"order {i} failed", level="ERROR", timestamp_epoch=1_700_000_000.0 + i) for i in range(5)]
+
+    section = build_log_section(logs, 1000)
+    assert section.included_templates == 1
+    assert "×5" in section.text
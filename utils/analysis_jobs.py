@@ -0,0 +1,172 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from utils.log_templates import anomalies_fingerprint
+
+
+def anomaly_key(anomaly: str) -> str:
+    """Job key of an anomaly text ("; "-joined anomalies); rates and counts don't change it."""
+    return anomalies_fingerprint(part for part in (anomaly or "").split("; ") if part)
+
+
+class AnalysisJob:
+    """One precomputed analysis and its lifecycle: queued -> running -> done | failed."""
+    __slots__ = ("key", "anomaly", "status", "created_at", "started_at", "finished_at", "result", "error", "task")
+
+    def __init__(self, key: str, anomaly: str, now: float):
+        self.key = key
+        self.anomaly = anomaly
+        self.status = "queued"
+        self.created_at = now
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def to_dict(self, include_result: bool = False) -> Dict[str, Any]:
+        info = {
+            "key": self.key,
+            "anomaly": self.anomaly,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+        if include_result:
+            info["result"] = self.result
+        return info
+
+
+class AnalysisJobs:
+    """Background analyses keyed by anomaly, under a concurrency and hourly budget.
+
+    ``submit`` queues ``run(anomaly)`` unless a job for the same (normalized)
+    anomaly is pending, finished less than ``result_ttl`` seconds ago, or
+    failed less than ``retry_after`` seconds ago. At most
+    ``max_concurrent`` jobs run at once and at most ``max_per_hour`` are
+    started per rolling hour; submissions over the budget are dropped and
+    counted, and callers fall back to analysing on demand.
+    """
+
+    def __init__(self, run: Callable[[str], Awaitable[Any]], max_concurrent: int = 1, max_per_hour: int = 20,
+                 result_ttl: float = 900.0, retry_after: float = 60.0, max_jobs: int = 256,
+                 name: str = "Analysis Jobs"):
+        self.run = run
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_hour = max_per_hour
+        self.result_ttl = result_ttl
+        self.retry_after = retry_after
+        self.max_jobs = max_jobs
+        self.name = name
+        self._jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._submitted: deque = deque()  # submit times within the last hour
+        self.completed = 0
+        self.failed = 0
+        self.over_budget = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        return self._semaphore
+
+    def _expired(self, job: AnalysisJob, now: float) -> bool:
+        if job.status == "done":
+            return now - job.finished_at >= self.result_ttl
+        if job.status == "failed":
+            return now - job.finished_at >= self.retry_after
+        return False
+
+    def get(self, anomaly: str, now: Optional[float] = None) -> Optional[AnalysisJob]:
+        """The live job for ``anomaly`` (pending, or finished and not yet expired), if any."""
+        now = time.time() if now is None else now
+        job = self._jobs.get(anomaly_key(anomaly))
+        if job is None or self._expired(job, now):
+            return None
+        return job
+
+    def submit(self, anomaly: str, now: Optional[float] = None) -> Optional[AnalysisJob]:
+        """Queue an analysis of ``anomaly``; returns the live job, or None when over budget."""
+        now = time.time() if now is None else now
+        key = anomaly_key(anomaly)
+        job = self._jobs.get(key)
+        if job is not None and not self._expired(job, now):
+            return job
+        while self._submitted and now - self._submitted[0] >= 3600:
+            self._submitted.popleft()
+        if len(self._submitted) >= self.max_per_hour:
+            self.over_budget += 1
+            print(f"[{self.name}] Hourly budget of {self.max_per_hour} analyses used up, skipping: {anomaly[:120]}")
+            return None
+        self._submitted.append(now)
+        job = AnalysisJob(key, anomaly, now)
+        self._jobs[key] = job
+        self._jobs.move_to_end(key)
+        self.prune(now)
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    async def _run(self, job: AnalysisJob) -> None:
+        async with self._get_semaphore():
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = await self.run(job.anomaly)
+                job.status = "done"
+                self.completed += 1
+            except asyncio.CancelledError:
+                job.status, job.error = "failed", "cancelled"
+                raise
+            except Exception as e:
+                job.status, job.error = "failed", str(e) or e.__class__.__name__
+                self.failed += 1
+                print(f"[{self.name}] Analysis failed for {job.anomaly[:120]}: {job.error}")
+            finally:
+                job.finished_at = time.time()
+
+    async def wait(self, job: AnalysisJob, timeout: Optional[float] = None) -> AnalysisJob:
+        """Wait (at most ``timeout`` seconds) for ``job`` to finish; waiting doesn't cancel it."""
+        if job.task is not None and not job.task.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(job.task), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return job
+
+    def prune(self, now: Optional[float] = None) -> None:
+        """Drop expired jobs, then the oldest finished ones beyond ``max_jobs``."""
+        now = time.time() if now is None else now
+        for key in [key for key, job in self._jobs.items() if self._expired(job, now)]:
+            del self._jobs[key]
+        for key in [key for key, job in self._jobs.items() if job.status in ("done", "failed")]:
+            if len(self._jobs) <= self.max_jobs:
+                break
+            del self._jobs[key]
+
+    async def aclose(self) -> None:
+        tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {
+            "jobs": len(self._jobs),
+            "by_status": by_status,
+            "max_concurrent": self.max_concurrent,
+            "max_per_hour": self.max_per_hour,
+            "started_last_hour": sum(1 for t in self._submitted if now - t < 3600),
+            "completed": self.completed,
+            "failed": self.failed,
+            "over_budget": self.over_budget,
+            "result_ttl_seconds": self.result_ttl,
+            "recent": [job.to_dict() for job in reversed(self._jobs.values())][:20],
+        }
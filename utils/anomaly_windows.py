@@ -0,0 +1,281 @@
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.log_classifier import find_status
+from utils.timeparse import log_epoch
+
+# (label, seconds) of the sliding windows the detectors look at, shortest first
+DEFAULT_WINDOWS = (("1m", 60), ("5m", 300), ("15m", 900))
+
+
+class WindowSlot:
+    """Counters for one service over one ``slot_seconds`` slice of time."""
+    __slots__ = ("start", "requests", "errors", "http_5xx", "auth_failures", "latency_sum", "latency_count")
+
+    def __init__(self, start: int = -1):
+        self.reset(start)
+
+    def reset(self, start: int) -> None:
+        self.start = start
+        self.requests = 0
+        self.errors = 0
+        self.http_5xx = 0
+        self.auth_failures = 0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    def merge(self, other: "WindowSlot") -> None:
+        self.requests += other.requests
+        self.errors += other.errors
+        self.http_5xx += other.http_5xx
+        self.auth_failures += other.auth_failures
+        self.latency_sum += other.latency_sum
+        self.latency_count += other.latency_count
+
+
+class Ewma:
+    """Exponentially weighted mean and variance of a per-slot series."""
+    __slots__ = ("mean", "var", "samples")
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.samples = 0
+
+    def update(self, value: float, alpha: float) -> None:
+        # Plain running average until there are ~1/alpha samples, so the first slots don't dominate
+        alpha = max(alpha, 1.0 / (self.samples + 1))
+        diff = value - self.mean
+        self.mean += alpha * diff
+        self.var = (1 - alpha) * (self.var + alpha * diff * diff)
+        self.samples += 1
+
+
+class ServiceWindows:
+    """Ring of slots covering the longest window for one service, plus its EWMA baselines."""
+
+    def __init__(self, slot_seconds: int, slots: int):
+        self.slot_seconds = slot_seconds
+        self.ring = [WindowSlot() for _ in range(slots)]
+        self.folded_until = -1  # slots starting before this have been folded into the baselines
+        self.error_rate = Ewma()
+        self.http_5xx_rate = Ewma()
+        self.auth_failure_rate = Ewma()
+        self.latency = Ewma()
+
+    def slot_for(self, start: int) -> WindowSlot:
+        slot = self.ring[(start // self.slot_seconds) % len(self.ring)]
+        if slot.start != start:
+            slot.reset(start)
+        return slot
+
+    def fold(self, until: int, alpha: float) -> None:
+        """Fold the slots starting before ``until`` into the baselines, oldest first."""
+        start = max(self.folded_until, until - len(self.ring) * self.slot_seconds)
+        while start < until:
+            slot = self.ring[(start // self.slot_seconds) % len(self.ring)]
+            if slot.start == start and slot.requests:
+                self.error_rate.update(slot.errors / slot.requests, alpha)
+                self.http_5xx_rate.update(slot.http_5xx / slot.requests, alpha)
+                self.auth_failure_rate.update(slot.auth_failures / slot.requests, alpha)
+                if slot.latency_count:
+                    self.latency.update(slot.latency_sum / slot.latency_count, alpha)
+            start += self.slot_seconds
+        self.folded_until = max(self.folded_until, until)
+
+    def totals(self, seconds: int, current_start: int) -> WindowSlot:
+        total = WindowSlot(current_start)
+        first = current_start - seconds + self.slot_seconds
+        for slot in self.ring:
+            if first <= slot.start <= current_start:
+                total.merge(slot)
+        return total
+
+
+class AnomalyWindows:
+    """Sliding 1m/5m/15m counters per service with rate-based, baseline-relative detectors.
+
+    ``add`` classifies a log once (error, 5xx, 401, latency) and bumps the
+    counters of the ``slot_seconds`` slot its timestamp falls in; each service
+    keeps a fixed ring of slots spanning the longest window, so memory and
+    detection cost don't depend on traffic. Slots are folded into EWMA
+    baselines (mean and variance of each rate and of mean latency, with
+    ``baseline_halflife`` seconds of memory) as they age out of the longest
+    window, so the baseline never includes the traffic being judged. ``detect`` compares each window
+    against the baseline with a z-score that also accounts for the sampling
+    noise of the window's request count, so a handful of errors on a quiet
+    service doesn't fire while a real shift on a busy one does. Rates above the
+    absolute ceilings fire regardless of the baseline, so a service that has
+    been failing for a long time stays flagged.
+    """
+
+    def __init__(self, windows: Tuple[Tuple[str, int], ...] = DEFAULT_WINDOWS, slot_seconds: int = 10,
+                 baseline_halflife: float = 1800, min_requests: int = 20, z_threshold: float = 3.0,
+                 min_error_rate: float = 0.05, max_error_rate: float = 0.25, latency_threshold_ms: float = 1000,
+                 min_baseline_slots: int = 6):
+        self.windows = tuple(sorted(windows, key=lambda w: w[1]))
+        self.slot_seconds = slot_seconds
+        self.slots = max(seconds for _, seconds in self.windows) // slot_seconds + 1
+        self.alpha = 1 - 0.5 ** (slot_seconds / baseline_halflife)
+        self.min_requests = min_requests
+        self.z_threshold = z_threshold
+        self.min_error_rate = min_error_rate
+        self.max_error_rate = max_error_rate
+        self.latency_threshold_ms = latency_threshold_ms
+        self.min_baseline_slots = min_baseline_slots
+        self.services: Dict[str, ServiceWindows] = {}
+
+    def _service(self, name: str) -> ServiceWindows:
+        svc = self.services.get(name)
+        if svc is None:
+            svc = self.services[name] = ServiceWindows(self.slot_seconds, self.slots)
+        return svc
+
+    def _expired_before(self, current: int) -> int:
+        """Start of the oldest slot still inside the longest window."""
+        return current - (self.slots - 1) * self.slot_seconds
+
+    def add(self, log: Dict[str, Any], now: Optional[float] = None) -> None:
+        ts = log_epoch(log)
+        if ts is None:
+            return
+        now = time.time() if now is None else now
+        if ts > now:
+            ts = now  # clock skew on the sender; count it as current
+        current = int(now // self.slot_seconds) * self.slot_seconds
+        start = int(ts // self.slot_seconds) * self.slot_seconds
+        if current - start >= self.slots * self.slot_seconds:
+            return  # older than the longest window
+        svc = self._service(log.get("service") or "unknown")
+        expired = self._expired_before(current)
+        if expired > svc.folded_until:
+            svc.fold(expired, self.alpha)  # before slot_for reuses the ring position of an expired slot
+        slot = svc.slot_for(start)
+        slot.requests += 1
+        is_error = log.get("is_error")
+        if is_error is None:
+            is_error = log.get("level") == "ERROR" or "error" in (log.get("message") or "").lower()
+        if is_error:
+            slot.errors += 1
+        status = log.get("status_code")
+        if status is None and "error_type" not in log:
+            # Not tagged by utils.log_classifier, which would have filled status_code from the message
+            status = find_status(log.get("message") or "")
+        if status is not None:
+            try:
+                status = int(status)
+            except (TypeError, ValueError):
+                status = None
+        if status is not None and status >= 500:
+            slot.http_5xx += 1
+        elif status == 401 or log.get("error_type") == "auth_failure":
+            slot.auth_failures += 1
+        latency = log.get("latency_ms")
+        if latency is None:
+            latency = log.get("duration_ms")
+        if latency is not None:
+            try:
+                slot.latency_sum += float(latency)
+                slot.latency_count += 1
+            except (TypeError, ValueError):
+                pass
+
+    def add_many(self, logs: Iterable[Dict[str, Any]]) -> None:
+        now = time.time()
+        for log in logs:
+            self.add(log, now)
+
+    # --- Detection ---
+    def _rate_z(self, count: int, requests: int, seconds: int, baseline: Ewma) -> Tuple[float, float]:
+        """Window rate and its z-score against the baseline.
+
+        The spread is the larger of the baseline's per-slot variance scaled to the window length and
+        the binomial noise expected at the window's request count.
+        """
+        rate = count / requests
+        p = min(max(baseline.mean, 0.001), 0.999)
+        slots = max(seconds // self.slot_seconds, 1)
+        std = max(math.sqrt(baseline.var / slots), math.sqrt(p * (1 - p) / requests))
+        return rate, (rate - baseline.mean) / std
+
+    def _check_rate(self, name: str, what: str, attr: str, baseline: Ewma,
+                    totals: Dict[str, WindowSlot]) -> Optional[str]:
+        warm = baseline.samples >= self.min_baseline_slots
+        for label, seconds in self.windows:
+            window = totals[label]
+            if window.requests < self.min_requests:
+                continue
+            count = getattr(window, attr)
+            rate, z = self._rate_z(count, window.requests, seconds, baseline)
+            if rate < self.min_error_rate:
+                continue
+            if rate >= self.max_error_rate or (warm and z >= self.z_threshold):
+                detail = f"baseline {baseline.mean:.1%}, z={z:.1f}" if warm else "no baseline yet"
+                return (f"Service {name} {what} rate {rate:.1%} over last {label} "
+                        f"({count}/{window.requests} requests; {detail})")
+        return None
+
+    def _check_latency(self, name: str, svc: ServiceWindows, totals: Dict[str, WindowSlot]) -> Optional[str]:
+        baseline = svc.latency
+        warm = baseline.samples >= self.min_baseline_slots
+        for label, _ in self.windows:
+            window = totals[label]
+            if window.latency_count < self.min_requests:
+                continue
+            avg = window.latency_sum / window.latency_count
+            if avg > self.latency_threshold_ms:
+                return f"Service {name} average latency {avg:.0f}ms over last {label} (threshold {self.latency_threshold_ms:.0f}ms)"
+            if warm:
+                # Spread of per-slot means, floored at 10% of the baseline so a very steady service isn't hair-trigger
+                std = max(math.sqrt(baseline.var), 0.1 * baseline.mean, 1.0)
+                z = (avg - baseline.mean) / std
+                if z >= self.z_threshold and avg >= 1.5 * baseline.mean:
+                    return (f"Service {name} latency spike: {avg:.0f}ms average over last {label} "
+                            f"(baseline {baseline.mean:.0f}ms, z={z:.1f})")
+        return None
+
+    def detect(self, now: Optional[float] = None) -> List[str]:
+        now = time.time() if now is None else now
+        current = int(now // self.slot_seconds) * self.slot_seconds
+        anomalies = []
+        for name, svc in self.services.items():
+            svc.fold(self._expired_before(current), self.alpha)
+            totals = {label: svc.totals(seconds, current) for label, seconds in self.windows}
+            for found in (
+                self._check_rate(name, "error", "errors", svc.error_rate, totals),
+                self._check_rate(name, "HTTP 5xx", "http_5xx", svc.http_5xx_rate, totals),
+                self._check_rate(name, "authentication failure", "auth_failures", svc.auth_failure_rate, totals),
+                self._check_latency(name, svc, totals),
+            ):
+                if found:
+                    anomalies.append(found)
+        return anomalies
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Window counters and baselines per service (debug view)."""
+        now = time.time() if now is None else now
+        current = int(now // self.slot_seconds) * self.slot_seconds
+        result = {}
+        for name, svc in self.services.items():
+            windows = {}
+            for label, seconds in self.windows:
+                w = svc.totals(seconds, current)
+                windows[label] = {
+                    "requests": w.requests,
+                    "errors": w.errors,
+                    "http_5xx": w.http_5xx,
+                    "auth_failures": w.auth_failures,
+                    "avg_latency_ms": round(w.latency_sum / w.latency_count, 2) if w.latency_count else None,
+                }
+            result[name] = {
+                "windows": windows,
+                "baseline": {
+                    "error_rate": round(svc.error_rate.mean, 4),
+                    "http_5xx_rate": round(svc.http_5xx_rate.mean, 4),
+                    "auth_failure_rate": round(svc.auth_failure_rate.mean, 4),
+                    "latency_ms": round(svc.latency.mean, 2),
+                    "slots": svc.error_rate.samples,
+                },
+            }
+        return result
@@ -0,0 +1,229 @@
+import asyncio
+import math
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from utils.timeparse import EPOCH_FIELD, log_epoch
+
+LEVEL_ALIASES = {
+    "WARN": "WARNING",
+    "ERR": "ERROR",
+    "FATAL": "CRITICAL",
+    "CRIT": "CRITICAL",
+    "TRACE": "DEBUG",
+}
+
+
+def normalize_log(entry: Any, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Bring an ingested entry into the shape the analytics expect; returns None if it isn't a log.
+
+    Level is upper-cased with common aliases folded (WARN -> WARNING), a
+    missing service becomes ``unknown``, ``message`` is always a string and
+    the timestamp is parsed to an epoch once (entries without a usable
+    timestamp are stamped with the ingest time). A client-supplied
+    ``timestamp_epoch`` is ignored; the epoch always comes from ``timestamp``.
+    """
+    if not isinstance(entry, dict):
+        return None
+    level = entry.get("level")
+    level = str(level).upper() if level else "INFO"
+    entry["level"] = LEVEL_ALIASES.get(level, level)
+    service = entry.get("service")
+    entry["service"] = (str(service).strip() or "unknown") if service else "unknown"
+    message = entry.get("message")
+    if not isinstance(message, str):
+        entry["message"] = "" if message is None else str(message)
+    entry.pop(EPOCH_FIELD, None)
+    if log_epoch(entry) is None:
+        now = time.time() if now is None else now
+        entry["timestamp"] = datetime.utcfromtimestamp(now).isoformat() + "Z"
+        entry[EPOCH_FIELD] = now
+    return entry
+
+
+class IngestPipeline:
+    """Bounded queue between the ingest endpoints and the log analytics / Mongo.
+
+    ``submit`` only queues the raw batch and returns immediately; it refuses
+    the batch (returns False) when more than ``max_pending`` log lines are
+    already waiting, so callers can answer 429 instead of piling up memory.
+    ``workers`` tasks take batches off the queue, coalesce them up to
+    ``batch_size`` lines, normalize them, hand them to ``process`` (the
+    in-memory analytics) and then ``await persist`` (a bulk insert). Lines
+    count as pending until they are persisted, so a slow database turns into
+    backpressure on the producers. Streaming producers use ``await put``,
+    which waits up to ``put_timeout`` for room instead of refusing outright.
+    """
+
+    def __init__(self, process: Callable[[List[Dict[str, Any]]], Any],
+                 persist: Callable[[List[Dict[str, Any]]], Awaitable[Any]],
+                 workers: int = 4, max_pending: int = 200000, batch_size: int = 5000,
+                 put_timeout: float = 5.0, name: str = "Ingest Pipeline"):
+        self.process = process
+        self.persist = persist
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self.name = name
+        self._queue: Optional[asyncio.Queue] = None
+        self._room: Optional[asyncio.Condition] = None
+        self._tasks: List[asyncio.Task] = []
+        self.pending = 0
+        self.accepted = 0
+        self.rejected_batches = 0
+        self.rejected = 0
+        self.processed = 0
+        self.invalid = 0
+        self.process_errors = 0
+        self.persisted = 0
+        self.persist_errors = 0
+        self.last_batch_ms: Optional[float] = None
+        self._rate = 0.0  # lines/s drained, smoothed; drives Retry-After
+        self._rate_at = time.monotonic()
+        self._rate_count = 0
+
+    def _get_queue(self) -> asyncio.Queue:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    # --- Producers ---
+    def submit(self, entries: List[Any]) -> bool:
+        """Queue a batch of raw entries without waiting; False when the pipeline is full."""
+        count = len(entries)
+        if not self._has_room(count):
+            self.rejected_batches += 1
+            self.rejected += count
+            return False
+        self.pending += count
+        self.accepted += count
+        self._get_queue().put_nowait(entries)
+        return True
+
+    def _has_room(self, count: int) -> bool:
+        return not self.pending or self.pending + count <= self.max_pending
+
+    async def put(self, entries: List[Any]) -> bool:
+        """Queue a batch, waiting up to ``put_timeout`` for room; False if it was refused."""
+        if not self._has_room(len(entries)):
+            if self._room is None:
+                self._room = asyncio.Condition()
+            try:
+                async with self._room:
+                    await asyncio.wait_for(self._room.wait_for(lambda: self._has_room(len(entries))),
+                                           timeout=self.put_timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.submit(entries)
+
+    async def _notify_room(self) -> None:
+        if self._room is not None:
+            async with self._room:
+                self._room.notify_all()
+
+    def retry_after(self) -> int:
+        """Seconds a refused producer should wait: the time to drain what is queued now."""
+        if self._rate <= 0:
+            return 1
+        return min(60, max(1, math.ceil(self.pending / self._rate)))
+
+    # --- Workers ---
+    def _take(self, first: List[Any]) -> Tuple[List[Any], int]:
+        """Coalesce queued batches behind ``first`` up to ``batch_size`` lines."""
+        raw = list(first)
+        queue = self._get_queue()
+        while len(raw) < self.batch_size and not queue.empty():
+            raw.extend(queue.get_nowait())
+        return raw, len(raw)
+
+    async def _handle(self, raw: List[Any]) -> None:
+        started = time.perf_counter()
+        now = time.time()
+        logs = []
+        for entry in raw:
+            log = normalize_log(entry, now)
+            if log is None:
+                self.invalid += 1
+            else:
+                logs.append(log)
+        if logs:
+            try:
+                self.process(logs)
+                self.processed += len(logs)
+            except Exception as e:
+                self.process_errors += 1
+                # Still persist: these lines were already acknowledged to the producer
+                print(f"[{self.name}] Processing {len(logs)} logs failed: {e}")
+            try:
+                # Copies: the driver adds ``_id`` in place, which must not leak into the in-memory state
+                await self.persist([dict(log) for log in logs])
+                self.persisted += len(logs)
+            except Exception as e:
+                self.persist_errors += 1
+                print(f"[{self.name}] Persisting {len(logs)} logs failed: {e}")
+        self.last_batch_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    def _record_drained(self, count: int) -> None:
+        self._rate_count += count
+        now = time.monotonic()
+        elapsed = now - self._rate_at
+        if elapsed >= 1.0:
+            rate = self._rate_count / elapsed
+            self._rate = rate if self._rate <= 0 else 0.7 * self._rate + 0.3 * rate
+            self._rate_at = now
+            self._rate_count = 0
+
+    async def _worker(self) -> None:
+        queue = self._get_queue()
+        while True:
+            raw, count = self._take(await queue.get())
+            try:
+                await self._handle(raw)
+            except Exception as e:
+                print(f"[{self.name}] Worker error on {count} logs: {e}")
+            finally:
+                self.pending -= count
+                self._record_drained(count)
+            await self._notify_room()
+
+    async def run(self) -> None:
+        """Run the worker pool until cancelled, then drain what is still queued."""
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._tasks = []
+            await self.close()
+
+    async def close(self) -> None:
+        queue = self._get_queue()
+        while not queue.empty():
+            raw, count = self._take(queue.get_nowait())
+            try:
+                await self._handle(raw)
+            except Exception as e:
+                print(f"[{self.name}] Final drain failed: {e}")
+            self.pending -= count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "batch_size": self.batch_size,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "rejected_batches": self.rejected_batches,
+            "processed": self.processed,
+            "invalid": self.invalid,
+            "process_errors": self.process_errors,
+            "persisted": self.persisted,
+            "persist_errors": self.persist_errors,
+            "drain_rate_per_second": round(self._rate, 1),
+            "last_batch_ms": self.last_batch_ms,
+        }
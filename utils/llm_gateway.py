@@ -0,0 +1,333 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+PRIORITY_INTERACTIVE = 0  # a user is waiting on the answer
+PRIORITY_BACKGROUND = 10  # precomputation; yields to interactive calls
+
+# send(client) -> result; the upstream request of one provider call
+Sender = Callable[[httpx.AsyncClient], Awaitable[Any]]
+# open_stream(client) -> text chunks as the provider generates them
+StreamOpener = Callable[[httpx.AsyncClient], AsyncIterator[str]]
+
+
+class LLMError(Exception):
+    """A provider call failed; the message is meant for the user."""
+
+
+class PriorityLimiter:
+    """Counting semaphore whose waiters are woken by priority (lower first), then FIFO.
+
+    A released slot is handed straight to the next waiter, so a burst of
+    background calls queued first can't hold back an interactive call that
+    arrives later. ``raise_priority`` re-queues a waiter with a more urgent
+    priority; the stale heap entry is skipped when it comes up.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    @property
+    def queued(self) -> int:
+        return len({id(waiter) for _, _, waiter in self._waiters if not waiter.done()})
+
+    def enqueue(self, priority: int) -> Optional[asyncio.Future]:
+        """Take a slot now (returns None) or get a future that resolves once one is handed over."""
+        if self.active < self.limit and not self.queued:
+            self.active += 1
+            return None
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+        return waiter
+
+    def raise_priority(self, waiter: asyncio.Future, priority: int) -> None:
+        if not waiter.done():
+            heapq.heappush(self._waiters, (priority, next(self._seq), waiter))
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> None:
+        waiter = self.enqueue(priority)
+        if waiter is not None:
+            await self.wait(waiter)
+
+    async def wait(self, waiter: asyncio.Future) -> None:
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # Cancelled after the slot was handed over: pass it on instead of leaking it
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)  # the slot moves to the waiter, ``active`` is unchanged
+                return
+        self.active -= 1
+
+
+class _Flight:
+    """One upstream call and the callers sharing it."""
+    __slots__ = ("task", "waiter", "priority", "callers")
+
+    def __init__(self, priority: int):
+        self.task: Optional[asyncio.Task] = None
+        self.waiter: Optional[asyncio.Future] = None  # set while queued for a provider slot
+        self.priority = priority
+        self.callers = 1
+
+
+class _StreamFlight(_Flight):
+    """One upstream stream: the chunks so far, replayed to every subscriber."""
+    __slots__ = ("chunks", "done", "error", "changed")
+
+    def __init__(self, priority: int):
+        super().__init__(priority)
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+
+    def notify(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class LLMGateway:
+    """Front door for LLM requests: single-flight, per-provider limits and one pooled client.
+
+    - Identical in-flight requests (same provider and payload) are coalesced:
+      the first caller starts the upstream call and later callers await the
+      same result. A caller that goes away doesn't cancel the shared call.
+      ``stream`` does the same for streamed generations: subscribers that
+      join late first get the chunks produced so far.
+    - At most ``limits[provider]`` upstream calls per provider run at once;
+      the rest queue by priority (``PRIORITY_INTERACTIVE`` before
+      ``PRIORITY_BACKGROUND``). Joining a queued call with a more urgent
+      priority moves it up.
+    - All requests go over one keep-alive ``httpx.AsyncClient``.
+    - ``probe`` caches health checks (e.g. Ollama's ``/api/tags``) for
+      ``health_ttl`` seconds, or ``min(health_ttl, 5)`` when the probe failed,
+      so generation no longer pays for a probe round trip every time.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, default_limit: int = 2,
+                 health_ttl: float = 30.0, max_connections: int = 20, timeout: float = 120.0):
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+        self.health_ttl = health_ttl
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+        self._limiters: Dict[str, PriorityLimiter] = {}
+        self._flights: Dict[str, _Flight] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+        self._health: Dict[str, Tuple[float, Any]] = {}  # url -> (checked_at, result)
+        self._probes: Dict[str, asyncio.Task] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    # --- Client / limits ---
+    def get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            self._client = httpx.AsyncClient(limits=limits, timeout=self.timeout)
+        return self._client
+
+    def limiter(self, provider: str) -> PriorityLimiter:
+        limiter = self._limiters.get(provider)
+        if limiter is None:
+            limiter = self._limiters[provider] = PriorityLimiter(self.limits.get(provider, self.default_limit))
+        return limiter
+
+    def _provider_stats(self, provider: str) -> Dict[str, Any]:
+        stats = self._stats.get(provider)
+        if stats is None:
+            stats = self._stats[provider] = {"requests": 0, "streams": 0, "upstream_calls": 0, "coalesced": 0,
+                                             "errors": 0, "max_queue_wait_ms": 0.0, "max_call_ms": 0.0}
+        return stats
+
+    @staticmethod
+    def request_key(provider: str, payload: Any) -> str:
+        raw = json.dumps([provider, payload], sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    # --- Calls ---
+    def _join(self, flights: Dict[str, _Flight], provider: str, key: str, priority: int) -> Optional[_Flight]:
+        """The flight in progress for ``key`` (counted as coalesced, priority raised if needed), or None."""
+        flight = flights.get(key)
+        if flight is not None:
+            flight.callers += 1
+            self._stats[provider]["coalesced"] += 1
+            if priority < flight.priority:
+                flight.priority = priority
+                if flight.waiter is not None:
+                    self.limiter(provider).raise_priority(flight.waiter, priority)
+        return flight
+
+    async def _acquire(self, provider: str, flight: _Flight) -> float:
+        """Wait for a provider slot; returns when the upstream call started (perf_counter)."""
+        limiter = self.limiter(provider)
+        queued_at = time.perf_counter()
+        flight.waiter = limiter.enqueue(flight.priority)
+        if flight.waiter is not None:
+            await limiter.wait(flight.waiter)
+        flight.waiter = None
+        started = time.perf_counter()
+        stats = self._stats[provider]
+        stats["max_queue_wait_ms"] = max(stats["max_queue_wait_ms"], round((started - queued_at) * 1000, 2))
+        stats["upstream_calls"] += 1
+        return started
+
+    def _release(self, provider: str, started: float) -> None:
+        stats = self._stats[provider]
+        stats["max_call_ms"] = max(stats["max_call_ms"], round((time.perf_counter() - started) * 1000, 2))
+        self.limiter(provider).release()
+
+    async def call(self, provider: str, payload: Any, send: Sender, priority: int = PRIORITY_INTERACTIVE) -> Any:
+        """Result of ``send(client)``, shared with any identical call (``provider`` + ``payload``) in flight."""
+        self._provider_stats(provider)["requests"] += 1
+        key = self.request_key(provider, payload)
+        flight = self._join(self._flights, provider, key, priority)
+        if flight is None:
+            flight = self._flights[key] = _Flight(priority)
+            flight.task = asyncio.create_task(self._run(provider, key, flight, send))
+        # shield: one caller disconnecting must not cancel the call the others are waiting on
+        return await asyncio.shield(flight.task)
+
+    async def _run(self, provider: str, key: str, flight: _Flight, send: Sender) -> Any:
+        try:
+            started = await self._acquire(provider, flight)
+            try:
+                return await send(self.get_client())
+            except BaseException:
+                self._stats[provider]["errors"] += 1
+                raise
+            finally:
+                self._release(provider, started)
+        finally:
+            self._flights.pop(key, None)
+
+    async def stream(self, provider: str, payload: Any, open_stream: StreamOpener,
+                     priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[str]:
+        """Chunks of ``open_stream(client)``, shared with any identical stream in flight.
+
+        Errors of the upstream stream are re-raised to every subscriber once
+        the chunks before them were delivered. The upstream stream is
+        cancelled when its last subscriber goes away.
+        """
+        stats = self._provider_stats(provider)
+        stats["requests"] += 1
+        stats["streams"] += 1
+        key = self.request_key(provider, payload)
+        flight = self._join(self._streams, provider, key, priority)
+        if flight is None:
+            flight = self._streams[key] = _StreamFlight(priority)
+            flight.task = asyncio.create_task(self._produce(provider, key, flight, open_stream))
+        position = 0
+        try:
+            while True:
+                changed = flight.changed
+                while position < len(flight.chunks):
+                    position += 1
+                    yield flight.chunks[position - 1]
+                if flight.done:
+                    break
+                await changed.wait()
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.callers -= 1
+            if flight.callers == 0 and not flight.done:
+                flight.task.cancel()
+
+    async def _produce(self, provider: str, key: str, flight: _StreamFlight, open_stream: StreamOpener) -> None:
+        try:
+            started = await self._acquire(provider, flight)
+            try:
+                async for chunk in open_stream(self.get_client()):
+                    if chunk:
+                        flight.chunks.append(chunk)
+                        flight.notify()
+            except asyncio.CancelledError:
+                flight.error = LLMError("LLM stream was cancelled")
+                raise
+            except Exception as e:
+                self._stats[provider]["errors"] += 1
+                flight.error = e
+            finally:
+                self._release(provider, started)
+        except asyncio.CancelledError:
+            if flight.error is None:
+                flight.error = LLMError("LLM stream was cancelled")
+            raise
+        finally:
+            flight.done = True
+            flight.notify()
+            self._streams.pop(key, None)
+
+    # --- Health probes ---
+    async def probe(self, url: str, check: Callable[[httpx.AsyncClient], Awaitable[Any]], ok: Callable[[Any], bool],
+                    force: bool = False) -> Any:
+        """Cached result of ``check(client)`` for ``url``; concurrent probes of one url share a request."""
+        now = time.time()
+        cached = self._health.get(url)
+        if cached is not None and not force:
+            checked_at, result = cached
+            if now - checked_at < (self.health_ttl if ok(result) else min(self.health_ttl, 5.0)):
+                return result
+        task = self._probes.get(url)
+        if task is None:
+            task = self._probes[url] = asyncio.create_task(check(self.get_client()))
+            task.add_done_callback(lambda t, url=url: self._store_probe(url, t))
+        return await asyncio.shield(task)
+
+    def _store_probe(self, url: str, task: asyncio.Task) -> None:
+        self._probes.pop(url, None)
+        if not task.cancelled() and task.exception() is None:
+            self._health[url] = (time.time(), task.result())
+
+    def invalidate(self, url: str) -> None:
+        """Forget the cached probe for ``url`` (e.g. after a connection error) so the next call re-checks."""
+        self._health.pop(url, None)
+
+    async def aclose(self) -> None:
+        for flight in [*self._flights.values(), *self._streams.values()]:
+            if flight.task is not None:
+                flight.task.cancel()
+        for task in list(self._probes.values()):
+            task.cancel()
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        providers = {}
+        for provider in sorted(set(self._stats) | set(self.limits)):
+            limiter = self.limiter(provider)
+            providers[provider] = {
+                "max_concurrency": limiter.limit,
+                "active": limiter.active,
+                "queued": limiter.queued,
+                **self._provider_stats(provider),
+            }
+        return {
+            "in_flight": len(self._flights),
+            "streams_in_flight": len(self._streams),
+            "waiting_callers": sum(f.callers for f in [*self._flights.values(), *self._streams.values()]),
+            "providers": providers,
+            "health_ttl_seconds": self.health_ttl,
+            "health": {url: {"age_seconds": round(now - checked_at, 1), "result": result}
+                       for url, (checked_at, result) in self._health.items()},
+        }
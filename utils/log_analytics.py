@@ -0,0 +1,213 @@
+import time
+from collections import deque
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from utils.quantile_sketch import DDSketch
+from utils.timeparse import log_epoch
+
+# Exclusive time-series windows reported in the summary: (name, newest_age_s, oldest_age_s)
+TIME_WINDOWS = (
+    ("last_1h", 15 * 60, 60 * 60),
+    ("last_15m", 5 * 60, 15 * 60),
+    ("last_5m", 0, 5 * 60),
+)
+_BUCKET_SECONDS = 60
+
+
+def _classify_text(log: Dict[str, Any], level: str, status_code: Any) -> Tuple[bool, Tuple[str, ...]]:
+    """Error flag and error types from the raw message, for logs the classifier hasn't tagged."""
+    msg = log.get("message", "") or ""
+    msg_lower = msg.lower()
+    error_types = []
+    if "401" in msg or "authentication failed" in msg_lower:
+        error_types.append("auth_failure")
+    if "500" in msg or (status_code and status_code == 500):
+        error_types.append("http_500")
+    if "404" in msg and "order" in msg_lower:
+        error_types.append("order_404")
+    return "error" in msg_lower or level == "ERROR", tuple(error_types)
+
+
+class LogAnalytics:
+    """Incrementally maintained log statistics.
+
+    Entries are folded in one at a time (``add``) or in batches (``add_many``)
+    and the counters are updated in place, so the cost of keeping the summary
+    current depends only on how many new logs arrived. ``snapshot`` returns the
+    summary served by the analytics endpoints and is cached until new entries
+    arrive (or ``max_snapshot_age`` passes, since the time-series windows
+    slide with the clock).
+
+    Latencies go into DDSketch quantile sketches (overall, per service and per
+    minute bucket) so memory stays flat however many requests are logged.
+    """
+
+    def __init__(self, max_snapshot_age: float = 5.0, relative_accuracy: float = 0.01, max_bins: int = 2048):
+        self.max_snapshot_age = max_snapshot_age
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.total = 0
+        self.errors = 0
+        self.auth_failures = 0
+        self.http_500 = 0
+        self.order_404 = 0
+        self.error_types: Dict[str, int] = {}
+        self.response_codes: Dict[str, int] = {}
+        self.services: Dict[str, Dict[str, Any]] = {}
+        self.last_10_errors = deque(maxlen=10)
+        self.latency = self._new_sketch()
+        self._buckets: Dict[int, list] = {}  # minute start -> [total, errors, latency sketch]
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_at = 0.0
+
+    def _new_sketch(self) -> DDSketch:
+        return DDSketch(self.relative_accuracy, self.max_bins)
+
+    def add(self, log: Dict[str, Any]) -> None:
+        level = log.get("level", "")
+        service = log.get("service", "unknown")
+        status_code = log.get("status_code")
+        latency = log.get("latency_ms")
+        if latency is None:
+            latency = log.get("duration_ms")
+
+        self.total += 1
+        svc = self.services.get(service)
+        if svc is None:
+            svc = self.services[service] = {"total_requests": 0, "errors": 0, "latency": self._new_sketch()}
+        svc["total_requests"] += 1
+
+        if "is_error" in log:
+            # Tagged at parse/ingest time by utils.log_classifier
+            is_error = log["is_error"]
+            error_types = (log["error_type"],) if log.get("error_type") else ()
+        else:
+            is_error, error_types = _classify_text(log, level, status_code)
+        if is_error:
+            self.errors += 1
+            svc["errors"] += 1
+            # A copy: the caller's dict may still be changed in place (e.g. Mongo adds an ObjectId ``_id``)
+            self.last_10_errors.append({k: v for k, v in log.items() if k != "_id"})
+
+        for error_type in error_types:
+            if error_type == "auth_failure":
+                self.auth_failures += 1
+            elif error_type == "http_500":
+                self.http_500 += 1
+            elif error_type == "order_404":
+                self.order_404 += 1
+            self.error_types[error_type] = self.error_types.get(error_type, 0) + 1
+
+        if latency is not None:
+            try:
+                latency = float(latency)
+            except (TypeError, ValueError):
+                latency = None
+        if latency is not None:
+            self.latency.add(latency)
+            svc["latency"].add(latency)
+
+        if status_code:
+            code = str(status_code)
+            self.response_codes[code] = self.response_codes.get(code, 0) + 1
+
+        epoch = log_epoch(log)
+        if epoch is not None:
+            bucket = int(epoch // _BUCKET_SECONDS) * _BUCKET_SECONDS
+            counts = self._buckets.get(bucket)
+            if counts is None:
+                counts = self._buckets[bucket] = [0, 0, self._new_sketch()]
+            counts[0] += 1
+            if is_error:
+                counts[1] += 1
+            if latency is not None:
+                counts[2].add(latency)
+
+        self._snapshot = None
+
+    def service_latency(self, service: str) -> Optional[DDSketch]:
+        svc = self.services.get(service)
+        return svc["latency"] if svc else None
+
+    def add_many(self, logs: Iterable[Dict[str, Any]]) -> "LogAnalytics":
+        for log in logs:
+            self.add(log)
+        return self
+
+    def _time_series(self, now: float) -> Dict[str, Dict[str, int]]:
+        horizon = max(oldest for _, _, oldest in TIME_WINDOWS) + _BUCKET_SECONDS
+        for bucket in [b for b in self._buckets if now - b > horizon]:
+            del self._buckets[bucket]
+        series = {name: {"total": 0, "errors": 0} for name, _, _ in TIME_WINDOWS}
+        sketches = {name: self._new_sketch() for name, _, _ in TIME_WINDOWS}
+        for bucket, (total, errors, sketch) in self._buckets.items():
+            if bucket > now:
+                continue
+            # Age of the bucket's newest possible entry; minute resolution is plenty here
+            age = max(now - bucket - _BUCKET_SECONDS, 0.0)
+            for name, newest, oldest in TIME_WINDOWS:
+                if newest <= age < oldest:
+                    series[name]["total"] += total
+                    series[name]["errors"] += errors
+                    sketches[name].merge(sketch)
+                    break
+        for name, window in series.items():
+            window["p95_latency_ms"] = sketches[name].quantile(0.95)
+            window["p99_latency_ms"] = sketches[name].quantile(0.99)
+        return series
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current summary (cached between updates)."""
+        now = time.time()
+        if self._snapshot is not None and now - self._snapshot_at < self.max_snapshot_age:
+            return self._snapshot
+
+        latency = self.latency
+        performance = {
+            "avg_latency_ms": None,
+            "min_latency_ms": None,
+            "max_latency_ms": None,
+            "p95_latency_ms": None,
+            "p99_latency_ms": None,
+            "error_rate": 0.0,
+            "success_rate": 0.0
+        }
+        if latency.count:
+            performance.update({
+                "avg_latency_ms": latency.avg,
+                "min_latency_ms": latency.min,
+                "max_latency_ms": latency.max,
+                "p95_latency_ms": latency.quantile(0.95),
+                "p99_latency_ms": latency.quantile(0.99)
+            })
+        if self.total > 0:
+            performance["error_rate"] = (self.errors / self.total) * 100
+            performance["success_rate"] = 100 - performance["error_rate"]
+
+        services = {}
+        for name, svc in self.services.items():
+            sketch = svc["latency"]
+            services[name] = {
+                "total_requests": svc["total_requests"],
+                "errors": svc["errors"],
+                "avg_latency": sketch.avg if sketch.count else 0,
+                "p95_latency": sketch.quantile(0.95),
+                "p99_latency": sketch.quantile(0.99)
+            }
+
+        self._snapshot = {
+            "total": self.total,
+            "errors": self.errors,
+            "auth_failures": self.auth_failures,
+            "http_500": self.http_500,
+            "order_404": self.order_404,
+            "latency": latency.summary(),
+            "last_10_errors": list(self.last_10_errors),
+            "error_types": dict(self.error_types),
+            "response_codes": dict(self.response_codes),
+            "services": services,
+            "time_series": self._time_series(now),
+            "performance_metrics": performance
+        }
+        self._snapshot_at = now
+        return self._snapshot
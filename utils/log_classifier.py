@@ -0,0 +1,206 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# Patterns for the bundled demo services, used in addition to whatever is registered
+DEFAULT_SERVICE_PATTERNS = {
+    "auth_service": ["auth_service", "/auth", "auth"],
+    "order_service": ["order_service", "/order", "order"],
+    "catalog_service": ["catalog_service", "/catalog", "catalog", "product"],
+    "controller": ["controller"],
+}
+
+_SERVICE_SUFFIXES = ("_service", "-service", "service")
+_GENERIC_HOSTS = {"localhost", "127.0.0.1", "0.0.0.0", "host.docker.internal"}
+_MIN_PATTERN_LENGTH = 3  # shorter names would match inside ordinary words
+
+# Three-digit numbers standing on their own in a message, not "1500ms" or "0.500"
+_STATUS = r"(?<![\w.])(?P<status>[1-5]\d\d)(?![\w.])"
+# What must come right before such a number for it to be an HTTP status: "status=401", "status code: 500",
+# "HTTP/1.1 503", "HTTP error 502", "responded 404", "GET /orders 404", '"GET /x HTTP/1.1" 200'
+# (matched on lower-cased text, ending at the number)
+_HTTP_CONTEXT = re.compile(
+    r"(?:\bstatus(?:[ _-]?code)?\s*[=:]?\s*"
+    r"|\bhttp(?:/\d(?:\.\d)?)?(?:\s+error)?\s*[=:]?\s+"
+    r"|\b(?:responded|returned)(?:\s+with)?\s+"
+    r"|\b(?:get|post|put|patch|delete|head|options)\s+\S+(?:\s+http/\d(?:\.\d)?)?\"?\s+)$"
+)
+_CONTEXT_CHARS = 120  # how far back to look for the context
+_STATUS_ONLY = re.compile(_STATUS)
+
+
+def _is_http_status(text: str, start: int) -> bool:
+    return _HTTP_CONTEXT.search(text, max(0, start - _CONTEXT_CHARS), start) is not None
+
+
+def find_status(text: str) -> Optional[int]:
+    """First HTTP status code in ``text`` written in an HTTP-shaped context, else None.
+
+    "Request took 350 ms" or "user 123 logged in" give None.
+    """
+    text = text.lower()
+    for match in _STATUS_ONLY.finditer(text):
+        if _is_http_status(text, match.start()):
+            return int(match.group())
+    return None
+_AUTH_FAILED = r"(?P<auth>authentication failed)"
+_ERROR_WORD = r"(?P<error>error)"
+
+
+def service_patterns(doc: Dict[str, Any]) -> List[str]:
+    """Lower-cased strings that identify a registered service in log text.
+
+    The service name and its stem (``auth`` for ``auth_service``), the
+    hostname and path of its URL, its endpoint paths and any ``aliases``.
+    """
+    name = (doc.get("name") or "").strip().lower()
+    if not name:
+        return []
+    patterns = [name]
+    for suffix in _SERVICE_SUFFIXES:
+        if name.endswith(suffix) and len(name) - len(suffix) >= 4:
+            patterns.append(name[:-len(suffix)].rstrip("_-"))
+            break
+    url = doc.get("url")
+    if url:
+        try:
+            parsed = urlparse(url)
+            host = (parsed.hostname or "").lower()
+            if host and host not in _GENERIC_HOSTS and not host.replace(".", "").isdigit():
+                patterns.append(host)
+            if parsed.path and parsed.path.strip("/") and parsed.path.rstrip("/") != "/metrics":
+                patterns.append(parsed.path.rstrip("/").lower())
+        except ValueError:
+            pass
+    for endpoint in doc.get("endpoints") or []:
+        path = endpoint.get("path") if isinstance(endpoint, dict) else endpoint
+        if isinstance(path, str) and len(path.strip("/")) >= 3:
+            patterns.append(path.rstrip("/").lower())
+    for alias in doc.get("aliases") or []:
+        if isinstance(alias, str) and alias.strip():
+            patterns.append(alias.strip().lower())
+    return patterns
+
+
+class LogClassifier:
+    """Tags a log's service, error type and HTTP status in one regex pass over its message.
+
+    The patterns of every known service are compiled into a single
+    alternation (longest first, so ``order_service`` wins over ``order`` at
+    the same position) together with the status-code, "authentication
+    failed" and "error" matchers. ``tag`` lower-cases the message once and
+    walks the matches, then sets on the log:
+
+    - ``service`` when missing or ``unknown`` (first service mentioned in the
+      message, else in ``event``/``path``)
+    - ``status_code`` when missing and the message contains one in an
+      HTTP-shaped context (``status=500``, ``HTTP/1.1 500``, ``GET /x 500``);
+      other three-digit numbers ("took 350 ms") are not status codes
+    - ``error_type``: ``auth_failure``, ``http_500``, ``order_404`` or None;
+      one per log, in that order of priority
+    - ``is_error``: level ERROR or the message mentions "error"
+
+    Patterns claimed by more than one service (e.g. a shared ``/health``
+    endpoint) are left out. ``rebuild`` swaps in a new automaton atomically,
+    so it can run in a worker thread while other threads classify.
+    """
+
+    def __init__(self, docs: Iterable[Dict[str, Any]] = ()):
+        self.rebuild(docs)
+
+    def rebuild(self, docs: Iterable[Dict[str, Any]]) -> None:
+        owners: Dict[str, set] = {}
+        for name, patterns in DEFAULT_SERVICE_PATTERNS.items():
+            for pattern in patterns:
+                owners.setdefault(pattern, set()).add(name)
+        for doc in docs:
+            name = (doc.get("name") or "").strip()
+            for pattern in service_patterns(doc):
+                if len(pattern) >= _MIN_PATTERN_LENGTH:
+                    owners.setdefault(pattern, set()).add(name)
+        mapping = {pattern: next(iter(names)) for pattern, names in owners.items() if len(names) == 1}
+        alternation = "|".join(re.escape(p) for p in sorted(mapping, key=len, reverse=True)) or r"(?!x)x"
+        # The phrase goes first so its "auth" prefix isn't consumed as a service mention
+        combined = re.compile(f"{_AUTH_FAILED}|(?P<svc>{alternation})|{_STATUS}|{_ERROR_WORD}")
+        services = re.compile(alternation)
+        self._compiled: Tuple[Any, Any, Dict[str, str]] = (combined, services, mapping)
+        self.services = sorted({name for name in mapping.values()})
+
+    def infer_service(self, text: str) -> Optional[str]:
+        _, services, mapping = self._compiled
+        match = services.search(text.lower())
+        return mapping[match.group()] if match else None
+
+    def tag(self, log: Dict[str, Any]) -> Dict[str, Any]:
+        combined, _, mapping = self._compiled
+        message = log.get("message")
+        text = message.lower() if isinstance(message, str) else ""
+        service = None
+        mentioned = set()
+        codes = set()
+        first_code = None
+        auth_failed = False
+        mentions_error = False
+        for match in combined.finditer(text):
+            kind = match.lastgroup
+            if kind == "svc":
+                name = mapping[match.group()]
+                mentioned.add(name)
+                if service is None:
+                    service = name
+            elif kind == "status":
+                if not _is_http_status(text, match.start()):
+                    continue
+                code = int(match.group())
+                codes.add(code)
+                if first_code is None:
+                    first_code = code
+            elif kind == "auth":
+                auth_failed = True
+                name = self.infer_service(match.group())
+                if name:
+                    mentioned.add(name)
+                    if service is None:
+                        service = name
+            else:
+                mentions_error = True
+
+        current = log.get("service")
+        if not current or str(current).lower() == "unknown":
+            if service is None:
+                for field in ("event", "path"):
+                    value = log.get(field)
+                    if isinstance(value, str) and value:
+                        service = self.infer_service(value)
+                        if service:
+                            break
+            log["service"] = service or "unknown"
+
+        status = log.get("status_code")
+        if status is None:
+            if first_code is not None:
+                log["status_code"] = status = first_code
+        else:
+            try:
+                status = int(status)
+            except (TypeError, ValueError):
+                status = None
+        if status is not None:
+            codes.add(status)
+
+        if 401 in codes or auth_failed:
+            error_type = "auth_failure"
+        elif 500 in codes:
+            error_type = "http_500"
+        elif 404 in codes and "order_service" in mentioned:
+            error_type = "order_404"
+        else:
+            error_type = None
+        log["error_type"] = error_type
+        log["is_error"] = mentions_error or log.get("level") == "ERROR"
+        return log
+
+    def tag_many(self, logs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        for log in logs:
+            self.tag(log)
+        return logs
@@ -0,0 +1,251 @@
+import math
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Optional: pip install numpy (vectorized aggregation; the pure-Python path gives the same results)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_PERCENTILES = (50, 95, 99)
+
+# Column typecodes, shared by the LogStore segments that fill them
+TS, SERVICE, LEVEL, STATUS, LATENCY, ERROR = "d", "H", "B", "h", "d", "b"
+NO_STATUS = -1  # missing status_code; missing latency is NaN
+COLUMNS = (("ts", TS), ("service", SERVICE), ("level", LEVEL), ("status", STATUS), ("latency", LATENCY), ("error", ERROR))
+AGGREGATE_COLUMNS = ("ts", "service", "level", "latency", "error")  # what ``aggregate`` reads
+
+backend = "numpy" if np is not None else "python"
+
+
+def use_backend(name: str = "auto") -> str:
+    """Select "numpy" or "python" aggregation ("auto" prefers numpy); returns the one in use."""
+    global backend
+    name = (name or "auto").lower()
+    backend = "numpy" if np is not None and name in ("auto", "numpy") else "python"
+    return backend
+
+
+class LogColumns:
+    """Struct-of-arrays view of a run of logs: one column per field, ids instead of strings.
+
+    ``service`` and ``level`` hold indexes into ``services`` / ``levels``.
+    Columns are ``array.array``s, or NumPy arrays when built by ``concat``
+    with ``numpy=True``.
+    """
+    __slots__ = ("ts", "service", "level", "status", "latency", "error", "services", "levels")
+
+    def __init__(self, services: List[str], levels: List[str]):
+        self.services = services
+        self.levels = levels
+        self.ts = array(TS)
+        self.service = array(SERVICE)
+        self.level = array(LEVEL)
+        self.status = array(STATUS)
+        self.latency = array(LATENCY)
+        self.error = array(ERROR)
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    @classmethod
+    def concat(cls, parts: Sequence[Any], services: List[str], levels: List[str], numpy: bool = False,
+               fields: Sequence[str] = tuple(name for name, _ in COLUMNS)) -> "LogColumns":
+        """Join the ``fields`` columns of several segments (anything with the same column attributes)."""
+        cols = cls(services, levels)
+        for name, typecode in COLUMNS:
+            if name not in fields:
+                if numpy:
+                    setattr(cols, name, np.empty(0, dtype=typecode))
+                continue
+            if numpy:
+                # tobytes copies, so no buffer stays exported from arrays that are still growing
+                raw = b"".join(getattr(part, name).tobytes() for part in parts)
+                setattr(cols, name, np.frombuffer(raw, dtype=typecode))
+            else:
+                column = getattr(cols, name)
+                for part in parts:
+                    column.extend(getattr(part, name))
+        return cols
+
+
+def _percentile(sorted_values: Sequence[float], p: float) -> float:
+    """Linear interpolation between closest ranks (NumPy's default method)."""
+    pos = (len(sorted_values) - 1) * p / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def _latency_summary(count: int, total: float, quantiles: Dict[str, float]) -> Dict[str, Any]:
+    summary = {"count": count, "avg": round(total / count, 2) if count else None}
+    for label, value in quantiles.items():
+        summary[label] = round(value, 2) if count else None
+    return summary
+
+
+def _group(key: Tuple[Optional[str], Optional[int]], requests: int, errors: int,
+           latency: Dict[str, Any]) -> Dict[str, Any]:
+    service, start = key
+    group: Dict[str, Any] = {}
+    if service is not None:
+        group["service"] = service
+    if start is not None:
+        group["start"] = start
+    group.update({
+        "requests": requests,
+        "errors": errors,
+        "error_rate": round(errors / requests * 100, 2) if requests else 0.0,
+        "latency_ms": latency,
+    })
+    return group
+
+
+def aggregate(cols: LogColumns, service: Optional[str] = None, level: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None, interval: Optional[int] = None,
+              by_service: bool = False, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+    """Request/error counts and latency avg + percentiles over the matching rows.
+
+    With ``interval`` (seconds) and/or ``by_service`` the same figures are
+    also returned per group in ``groups``, ordered by service then time.
+    """
+    service_id = cols.services.index(service) if service in cols.services else None
+    level_id = cols.levels.index(level) if level in cols.levels else None
+    if (service is not None and service_id is None) or (level is not None and level_id is None):
+        cols = LogColumns(cols.services, cols.levels)  # nothing can match
+    labels = [f"p{p:g}" for p in percentiles]
+    run = _aggregate_numpy if backend == "numpy" and not isinstance(cols.ts, array) else _aggregate_python
+    return run(cols, service_id, level_id, since, until, interval or None, by_service, percentiles, labels)
+
+
+def _aggregate_python(cols, service_id, level_id, since, until, interval, by_service, percentiles, labels):
+    groups: Dict[Tuple[Optional[str], Optional[int]], list] = {}
+    requests = errors = 0
+    latencies: List[float] = []
+    services = cols.services
+    for ts, svc, lvl, err, lat in zip(cols.ts, cols.service, cols.level, cols.error, cols.latency):
+        if (service_id is not None and svc != service_id) or (level_id is not None and lvl != level_id):
+            continue
+        if (since is not None and ts < since) or (until is not None and ts > until):
+            continue
+        requests += 1
+        errors += err
+        if lat == lat:  # not NaN
+            latencies.append(lat)
+        if interval or by_service:
+            key = (services[svc] if by_service else None, int(ts // interval) * interval if interval else None)
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = [0, 0, []]
+            group[0] += 1
+            group[1] += err
+            if lat == lat:
+                group[2].append(lat)
+
+    def summary(values):
+        values.sort()
+        quantiles = {label: _percentile(values, p) for label, p in zip(labels, percentiles)} if values else dict.fromkeys(labels)
+        return _latency_summary(len(values), math.fsum(values), quantiles)
+
+    result = {"requests": requests, "errors": errors, "latency_ms": summary(latencies)}
+    if interval or by_service:
+        result["groups"] = [_group(key, g[0], g[1], summary(g[2]))
+                            for key, g in sorted(groups.items(), key=lambda kv: (kv[0][0] or "", kv[0][1] or 0))]
+    return result
+
+
+def _group_percentiles(values, group_ids, ngroups: int, percentiles) -> Tuple[Any, List[Any]]:
+    """Per-group counts and percentiles of ``values``.
+
+    Values are gathered group by group with a stable sort on the (small
+    integer) group ids, then each group's slice is sorted in place; this is
+    several times faster than a two-key lexsort over all rows.
+    """
+    counts = np.bincount(group_ids, minlength=ngroups)
+    ids = group_ids.astype(np.uint16 if ngroups <= 0xFFFF else np.uint32)  # radix sort for 16-bit keys
+    ordered = values[np.argsort(ids, kind="stable")]
+    ends = np.cumsum(counts)
+    start = 0
+    for end in ends.tolist():
+        if end - start > 1:
+            ordered[start:end].sort()
+        start = end
+    starts = ends - counts
+    span = np.maximum(counts - 1, 0)
+    last = max(len(ordered) - 1, 0)
+    out = []
+    for p in percentiles:
+        pos = starts + span * (p / 100)
+        lo = np.minimum(np.floor(pos).astype(np.int64), last)
+        hi = np.minimum(np.minimum(lo + 1, starts + span), last)
+        if len(ordered):
+            out.append(ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo))
+        else:
+            out.append(np.zeros(ngroups))
+    return counts, out
+
+
+def _aggregate_numpy(cols, service_id, level_id, since, until, interval, by_service, percentiles, labels):
+    ts, svc, err, lat = cols.ts, cols.service, cols.error, cols.latency
+    mask = None
+    for condition in (
+        (svc == service_id) if service_id is not None else None,
+        (cols.level == level_id) if level_id is not None else None,
+        (ts >= since) if since is not None else None,
+        (ts <= until) if until is not None else None,
+    ):
+        if condition is not None:
+            mask = condition if mask is None else mask & condition
+    if mask is not None:
+        ts, svc, err, lat = ts[mask], svc[mask], err[mask], lat[mask]
+
+    valid = ~np.isnan(lat)
+    values = lat[valid]
+    if len(values):
+        quantiles = dict(zip(labels, (float(q) for q in np.percentile(values, percentiles))))
+    else:
+        quantiles = dict.fromkeys(labels)
+    result = {
+        "requests": int(len(ts)),
+        "errors": int(np.count_nonzero(err)),
+        "latency_ms": _latency_summary(int(len(values)), float(values.sum()), quantiles),
+    }
+    if not (interval or by_service):
+        return result
+
+    nservices = max(len(cols.services), 1)
+    key = np.zeros(len(ts), dtype=np.int64)
+    if interval:
+        # Integer floor division; timestamps are positive, so truncating to int64 first is a floor
+        key = np.floor_divide(ts.astype(np.int64), int(interval))
+    if by_service:
+        key = key * nservices + svc
+    if len(key) and int(key.max()) - int(key.min()) < 4 * len(key) + 1024:
+        # Dense ids from the key range, then drop the empty ones (avoids np.unique's sort)
+        low = int(key.min())
+        dense = key - low
+        present = np.bincount(dense) > 0
+        uniq = np.flatnonzero(present) + low
+        inv = (np.cumsum(present) - 1)[dense]
+    else:
+        uniq, inv = np.unique(key, return_inverse=True)
+        inv = inv.reshape(-1)
+    ngroups = len(uniq)
+    requests = np.bincount(inv, minlength=ngroups)
+    errors = np.bincount(inv, weights=err, minlength=ngroups)
+    group_ids = inv[valid]
+    lat_sum = np.bincount(group_ids, weights=values, minlength=ngroups)
+    lat_count, per_group = _group_percentiles(values, group_ids, ngroups, percentiles)
+
+    groups = []
+    for i, k in enumerate(uniq.tolist()):
+        service_name = cols.services[k % nservices] if by_service else None
+        bucket = k // nservices if by_service else k
+        count = int(lat_count[i])
+        quantiles = {label: float(column[i]) for label, column in zip(labels, per_group)}
+        groups.append(_group((service_name, bucket * interval if interval else None), int(requests[i]),
+                             int(errors[i]), _latency_summary(count, float(lat_sum[i]), quantiles)))
+    groups.sort(key=lambda g: (g.get("service") or "", g.get("start") or 0))
+    result["groups"] = groups
+    return result
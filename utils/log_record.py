@@ -0,0 +1,121 @@
+from sys import intern
+from typing import Any, Dict, Optional
+
+from utils.timeparse import EPOCH_FIELD
+
+# Fields with a slot of their own; everything else a log carries goes into ``extra``
+_FIELDS = ("timestamp", "level", "service", "message", "status_code", "latency_ms", "error_type", "is_error")
+_SLOTTED = frozenset(_FIELDS)
+_NOT_EXTRA = _SLOTTED | {EPOCH_FIELD}
+_MISSING = object()
+
+
+def _intern(value: Any) -> Any:
+    return intern(value) if type(value) is str else value
+
+
+class LogRecord:
+    """Compact, read-only form of a parsed log as kept by utils.log_store.
+
+    A parsed log dict costs several hundred bytes before counting its
+    values; a record keeps the fields every consumer reads in slots:
+
+    - ``ts``: epoch seconds (``EPOCH_FIELD``), or None
+    - ``service``, ``level``, ``error_type``: interned, so the handful of
+      distinct values are shared by every record
+    - ``status_code`` as int and ``latency_ms`` as float, when the log had
+      numeric values for them
+    - ``timestamp`` and ``message``: references to the original strings
+    - ``extra``: any other fields (``metadata``, ``path``, ...), or None
+
+    ``to_dict`` rebuilds the log for code that returns or mutates it;
+    ``get`` reads a field by its dict key without building the dict.
+    """
+    __slots__ = ("ts",) + _FIELDS + ("extra",)
+
+    def __init__(self, ts: Optional[float] = None, timestamp: Any = None, level: Optional[str] = None,
+                 service: Optional[str] = None, message: Any = None, status_code: Optional[int] = None,
+                 latency_ms: Optional[float] = None, error_type: Optional[str] = None, is_error: Optional[bool] = None,
+                 extra: Optional[Dict[str, Any]] = None):
+        self.ts = ts
+        self.timestamp = timestamp
+        self.level = _intern(level)
+        self.service = _intern(service)
+        self.message = message
+        self.status_code = status_code
+        self.latency_ms = latency_ms
+        self.error_type = _intern(error_type)
+        self.is_error = is_error
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, log: Dict[str, Any], ts: Optional[float] = _MISSING) -> "LogRecord":
+        record = cls.__new__(cls)  # slots filled directly; this runs once per ingested log
+        get = log.get
+        extra = None if _NOT_EXTRA.issuperset(log) else {key: value for key, value in log.items() if key not in _NOT_EXTRA}
+        status = get("status_code")
+        if status is not None and type(status) is not int:
+            extra = extra or {}
+            extra["status_code"] = status  # kept as sent ("500", "n/a")
+            status = None
+        latency = get("latency_ms")
+        if latency is not None:
+            if type(latency) is float or type(latency) is int:
+                latency = float(latency)
+            else:
+                extra = extra or {}
+                extra["latency_ms"] = latency
+                latency = None
+        record.ts = get(EPOCH_FIELD) if ts is _MISSING else ts
+        record.timestamp = get("timestamp")
+        level = get("level")
+        record.level = intern(level) if type(level) is str else level
+        service = get("service")
+        record.service = intern(service) if type(service) is str else service
+        record.message = get("message")
+        record.status_code = status
+        record.latency_ms = latency
+        error_type = get("error_type")
+        record.error_type = intern(error_type) if type(error_type) is str else error_type
+        record.is_error = get("is_error")
+        record.extra = extra or None
+        return record
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in _SLOTTED:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif key == EPOCH_FIELD:
+            return self.ts
+        if self.extra is not None:
+            return self.extra.get(key, default)
+        return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        log = {}
+        if self.timestamp is not None:
+            log["timestamp"] = self.timestamp
+        if self.level is not None:
+            log["level"] = self.level
+        if self.service is not None:
+            log["service"] = self.service
+        if self.message is not None:
+            log["message"] = self.message
+        if self.status_code is not None:
+            log["status_code"] = self.status_code
+        if self.latency_ms is not None:
+            log["latency_ms"] = self.latency_ms
+        if self.extra:
+            log.update(self.extra)
+        if self.is_error is not None or self.error_type is not None:
+            # The classifier sets both, error_type usually to None
+            log["error_type"] = self.error_type
+        if self.is_error is not None:
+            log["is_error"] = self.is_error
+        log[EPOCH_FIELD] = self.ts
+        return log
+
+    def __repr__(self) -> str:
+        return f"LogRecord({self.to_dict()!r})"
+
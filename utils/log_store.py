@@ -0,0 +1,395 @@
+import heapq
+import re
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils import log_columns
+from utils.log_columns import LogColumns
+from utils.log_record import LogRecord
+from utils.timeparse import log_epoch
+
+
+_NAN = float("nan")
+_TOKEN = re.compile(r"[a-z0-9_]+")
+
+
+def tokenize(text: Any) -> set:
+    """Lower-cased word tokens of a message, as used by the text index and text search."""
+    return set(_TOKEN.findall(text.lower())) if isinstance(text, str) else set()
+
+
+class _Segment:
+    """A run of consecutive records with time bounds, service/level indexes and numeric columns."""
+    __slots__ = ("first_seq", "entries", "timestamps", "min_ts", "max_ts", "by_service", "by_service_level",
+                 "by_token", "service", "level", "status", "latency", "error")
+
+    def __init__(self, first_seq: int = 0, text_index: bool = False):
+        self.first_seq = first_seq  # sequence number of entries[0]; entry i is first_seq + i
+        self.entries: List[LogRecord] = []
+        self.timestamps = array(log_columns.TS)
+        # Columns read by utils.log_columns (timestamps doubles as its ``ts``)
+        self.service = array(log_columns.SERVICE)
+        self.level = array(log_columns.LEVEL)
+        self.status = array(log_columns.STATUS)
+        self.latency = array(log_columns.LATENCY)
+        self.error = array(log_columns.ERROR)
+        self.min_ts = float("inf")
+        self.max_ts = float("-inf")
+        self.by_service: Dict[str, List[int]] = {}
+        self.by_service_level: Dict[Tuple[str, str], List[int]] = {}
+        self.by_token: Optional[Dict[str, array]] = {} if text_index else None
+
+    @property
+    def ts(self) -> array:
+        return self.timestamps
+
+    def add(self, record: LogRecord, ts: float, service_id: int, level_id: int) -> None:
+        pos = len(self.entries)
+        self.entries.append(record)
+        self.timestamps.append(ts)
+        if ts < self.min_ts:
+            self.min_ts = ts
+        if ts > self.max_ts:
+            self.max_ts = ts
+        service = record.service or "unknown"
+        level = record.level.upper() if isinstance(record.level, str) else ""
+        self.by_service.setdefault(service, []).append(pos)
+        self.by_service_level.setdefault((service, level), []).append(pos)
+        if self.by_token is not None:
+            for token in tokenize(record.message):
+                postings = self.by_token.get(token)
+                if postings is None:
+                    postings = self.by_token[token] = array("I")
+                postings.append(pos)
+        self.service.append(service_id)
+        self.level.append(level_id)
+        status = record.status_code
+        self.status.append(status if status is not None and -32768 <= status <= 32767 else log_columns.NO_STATUS)
+        latency = record.latency_ms
+        if latency is None:
+            duration = record.get("duration_ms")
+            latency = float(duration) if type(duration) in (int, float) else None
+        self.latency.append(_NAN if latency is None else latency)
+        is_error = record.is_error
+        if is_error is None:
+            is_error = record.level == "ERROR" or "error" in str(record.message or "").lower()
+        self.error.append(1 if is_error else 0)
+
+    def positions(self, service: Optional[str], level: Optional[str]) -> Optional[Iterable[int]]:
+        """Ascending positions matching the filters, or None when every entry matches."""
+        if service is None and level is None:
+            return None
+        if level is None:
+            return self.by_service.get(service, ())
+        if service is not None:
+            return self.by_service_level.get((service, level), ())
+        lists = [p for (_, lvl), p in self.by_service_level.items() if lvl == level]
+        if len(lists) == 1:
+            return lists[0]
+        return list(heapq.merge(*lists))
+
+    def text_positions(self, terms: set) -> List[int]:
+        """Ascending positions whose message contains every term (needs the text index)."""
+        postings = []
+        for term in terms:
+            found = self.by_token.get(term)
+            if found is None:
+                return []
+            postings.append(found)
+        postings.sort(key=len)
+        matched = set(postings[0])
+        for other in postings[1:]:
+            matched.intersection_update(other)
+        return sorted(matched)
+
+    def overlaps(self, since: Optional[float], until: Optional[float]) -> bool:
+        if since is not None and self.max_ts < since:
+            return False
+        if until is not None and self.min_ts > until:
+            return False
+        return True
+
+
+class LogStore:
+    """Bounded in-memory log store split into time-ordered segments.
+
+    Entries are appended to an open segment that is sealed after
+    ``segment_size`` entries. Each segment records its time span and keeps
+    per-service and per-(service, level) position lists, so a query such as
+    "service X, level ERROR, last 15 minutes" skips segments outside the time
+    range and only visits the matching entries of the rest. Whole segments
+    are evicted oldest first once the store holds more than ``max_entries``
+    or a segment's newest entry is older than ``max_age_seconds``.
+
+    Entries are kept as compact ``LogRecord`` objects (see
+    utils.log_record) and only turned back into dicts when read, so
+    iteration, ``len``, slicing, ``query`` and ``tail`` behave like the list
+    of dicts this replaced. Pass ``records=True`` to ``query``/``tail`` to
+    read the records themselves without building dicts.
+
+    Each segment also keeps numeric columns (service and level ids, status,
+    latency, error flag) next to its timestamps; ``aggregate`` runs counts,
+    averages and per-group percentiles over them with utils.log_columns,
+    vectorized when NumPy is installed.
+    """
+
+    def __init__(self, max_entries: int = 200_000, max_age_seconds: Optional[float] = 24 * 3600,
+                 segment_size: int = 1024, timestamp_of: Callable[[Dict[str, Any]], Optional[float]] = log_epoch,
+                 text_index: bool = False):
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.segment_size = segment_size
+        self.timestamp_of = timestamp_of
+        self.text_index = text_index
+        self._segments = deque()
+        self._size = 0
+        self._next_seq = 0
+        self.evicted = 0
+        # Ids of the service and level names in the segment columns (never reused, so ids stay stable)
+        self._service_ids: Dict[str, int] = {}
+        self._level_ids: Dict[str, int] = {}
+
+    # --- Writes ---
+    def append(self, entry: Dict[str, Any]) -> None:
+        epoch = self.timestamp_of(entry)
+        # Entries without a usable timestamp are indexed at arrival time
+        ts = time.time() if epoch is None else epoch
+        if not self._segments or len(self._segments[-1].entries) >= self.segment_size:
+            self._segments.append(_Segment(self._next_seq, self.text_index))
+        self._next_seq += 1
+        record = LogRecord.from_dict(entry, epoch)
+        service = record.service or "unknown"
+        service_id = self._service_ids.get(service)
+        if service_id is None:
+            service_id = self._service_ids[service] = len(self._service_ids)
+        level = record.level.upper() if isinstance(record.level, str) else ""
+        level_id = self._level_ids.get(level)
+        if level_id is None:
+            level_id = self._level_ids[level] = len(self._level_ids)
+        self._segments[-1].add(record, ts, service_id, level_id)
+        self._size += 1
+        if self._size > self.max_entries:
+            self.evict()
+
+    def extend(self, entries: Iterable[Dict[str, Any]]) -> None:
+        for entry in entries:
+            self.append(entry)
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """Drop the oldest segments beyond the count and age limits; returns entries dropped."""
+        now = time.time() if now is None else now
+        dropped = 0
+        while len(self._segments) > 1:
+            oldest = self._segments[0]
+            too_many = self._size - len(oldest.entries) >= self.max_entries
+            too_old = self.max_age_seconds is not None and oldest.max_ts < now - self.max_age_seconds
+            if not (too_many or too_old):
+                break
+            self._segments.popleft()
+            self._size -= len(oldest.entries)
+            dropped += len(oldest.entries)
+        self.evicted += dropped
+        return dropped
+
+    def clear(self) -> None:
+        self._segments.clear()
+        self._size = 0
+
+    # --- List-like reads ---
+    def __len__(self) -> int:
+        return self._size
+
+    def __bool__(self) -> bool:
+        return self._size > 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for segment in list(self._segments):
+            for record in segment.entries:
+                yield record.to_dict()
+
+    def __reversed__(self) -> Iterator[Dict[str, Any]]:
+        for segment in reversed(list(self._segments)):
+            for record in reversed(segment.entries):
+                yield record.to_dict()
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.start, item.stop, item.step
+            if start is not None and start < 0 and stop is None and step is None:
+                # Tail slice (the common logs[-n:] case) without copying the whole store
+                return self.tail(-start)
+            records = [record for segment in list(self._segments) for record in segment.entries]
+            return [record.to_dict() for record in records[item]]
+        if item < 0:
+            item += self._size
+        if not 0 <= item < self._size:
+            raise IndexError("LogStore index out of range")
+        for segment in self._segments:
+            if item < len(segment.entries):
+                return segment.entries[item].to_dict()
+            item -= len(segment.entries)
+        raise IndexError("LogStore index out of range")
+
+    # --- Indexed queries ---
+    def query(self, service: Optional[str] = None, level: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None,
+              newest_first: bool = False, records: bool = False) -> Iterator[Any]:
+        """Yield entries matching service/level and an epoch-seconds time range (``LogRecord``s if ``records``)."""
+        level = level.upper() if level else None
+        segments = list(self._segments)
+        if newest_first:
+            segments.reverse()
+        for segment in segments:
+            if not segment.overlaps(since, until):
+                continue
+            positions = segment.positions(service, level)
+            if positions is None:
+                positions = range(len(segment.entries))
+            if newest_first:
+                positions = reversed(positions)
+            contained = (since is None or segment.min_ts >= since) and (until is None or segment.max_ts <= until)
+            entries, timestamps = segment.entries, segment.timestamps
+            for pos in positions:
+                if not contained:
+                    ts = timestamps[pos]
+                    if (since is not None and ts < since) or (until is not None and ts > until):
+                        continue
+                yield entries[pos] if records else entries[pos].to_dict()
+
+    def tail(self, n: int, service: Optional[str] = None, level: Optional[str] = None,
+             records: bool = False) -> List[Any]:
+        """Last ``n`` matching entries, oldest first."""
+        if n <= 0:
+            return []
+        result = []
+        for entry in self.query(service=service, level=level, newest_first=True, records=records):
+            result.append(entry)
+            if len(result) >= n:
+                break
+        result.reverse()
+        return result
+
+    def count(self, service: Optional[str] = None, level: Optional[str] = None,
+              since: Optional[float] = None, until: Optional[float] = None) -> int:
+        level = level.upper() if level else None
+        total = 0
+        for segment in self._segments:
+            if not segment.overlaps(since, until):
+                continue
+            if (since is None or segment.min_ts >= since) and (until is None or segment.max_ts <= until):
+                positions = segment.positions(service, level)
+                total += len(segment.entries) if positions is None else len(positions)
+            else:
+                total += self._count_partial(segment, service, level, since, until)
+        return total
+
+    @staticmethod
+    def _count_partial(segment: _Segment, service, level, since, until=None) -> int:
+        positions = segment.positions(service, level)
+        if positions is None:
+            positions = range(len(segment.entries))
+        timestamps = segment.timestamps
+        return sum(1 for pos in positions
+                   if (since is None or timestamps[pos] >= since) and (until is None or timestamps[pos] <= until))
+
+    def page(self, limit: int, service: Optional[str] = None, level: Optional[str] = None,
+             since: Optional[float] = None, until: Optional[float] = None, text: Optional[str] = None,
+             before: Optional[int] = None, offset: int = 0) -> Tuple[List[LogRecord], Optional[int]]:
+        """Newest-first page of matching records and the cursor for the next page (None on the last page).
+
+        ``before`` is a cursor from a previous page: only entries appended
+        before it are returned. Segments newer than the cursor are skipped on
+        their sequence numbers and the service/level position lists are
+        bisected, so a deep page costs the same as the first one. ``offset``
+        is still supported; segments it passes over entirely are skipped on
+        their index counts without touching entries. ``text`` keeps entries
+        whose message contains every word of it (through the text index when
+        enabled, by tokenizing candidate messages otherwise).
+        """
+        level = level.upper() if level else None
+        terms = tokenize(text) if text else None
+        skip = offset
+        found: List[Tuple[int, LogRecord]] = []
+        for segment in reversed(list(self._segments)):
+            if before is not None and segment.first_seq >= before:
+                continue
+            if not segment.overlaps(since, until):
+                continue
+            positions = segment.positions(service, level)
+            text_checked = terms is None
+            if terms is not None and segment.by_token is not None:
+                matched = segment.text_positions(terms)
+                if positions is not None:
+                    allowed = set(positions)
+                    matched = [pos for pos in matched if pos in allowed]
+                positions = matched
+                text_checked = True
+            if positions is None:
+                positions = range(len(segment.entries))
+            end = len(positions)
+            if before is not None and before < segment.first_seq + len(segment.entries):
+                end = bisect_left(positions, before - segment.first_seq)
+            contained = (since is None or segment.min_ts >= since) and (until is None or segment.max_ts <= until)
+            if skip and contained and text_checked and end <= skip:
+                skip -= end
+                continue
+            entries, timestamps = segment.entries, segment.timestamps
+            for i in range(end - 1, -1, -1):
+                pos = positions[i]
+                if not contained:
+                    ts = timestamps[pos]
+                    if (since is not None and ts < since) or (until is not None and ts > until):
+                        continue
+                if not text_checked and not terms <= tokenize(entries[pos].message):
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                found.append((segment.first_seq + pos, entries[pos]))
+                if len(found) > limit:
+                    # One past the page tells whether another page exists
+                    return [record for _, record in found[:limit]], found[limit - 1][0]
+        return [record for _, record in found], None
+
+    def columns(self, since: Optional[float] = None, until: Optional[float] = None, numpy: Optional[bool] = None,
+                fields=tuple(name for name, _ in log_columns.COLUMNS)) -> LogColumns:
+        """Columns of every segment overlapping the time range (rows outside it are filtered by ``aggregate``)."""
+        if numpy is None:
+            numpy = log_columns.backend == "numpy"
+        parts = [segment for segment in list(self._segments) if segment.overlaps(since, until)]
+        return LogColumns.concat(parts, list(self._service_ids), list(self._level_ids), numpy=numpy, fields=fields)
+
+    def aggregate(self, service: Optional[str] = None, level: Optional[str] = None,
+                  since: Optional[float] = None, until: Optional[float] = None, interval: Optional[int] = None,
+                  by_service: bool = False, percentiles=log_columns.DEFAULT_PERCENTILES) -> Dict[str, Any]:
+        """Counts, error totals and latency avg/percentiles, optionally per time bucket and/or service.
+
+        See utils.log_columns.aggregate for the result shape.
+        """
+        cols = self.columns(since, until, fields=log_columns.AGGREGATE_COLUMNS)
+        return log_columns.aggregate(cols, service=service, level=level.upper() if level else None,
+                                     since=since, until=until, interval=interval, by_service=by_service,
+                                     percentiles=percentiles)
+
+    def counts_by_service_level(self) -> Dict[str, Dict[str, int]]:
+        """{service: {LEVEL: count}} straight from the segment indexes."""
+        counts: Dict[str, Dict[str, int]] = {}
+        for segment in self._segments:
+            for (service, level), positions in segment.by_service_level.items():
+                per_service = counts.setdefault(service, {})
+                per_service[level] = per_service.get(level, 0) + len(positions)
+        return counts
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": self._size,
+            "segments": len(self._segments),
+            "evicted": self.evicted,
+            "max_entries": self.max_entries,
+            "max_age_seconds": self.max_age_seconds,
+            "oldest_ts": self._segments[0].min_ts if self._segments else None,
+            "text_index": self.text_index,
+        }
@@ -0,0 +1,117 @@
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+class _TailState:
+    """Read position of one tailed file."""
+    __slots__ = ("inode", "offset", "last_line", "resync")
+
+    def __init__(self, inode: int):
+        self.inode = inode
+        self.offset = 0
+        self.last_line = b""  # Last complete line consumed, used to resync after truncation
+        self.resync = False
+
+
+class LogTailer:
+    """Incrementally read appended lines from a set of log files.
+
+    Keeps a byte offset and inode per file so each poll only reads and parses
+    the bytes written since the previous poll. A new inode (rotation) restarts
+    the file from the top; a file that shrank (``truncate_log_file`` in the
+    controller rewrites it in place with its last lines) is resynced by looking
+    for the last line we consumed, so surviving lines are not parsed twice.
+    """
+
+    def __init__(self, paths: List[Path], parse_line: Callable[[str], Optional[Dict[str, Any]]],
+                 chunk_size: int = 1024 * 1024):
+        self.paths = [Path(p) for p in paths]
+        self.parse_line = parse_line
+        self.chunk_size = chunk_size
+        self._states: Dict[Path, _TailState] = {}
+        self.bytes_read = 0
+        self.lines_parsed = 0
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """Return parsed entries for all complete lines appended since the last poll."""
+        entries = []
+        for path in self.paths:
+            try:
+                entries.extend(self._poll_file(path))
+            except Exception as e:
+                print(f"Error tailing {path}: {e}")
+        return entries
+
+    def _poll_file(self, path: Path) -> List[Dict[str, Any]]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._states.pop(path, None)
+            return []
+
+        state = self._states.get(path)
+        if state is None or state.inode != st.st_ino:
+            # First sight of the file or it was rotated: read from the beginning
+            state = _TailState(st.st_ino)
+            self._states[path] = state
+        elif st.st_size < state.offset:
+            # Truncated in place; find where we were in the surviving tail
+            state.offset = 0
+            state.resync = bool(state.last_line)
+
+        if st.st_size == state.offset:
+            return []
+
+        entries = []
+        with open(path, "rb") as f:
+            if state.resync:
+                state.offset = self._find_resync_offset(f, state.last_line)
+                state.resync = False
+            f.seek(state.offset)
+            pending = b""
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.bytes_read += len(chunk)
+                data = pending + chunk
+                end = data.rfind(b"\n")
+                if end == -1:
+                    pending = data
+                    continue
+                complete, pending = data[:end], data[end + 1:]
+                entries.extend(self._parse_block(complete, state))
+                state.offset = f.tell() - len(pending)
+        return entries
+
+    def _parse_block(self, block: bytes, state: _TailState) -> List[Dict[str, Any]]:
+        entries = []
+        for raw in block.split(b"\n"):
+            line = raw.decode("utf-8", errors="replace").strip().lstrip("\ufeff")
+            if not line:
+                continue
+            state.last_line = raw
+            self.lines_parsed += 1
+            parsed = self.parse_line(line)
+            if parsed:
+                entries.append(parsed)
+        return entries
+
+    @staticmethod
+    def _find_resync_offset(f, last_line: bytes) -> int:
+        """Offset just past the last occurrence of ``last_line`` in a truncated file, else 0."""
+        data = f.read()
+        if not data:
+            return 0
+        idx = data.rfind(last_line + b"\n")
+        if idx == -1:
+            return 0
+        return idx + len(last_line) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": {str(p): {"offset": s.offset, "inode": s.inode} for p, s in self._states.items()},
+            "bytes_read": self.bytes_read,
+            "lines_parsed": self.lines_parsed,
+        }
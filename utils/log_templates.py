@@ -0,0 +1,60 @@
+import hashlib
+import re
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Variable parts of a message, most specific first; each is replaced by a placeholder
+_VARIABLES = (
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I), "<uuid>"),
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<ts>"),
+    (re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b"), "<email>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<ip>"),
+    (re.compile(r"\b(?:0x)?[0-9a-f]{12,}\b", re.I), "<hex>"),
+    (re.compile(r"'[^']*'|\"[^\"]*\""), "<str>"),
+    (re.compile(r"(?<![\w.])[-+]?\d+(?:\.\d+)?"), "<num>"),
+)
+_SPACES = re.compile(r"\s+")
+
+
+def template_of(message: Any) -> str:
+    """The message with ids, numbers, timestamps, addresses and quoted values replaced by placeholders.
+
+    ``GET /api/orders/1234 500 in 35ms`` and ``GET /api/orders/77 500 in 12ms``
+    share the template ``GET /api/orders/<num> <num> in <num>ms``.
+    """
+    text = message if isinstance(message, str) else str(message or "")
+    for pattern, placeholder in _VARIABLES:
+        text = pattern.sub(placeholder, text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def digest(parts: Iterable[str]) -> str:
+    """Short stable hash of a sequence of strings."""
+    h = hashlib.blake2b(digest_size=8)
+    for part in parts:
+        h.update(part.encode("utf-8", "replace"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def log_template(log: Dict[str, Any]) -> Tuple[str, str, str]:
+    """(service, level, template) identifying what kind of event a log is."""
+    return (str(log.get("service") or "unknown"), str(log.get("level") or ""), template_of(log.get("message")))
+
+
+def template_counts(logs: Iterable[Dict[str, Any]]) -> List[Tuple[Tuple[str, str, str], int]]:
+    """Distinct (service, level, template) of ``logs`` with their counts, most frequent first."""
+    counts: Dict[Tuple[str, str, str], int] = {}
+    for log in logs:
+        key = log_template(log)
+        counts[key] = counts.get(key, 0) + 1
+    return sorted(counts.items(), key=lambda kv: (-kv[1], kv[0]))
+
+
+def templates_fingerprint(logs: Iterable[Dict[str, Any]]) -> str:
+    """Hash of the set of log templates, independent of order, counts and the variable values."""
+    return digest(sorted({"|".join(log_template(log)) for log in logs}))
+
+
+def anomalies_fingerprint(anomalies: Iterable[str]) -> str:
+    """Hash of the normalized anomaly set: rates, counts and z-scores don't change it."""
+    return digest(sorted({template_of(anomaly) for anomaly in anomalies if anomaly}))
@@ -0,0 +1,227 @@
+import zlib
+from typing import Any, Callable, Iterator, List, Optional
+
+from utils.serialization import DECODE_ERRORS, loads as _loads
+
+# Optional: pip install zstandard (enables Content-Encoding: zstd)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Decompressed bytes produced per step. Decoders yield after every step, so
+# the consumer (line splitting, batching, backpressure) runs before more of a
+# highly compressed chunk is inflated
+_INFLATE_STEP = 256 * 1024
+
+
+class UnsupportedEncoding(ValueError):
+    pass
+
+
+class CorruptStream(ValueError):
+    """The compressed body could not be decoded."""
+
+
+class _Gzip:
+    """Incremental gzip/deflate decoder that also handles concatenated gzip members."""
+
+    def __init__(self, wbits: int):
+        self.wbits = wbits
+        self._obj = zlib.decompressobj(wbits)
+        self._fed = False  # the current member has received input
+
+    def decompress(self, data: bytes) -> Iterator[bytes]:
+        """Decompressed pieces of ``data``, at most ``_INFLATE_STEP`` bytes each, produced lazily."""
+        while data:
+            self._fed = True
+            try:
+                chunk = self._obj.decompress(data, _INFLATE_STEP)
+            except zlib.error as e:
+                raise CorruptStream(str(e)) from e
+            if chunk:
+                yield chunk
+            if self._obj.eof:
+                # Next gzip member (e.g. shippers appending compressed batches)
+                data = self._obj.unused_data
+                self._obj = zlib.decompressobj(self.wbits)
+                self._fed = False
+            else:
+                data = self._obj.unconsumed_tail
+
+    def flush(self) -> Iterator[bytes]:
+        if self._fed and not self._obj.eof:
+            raise CorruptStream("compressed body ended before the end of the stream")
+        tail = self._obj.flush()
+        if tail:
+            yield tail
+
+
+class _NeedInput(Exception):
+    pass
+
+
+class _Feed:
+    """Source for ``zstandard``'s pull-based reader that is filled as network chunks arrive.
+
+    Reading it empty raises ``_NeedInput`` (the reader keeps its state and is
+    read again once more input is there) until ``close``, after which it
+    reports end of input.
+    """
+
+    def __init__(self):
+        self.data = b""
+        self.closed = False
+
+    def read(self, size: int = -1) -> bytes:
+        if not self.data:
+            if self.closed:
+                return b""
+            raise _NeedInput()
+        if size < 0 or size >= len(self.data):
+            data, self.data = self.data, b""
+        else:
+            data, self.data = self.data[:size], self.data[size:]
+        return data
+
+
+class _Zstd:
+    """Incremental zstd decoder (concatenated frames included), inflating ``_INFLATE_STEP`` bytes at a time.
+
+    ``decompressobj`` has no output limit, so a small chunk could expand
+    without bound in one call; the stream reader is read in bounded pieces
+    instead.
+    """
+
+    def __init__(self):
+        self._feed = _Feed()
+        self._reader = zstandard.ZstdDecompressor().stream_reader(self._feed, read_across_frames=True)
+
+    def decompress(self, data: bytes) -> Iterator[bytes]:
+        self._feed.data += data
+        while True:
+            try:
+                chunk = self._reader.read1(_INFLATE_STEP)
+            except _NeedInput:
+                return
+            except zstandard.ZstdError as e:
+                raise CorruptStream(str(e)) from e
+            if not chunk:
+                return
+            yield chunk
+
+    def flush(self) -> Iterator[bytes]:
+        self._feed.closed = True
+        while True:
+            try:
+                chunk = self._reader.read(_INFLATE_STEP)
+            except zstandard.ZstdError as e:
+                raise CorruptStream(str(e)) from e
+            if not chunk:
+                return
+            yield chunk
+
+
+class _Identity:
+    def decompress(self, data: bytes) -> Iterator[bytes]:
+        yield data
+
+    def flush(self) -> Iterator[bytes]:
+        return iter(())
+
+
+def decompressor_for(encoding: Optional[str]):
+    """Streaming decoder for a Content-Encoding header value (gzip, deflate, zstd or none)."""
+    encoding = (encoding or "identity").strip().lower()
+    if encoding in ("", "identity"):
+        return _Identity()
+    if encoding in ("gzip", "x-gzip"):
+        return _Gzip(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return _Gzip(zlib.MAX_WBITS)
+    if encoding == "zstd":
+        if zstandard is None:
+            raise UnsupportedEncoding("zstd bodies need the zstandard package on the server")
+        return _Zstd()
+    raise UnsupportedEncoding(f"Unsupported Content-Encoding: {encoding}")
+
+
+class NDJSONDecoder:
+    """Splits a byte stream into newline-delimited JSON records as it arrives.
+
+    Only the current partial line is buffered between ``feed`` calls. Lines
+    that aren't valid JSON, aren't objects, or are longer than
+    ``max_line_bytes`` are counted in ``errors`` (with the first few kept in
+    ``samples``) and skipped instead of failing the whole body.
+    """
+
+    def __init__(self, max_line_bytes: int = 1024 * 1024, loads: Callable[[bytes], Any] = _loads,
+                 max_samples: int = 5):
+        self.max_line_bytes = max_line_bytes
+        self.loads = loads
+        self.max_samples = max_samples
+        self._partial = bytearray()
+        self._skipping = False  # inside an oversized line; drop bytes until its newline
+        self.lines = 0
+        self.records = 0
+        self.errors = 0
+        self.samples: List[str] = []
+
+    def _error(self, reason: str) -> None:
+        self.errors += 1
+        if len(self.samples) < self.max_samples:
+            self.samples.append(f"line {self.lines}: {reason}")
+
+    def _parse(self, line: bytes, out: List[Any]) -> None:
+        if len(line) > self.max_line_bytes:
+            self.lines += 1
+            self._error(f"longer than {self.max_line_bytes} bytes")
+            return
+        line = line.strip()
+        if not line:
+            return
+        self.lines += 1
+        try:
+            record = self.loads(line)
+        except DECODE_ERRORS as e:
+            self._error(f"invalid JSON ({e})")
+            return
+        if not isinstance(record, dict):
+            self._error("not a JSON object")
+            return
+        self.records += 1
+        out.append(record)
+
+    def feed(self, data: bytes) -> List[Any]:
+        """Parse every complete line in ``data`` (plus the buffered partial line)."""
+        out: List[Any] = []
+        lines = data.split(b"\n")
+        tail = lines.pop()  # bytes after the last newline, the start of the next line
+        if lines:
+            if self._skipping:
+                # End of an oversized line that was already counted
+                lines[0] = b""
+                self._skipping = False
+            elif self._partial:
+                self._partial += lines[0]
+                lines[0] = bytes(self._partial)
+                self._partial.clear()
+            for line in lines:
+                self._parse(line, out)
+        if tail and not self._skipping:
+            self._partial += tail
+            if len(self._partial) > self.max_line_bytes:
+                self.lines += 1
+                self._error(f"longer than {self.max_line_bytes} bytes")
+                self._partial.clear()
+                self._skipping = True
+        return out
+
+    def close(self) -> List[Any]:
+        """Parse a final line that had no trailing newline."""
+        out: List[Any] = []
+        if self._partial and not self._skipping:
+            self._parse(bytes(self._partial), out)
+        self._partial.clear()
+        self._skipping = False
+        return out
@@ -0,0 +1,25 @@
+import base64
+import json
+from typing import Any, Tuple
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(source: str, position: Any) -> str:
+    """Opaque, URL-safe cursor for ``position`` (a sequence number or document id) in ``source``."""
+    raw = json.dumps([source, position], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, Any]:
+    """(source, position) of a cursor made by ``encode_cursor``; raises InvalidCursor otherwise."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        source, position = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("Malformed cursor") from e
+    if not isinstance(source, str):
+        raise InvalidCursor("Malformed cursor")
+    return source, position
@@ -0,0 +1,417 @@
+import re
+import sys
+from fnmatch import fnmatchcase
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Flat-dict aggregation applied across all series of a sample name; anything
+# not listed keeps the last value seen (the historical behaviour). Latency
+# sum/count are totalled so avg_latency covers every endpoint, not the last one.
+DEFAULT_AGGREGATION_RULES = {
+    "http_requests_total": "sum",
+    "errors_total": "sum",
+    "http_request_duration_seconds_sum": "sum",
+    "http_request_duration_seconds_count": "sum",
+    "total_response_ms_sum": "sum",
+    "total_response_ms_count": "sum",
+}
+_AGGREGATORS = ("sum", "max", "min", "avg", "last", "first")
+
+_LABEL_RE = re.compile(r'\s*([a-zA-Z_][a-zA-Z0-9_.]*)\s*=\s*"((?:[^"\\]|\\.)*)"\s*,?')
+_UNESCAPE_RE = re.compile(r'\\(.)')
+_UNESCAPES = {"n": "\n", '"': '"', "\\": "\\"}
+_TYPED_SUFFIXES = ("_bucket", "_sum", "_count", "_total", "_created", "_gcount", "_gsum", "_info")
+
+# Raw series text ("name{...}") -> (name, labels, canonical key). Scrapes repeat
+# the same series every cycle, so labels are parsed once per distinct series.
+_SERIES_CACHE: Dict[str, Tuple[str, Labels, str]] = {}
+_SERIES_CACHE_MAX = 200_000
+
+
+def _unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+    return _UNESCAPE_RE.sub(lambda m: _UNESCAPES.get(m.group(1), "\\" + m.group(1)), value)
+
+
+def _series(raw: str, brace: int) -> Tuple[str, Labels, str]:
+    """Parse ``name{labels}`` into (name, sorted labels, interned canonical key)."""
+    cached = _SERIES_CACHE.get(raw)
+    if cached is not None:
+        return cached
+    name = sys.intern(raw[:brace].strip())
+    body = raw[brace + 1:-1]
+    labels = tuple(sorted(
+        (sys.intern(m.group(1)), sys.intern(_unescape(m.group(2))))
+        for m in _LABEL_RE.finditer(body)
+    ))
+    if labels:
+        key = "%s{%s}" % (name, ",".join('%s="%s"' % (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                                         for k, v in labels))
+        key = sys.intern(key)
+    else:
+        key = name
+    if len(_SERIES_CACHE) >= _SERIES_CACHE_MAX:
+        _SERIES_CACHE.clear()
+    result = _SERIES_CACHE[raw] = (name, labels, key)
+    return result
+
+
+def _label_end(line: str, brace: int) -> int:
+    """Index of the ``}`` closing the label set, honouring quoted values and escapes."""
+    close = line.find("}", brace)
+    if close != -1 and "\\" not in line and line.count('"', brace, close) % 2 == 0:
+        return close
+    in_quotes = False
+    i = brace + 1
+    n = len(line)
+    while i < n:
+        c = line[i]
+        if c == "\\" and in_quotes:
+            i += 2
+            continue
+        if c == '"':
+            in_quotes = not in_quotes
+        elif c == "}" and not in_quotes:
+            return i
+        i += 1
+    return -1
+
+
+class AggregationRules:
+    """Per-metric aggregation used when label sets are collapsed into a flat dict.
+
+    Keys are sample names or ``fnmatch`` patterns (``*_total``); values are
+    one of sum, max, min, avg, last or first. Names without a rule use
+    ``default``. Lookups are memoized per sample name.
+    """
+    __slots__ = ("rules", "default", "_exact", "_patterns", "_resolved", "_by_series")
+
+    def __init__(self, rules: Optional[Dict[str, str]] = None, default: str = "last"):
+        self.rules = dict(DEFAULT_AGGREGATION_RULES if rules is None else rules)
+        self.default = default
+        self._exact = {k: v for k, v in self.rules.items() if "*" not in k and "?" not in k}
+        self._patterns = [(k, v) for k, v in self.rules.items() if k not in self._exact]
+        self._resolved: Dict[str, str] = {}
+        # Raw series text -> (sample name, rule) for the flat fast path
+        self._by_series: Dict[str, Tuple[str, str]] = {}
+
+    def rule_for(self, name: str) -> str:
+        rule = self._resolved.get(name)
+        if rule is None:
+            rule = self._exact.get(name)
+            if rule is None:
+                rule = next((r for pattern, r in self._patterns if fnmatchcase(name, pattern)), self.default)
+            if len(self._resolved) < _SERIES_CACHE_MAX:
+                self._resolved[name] = rule
+        return rule
+
+    @staticmethod
+    def combine(flat: Dict[str, float], counts: Dict[str, int], name: str, rule: str, value: float) -> None:
+        """Fold a further value of ``name`` into ``flat`` (the first value is stored directly)."""
+        if rule == "sum":
+            flat[name] += value
+        elif rule == "avg":
+            flat[name] += value
+            counts[name] += 1
+        elif rule == "max":
+            if value > flat[name]:
+                flat[name] = value
+        elif rule == "min":
+            if value < flat[name]:
+                flat[name] = value
+
+    @staticmethod
+    def finish(flat: Dict[str, float], counts: Dict[str, int]) -> Dict[str, float]:
+        for name, n in counts.items():
+            if n > 1:
+                flat[name] /= n
+        return flat
+
+    def fold(self, pairs: Iterable[Tuple[str, float]]) -> Dict[str, float]:
+        """Aggregate ``(sample name, value)`` pairs into ``{sample name: value}``."""
+        resolved_get = self._resolved.get
+        flat: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        for name, value in pairs:
+            rule = resolved_get(name) or self.rule_for(name)
+            if rule == "last":
+                flat[name] = value
+            elif name not in flat:
+                flat[name] = value
+                counts[name] = 1
+            else:
+                self.combine(flat, counts, name, rule, value)
+        return self.finish(flat, counts)
+
+
+_DEFAULT_RULES = AggregationRules()
+
+
+class MetricSet:
+    """Samples of one exposition payload, keyed by canonical series key.
+
+    ``samples`` maps ``name{k="v",...}`` (labels sorted, key interned) to the
+    value, ``series`` maps the same key to ``(sample name, labels, key)`` and
+    ``timestamps`` holds the optional per-sample timestamp in milliseconds.
+    ``types``/``help``/``units`` come from the ``# TYPE``/``# HELP``/``# UNIT``
+    metadata lines. Histograms and summaries are assembled on demand.
+    """
+    __slots__ = ("samples", "series", "timestamps", "types", "help", "units")
+
+    def __init__(self):
+        self.samples: Dict[str, float] = {}
+        self.series: Dict[str, Tuple[str, Labels, str]] = {}
+        self.timestamps: Dict[str, float] = {}
+        self.types: Dict[str, str] = {}
+        self.help: Dict[str, str] = {}
+        self.units: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def family_of(self, sample_name: str) -> str:
+        """Metric family a sample belongs to (``foo_bucket`` -> ``foo`` for a typed histogram)."""
+        if sample_name in self.types:
+            return sample_name
+        for suffix in _TYPED_SUFFIXES:
+            if sample_name.endswith(suffix):
+                base = sample_name[:-len(suffix)]
+                if base in self.types:
+                    return base
+        return sample_name
+
+    def by_name(self, sample_name: str) -> Iterator[Tuple[Labels, float]]:
+        for key, (name, labels, _) in self.series.items():
+            if name == sample_name:
+                yield labels, self.samples[key]
+
+    def histograms(self) -> Dict[str, Dict[Labels, Dict[str, object]]]:
+        """{family: {labels without le: {"buckets": [(le, cumulative count)], "sum", "count"}}}"""
+        result: Dict[str, Dict[Labels, Dict[str, object]]] = {}
+        for key, (name, labels, _) in self.series.items():
+            family = self.family_of(name)
+            if self.types.get(family) not in ("histogram", "gaugehistogram"):
+                continue
+            suffix = name[len(family):]
+            base_labels = tuple(kv for kv in labels if kv[0] != "le")
+            entry = result.setdefault(family, {}).setdefault(
+                base_labels, {"buckets": [], "sum": None, "count": None})
+            value = self.samples[key]
+            if suffix == "_bucket":
+                le = dict(labels).get("le")
+                if le is not None:
+                    entry["buckets"].append((float(le), value))
+            elif suffix in ("_sum", "_gsum"):
+                entry["sum"] = value
+            elif suffix in ("_count", "_gcount"):
+                entry["count"] = value
+        for per_labels in result.values():
+            for entry in per_labels.values():
+                entry["buckets"].sort()
+        return result
+
+    def summaries(self) -> Dict[str, Dict[Labels, Dict[str, object]]]:
+        """{family: {labels without quantile: {"quantiles": {q: value}, "sum", "count"}}}"""
+        result: Dict[str, Dict[Labels, Dict[str, object]]] = {}
+        for key, (name, labels, _) in self.series.items():
+            family = self.family_of(name)
+            if self.types.get(family) != "summary":
+                continue
+            suffix = name[len(family):]
+            base_labels = tuple(kv for kv in labels if kv[0] != "quantile")
+            entry = result.setdefault(family, {}).setdefault(
+                base_labels, {"quantiles": {}, "sum": None, "count": None})
+            value = self.samples[key]
+            if suffix == "":
+                q = dict(labels).get("quantile")
+                if q is not None:
+                    entry["quantiles"][float(q)] = value
+            elif suffix == "_sum":
+                entry["sum"] = value
+            elif suffix == "_count":
+                entry["count"] = value
+        return result
+
+    def flatten(self, rules: Optional[AggregationRules] = None) -> Dict[str, float]:
+        """Collapse label sets into ``{sample name: value}`` using per-metric aggregation rules."""
+        rules = _DEFAULT_RULES if rules is None else rules
+        # samples and series are filled together, so their insertion orders match
+        return rules.fold(zip((entry[0] for entry in self.series.values()), self.samples.values()))
+
+
+def _parse_metadata(result: MetricSet, line: str) -> None:
+    parts = line.split(None, 3)
+    if len(parts) < 3:
+        return
+    kind = parts[1]
+    if kind == "TYPE":
+        result.types[sys.intern(parts[2])] = parts[3].strip().lower() if len(parts) > 3 else "untyped"
+    elif kind == "HELP":
+        result.help[sys.intern(parts[2])] = parts[3] if len(parts) > 3 else ""
+    elif kind == "UNIT":
+        result.units[sys.intern(parts[2])] = parts[3] if len(parts) > 3 else ""
+
+
+def _value_and_timestamp(tail: str) -> Tuple[Optional[float], Optional[float]]:
+    """Slow path for sample tails carrying a timestamp and/or an OpenMetrics exemplar."""
+    parts = tail.split()
+    if not parts:
+        return None, None
+    try:
+        value = float(parts[0])
+    except ValueError:
+        return None, None
+    timestamp = None
+    if len(parts) > 1 and parts[1] != "#":
+        try:
+            timestamp = float(parts[1])
+        except ValueError:
+            pass
+    return value, timestamp
+
+
+def _split_sample(result: MetricSet, line: str):
+    """Full handling of one line: metadata, blank/indented lines, new or unusual series.
+
+    Returns ``(series entry, value text)`` for samples and None otherwise.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if line[0] == "#":
+        _parse_metadata(result, line)
+        return None
+    brace = line.find("{")
+    space = line.find(" ")
+    if space == -1:
+        space = line.find("\t")
+    # A brace after the series token belongs to an exemplar (``foo_total 17 # {trace_id="abc"} 1.0``)
+    if brace != -1 and space != -1 and space < brace and line[space:brace].strip():
+        brace = -1
+    if brace == -1:
+        if space == -1:
+            return None
+        name = line[:space]
+        entry = _SERIES_CACHE.get(name)
+        if entry is None:
+            name = sys.intern(name)
+            if len(_SERIES_CACHE) >= _SERIES_CACHE_MAX:
+                _SERIES_CACHE.clear()
+            entry = _SERIES_CACHE[name] = (name, (), name)
+        return entry, line[space:]
+    close = _label_end(line, brace)
+    if close == -1:
+        return None
+    return _series(line[:close + 1], brace), line[close + 1:]
+
+
+def parse_exposition(lines: Iterable[str]) -> MetricSet:
+    """Streaming parser for the Prometheus text format (0.0.4) and OpenMetrics.
+
+    ``lines`` may be any iterable of lines, e.g. ``text.splitlines()`` or an
+    ``aiter_lines`` buffer. Sample timestamps, label values containing spaces,
+    commas or escaped quotes, ``NaN``/``+Inf`` values and OpenMetrics
+    exemplars are handled; malformed lines are skipped.
+
+    The common case, a labelled series seen on an earlier scrape followed by
+    a bare value, costs one cache lookup and one ``float()`` call. Only
+    correctly delimited label sets are cached, so a prefix ending at a ``}``
+    inside a quoted value (or a comment line) can never hit the cache.
+    """
+    result = MetricSet()
+    samples = result.samples
+    series = result.series
+    timestamps = result.timestamps
+    cache_get = _SERIES_CACHE.get
+    for line in lines:
+        close = line.find("}")
+        entry = cache_get(line[:close + 1]) if close != -1 else None
+        if entry is not None:
+            tail = line[close + 1:]
+        else:
+            split = _split_sample(result, line)
+            if split is None:
+                continue
+            entry, tail = split
+        key = entry[2]
+        try:
+            value = float(tail)
+        except ValueError:
+            value, timestamp = _value_and_timestamp(tail)
+            if value is None:
+                continue
+            if timestamp is not None:
+                timestamps[key] = timestamp
+        samples[key] = value
+        series[key] = entry
+    return result
+
+
+def parse_prometheus_text(text: str) -> MetricSet:
+    return parse_exposition(text.splitlines())
+
+
+def parse_prometheus_flat(text: str, rules: Optional[AggregationRules] = None) -> Dict[str, float]:
+    """Fast path: parse straight into the flat ``{sample name: value}`` dict.
+
+    Same result as ``parse_prometheus_text(text).flatten(rules)`` but without
+    building a MetricSet: a labelled series seen before resolves to its name
+    and aggregation rule with a single lookup. A series repeated within one
+    payload is aggregated once per occurrence.
+    """
+    rules = _DEFAULT_RULES if rules is None else rules
+    by_series = rules._by_series
+    plan_get = by_series.get
+    scratch = MetricSet()  # receives metadata lines, which the flat view ignores
+    flat: Dict[str, float] = {}
+    counts: Dict[str, int] = {}
+    for line in text.splitlines():
+        close = line.find("}")
+        plan = plan_get(line[:close + 1]) if close != -1 else None
+        if plan is not None:
+            name, rule = plan
+            tail = line[close + 1:]
+        else:
+            split = _split_sample(scratch, line)
+            if split is None:
+                continue
+            entry, tail = split
+            name = entry[0]
+            rule = rules.rule_for(name)
+            raw = line[:close + 1]
+            # Only prefixes that are complete label sets (hence in the series cache) may be cached
+            if close != -1 and raw in _SERIES_CACHE:
+                if len(by_series) >= _SERIES_CACHE_MAX:
+                    by_series.clear()
+                by_series[raw] = (name, rule)
+        try:
+            value = float(tail)
+        except ValueError:
+            value, _ = _value_and_timestamp(tail)
+            if value is None:
+                continue
+        if rule == "last":
+            flat[name] = value
+        elif name not in flat:
+            flat[name] = value
+            counts[name] = 1
+        elif rule == "sum":
+            flat[name] += value
+        else:
+            rules.combine(flat, counts, name, rule, value)
+    return rules.finish(flat, counts)
+
+
+def parse_aggregation_rules(spec: str) -> AggregationRules:
+    """Parse ``"metric=sum,*_bytes=max"`` into rules layered over the defaults."""
+    rules = dict(DEFAULT_AGGREGATION_RULES)
+    for item in (spec or "").split(","):
+        if "=" not in item:
+            continue
+        name, rule = (part.strip() for part in item.split("=", 1))
+        if name and rule.lower() in _AGGREGATORS:
+            rules[name] = rule.lower()
+    return AggregationRules(rules)
+
@@ -0,0 +1,215 @@
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.log_templates import log_template
+from utils.timeparse import EPOCH_FIELD, log_epoch
+
+ERROR_LEVELS = frozenset(("ERROR", "CRITICAL", "FATAL"))
+WARNING_LEVELS = frozenset(("WARN", "WARNING"))
+# Fields shown in the line prefix or redundant with it
+_RENDERED_FIELDS = frozenset(("timestamp", EPOCH_FIELD, "level", "service", "message", "is_error"))
+_OMITTED_LINE_TOKENS = 20  # kept free for the "... more omitted" line
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English and JSON-ish text)."""
+    return (len(text) + 3) // 4
+
+
+def is_error_log(log: Dict[str, Any]) -> bool:
+    """The classifier's ``is_error`` flag, else level ERROR (or worse) or "error" in the message."""
+    flag = log.get("is_error")
+    if flag is not None:
+        return bool(flag)
+    return str(log.get("level") or "").upper() in ERROR_LEVELS or "error" in str(log.get("message") or "").lower()
+
+
+def _status(log: Dict[str, Any]) -> Optional[int]:
+    try:
+        return int(log.get("status_code"))
+    except (TypeError, ValueError):
+        return None
+
+
+def focus_logs(logs: Iterable[Dict[str, Any]], focus: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    """The newest ``limit`` logs an anomaly text is about, for ``build_log_section`` to rank.
+
+    Candidates are the logs of the services named in ``focus`` that are
+    errors, or 5xx / 401 / carry a latency when the anomaly is about HTTP
+    5xx, authentication failures or latency. Only the tagged fields are
+    read. When no named service has such logs, the window's errors are used,
+    and failing that its latest logs.
+    """
+    logs = logs if isinstance(logs, list) else list(logs)
+    focus_text = (focus or "").lower()
+    want_5xx = "5xx" in focus_text
+    want_auth = "authentication" in focus_text
+    want_latency = "latency" in focus_text
+    named: Dict[Any, bool] = {}
+    matched: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+    for log in logs:
+        error = is_error_log(log)
+        if error:
+            errors.append(log)
+        if not focus_text:
+            continue
+        service = log.get("service")
+        is_named = named.get(service)
+        if is_named is None:
+            is_named = named[service] = bool(service) and str(service).lower() in focus_text
+        if not is_named:
+            continue
+        if error:
+            matched.append(log)
+            continue
+        error_type = log.get("error_type")
+        if want_5xx or want_auth:
+            status = _status(log)
+            if (want_5xx and (error_type == "http_500" or (status is not None and status >= 500))) or \
+                    (want_auth and (error_type == "auth_failure" or status == 401)):
+                matched.append(log)
+                continue
+        if want_latency and log.get("latency_ms") is not None:
+            matched.append(log)
+    return (matched or errors or logs)[-limit:]
+
+
+def _clip(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > max_chars // 2 else max_chars].rstrip() + "…"
+
+
+def _clock(ts: Optional[float]) -> str:
+    return time.strftime("%H:%M:%S", time.gmtime(ts)) if ts is not None else "--:--:--"
+
+
+def render_log(log: Dict[str, Any], max_message_chars: int = 240, max_value_chars: int = 40) -> str:
+    """One compact line: time, level, service, the other fields as key=value, then the message.
+
+    Only the message and long field values are shortened (at a word boundary
+    where possible), so status, latency and error type always survive.
+    """
+    parts = [_clock(log_epoch(log)), str(log.get("level") or "-"), str(log.get("service") or "-")]
+    for key, value in log.items():
+        if key in _RENDERED_FIELDS or value is None or isinstance(value, (dict, list)):
+            continue
+        if key == "latency_ms" and isinstance(value, float):
+            value = f"{value:.0f}ms"
+            key = "latency"
+        parts.append(f"{key}={_clip(str(value), max_value_chars)}")
+    message = " ".join(str(log.get("message") or "").split())
+    return " ".join(parts) + ": " + _clip(message, max_message_chars)
+
+
+class _Group:
+    """Logs sharing one (service, level, template)."""
+    __slots__ = ("key", "count", "first_ts", "last_ts", "latest", "severity")
+
+    def __init__(self, key: Tuple[str, str, str], log: Dict[str, Any], ts: Optional[float]):
+        self.key = key
+        self.count = 0
+        self.first_ts = ts
+        self.last_ts = ts
+        self.latest = log
+        level = str(log.get("level") or "").upper()
+        self.severity = 2 if level in ERROR_LEVELS or log.get("is_error") else 1 if level in WARNING_LEVELS else 0
+
+
+class LogSection:
+    """Log lines selected for a prompt, with what they represent."""
+    __slots__ = ("text", "logs", "total_logs", "included_logs", "templates", "included_templates", "tokens")
+
+    def __init__(self, text: str, logs: List[Dict[str, Any]], total_logs: int, included_logs: int,
+                 templates: int, tokens: int):
+        self.text = text
+        self.logs = logs  # latest log of every included template
+        self.total_logs = total_logs
+        self.included_logs = included_logs
+        self.templates = templates
+        self.included_templates = len(logs)
+        self.tokens = tokens
+
+    @property
+    def header(self) -> str:
+        if self.included_templates == self.total_logs:
+            return f"{self.total_logs} logs"
+        noun = "message" if self.included_templates == 1 else "messages"
+        return f"{self.included_logs} of {self.total_logs} logs as {self.included_templates} distinct {noun}"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "total_logs": self.total_logs,
+            "included_logs": self.included_logs,
+            "templates": self.templates,
+            "included_templates": self.included_templates,
+            "estimated_tokens": self.tokens,
+        }
+
+
+def build_log_section(logs: Iterable[Dict[str, Any]], token_budget: int, focus: Optional[str] = None,
+                      max_message_chars: int = 240) -> LogSection:
+    """The most informative log lines that fit in ``token_budget`` tokens.
+
+    Logs with the same (service, level, message template) collapse into one
+    line, the latest occurrence with ``×count`` and the time span. Templates
+    are ranked by severity (errors, then warnings), whether their service is
+    named in ``focus`` (the anomaly text), nearness to the newest log (in
+    minutes), frequency and finally the template itself, and taken in that
+    order while they fit. The chosen lines are listed oldest first. The
+    result depends only on the input, so the same logs give the same prompt.
+    """
+    groups: Dict[Tuple[str, str, str], _Group] = {}
+    total = 0
+    for log in logs:
+        total += 1
+        key = log_template(log)
+        ts = log_epoch(log)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = _Group(key, log, ts)
+        group.count += 1
+        if ts is not None:
+            if group.first_ts is None or ts < group.first_ts:
+                group.first_ts = ts
+            if group.last_ts is None or ts >= group.last_ts:
+                group.last_ts, group.latest = ts, log
+        else:
+            group.latest = log
+    if not groups:
+        text = "No recent logs available."
+        return LogSection(text, [], 0, 0, 0, estimate_tokens(text))
+
+    focus_text = (focus or "").lower()
+    anchor = max((g.last_ts for g in groups.values() if g.last_ts is not None), default=None)
+
+    def rank(group: _Group):
+        named = bool(focus_text) and group.key[0].lower() in focus_text
+        minutes = int(abs(anchor - group.last_ts) // 60) if anchor is not None and group.last_ts is not None else 1 << 30
+        return (-group.severity, not named, minutes, -group.count, group.key)
+
+    budget = token_budget - _OMITTED_LINE_TOKENS
+    chosen: List[Tuple[_Group, str]] = []
+    used = 0
+    for group in sorted(groups.values(), key=rank):
+        line = render_log(group.latest, max_message_chars)
+        if group.count > 1:
+            line += f" ×{group.count}"
+            if group.first_ts is not None and group.last_ts != group.first_ts:
+                line += f" ({_clock(group.first_ts)}–{_clock(group.last_ts)})"
+        tokens = estimate_tokens(line) + 1
+        if used + tokens > budget:
+            continue  # a shorter line further down may still fit
+        chosen.append((group, line))
+        used += tokens
+
+    chosen.sort(key=lambda item: (item[0].last_ts if item[0].last_ts is not None else float("-inf"), item[0].key))
+    lines = [line for _, line in chosen]
+    included_logs = sum(group.count for group, _ in chosen)
+    if len(chosen) < len(groups):
+        lines.append(f"... {len(groups) - len(chosen)} more distinct messages ({total - included_logs} logs) omitted")
+    text = "\n".join(lines)
+    return LogSection(text, [group.latest for group, _ in chosen], total, included_logs, len(groups),
+                      estimate_tokens(text))
@@ -0,0 +1,110 @@
+import math
+from typing import Any, Dict, Optional
+
+
+class DDSketch:
+    """Mergeable quantile sketch with a relative-error guarantee (DDSketch).
+
+    Values are counted in logarithmic buckets so any quantile is returned
+    within ``relative_accuracy`` of the true value, using at most ``max_bins``
+    buckets no matter how many values are added. When the bin limit is hit
+    the lowest buckets are collapsed together, which only affects the very
+    low quantiles; p50/p95/p99 latencies keep their guarantee. Two sketches
+    built with the same accuracy can be merged, e.g. to combine time buckets.
+    """
+
+    __slots__ = ("relative_accuracy", "max_bins", "_gamma", "_log_gamma", "_min_indexable",
+                 "bins", "zero_count", "count", "sum", "min", "max")
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._min_indexable = 1e-9
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def add(self, value: float, weight: int = 1) -> None:
+        if value <= self._min_indexable:
+            self.zero_count += weight
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + weight
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += weight
+        self.sum += value * weight
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def _collapse(self) -> None:
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_bins
+        target = keys[excess]
+        collapsed = sum(self.bins.pop(k) for k in keys[:excess])
+        self.bins[target] += collapsed
+
+    def merge(self, other: "DDSketch") -> "DDSketch":
+        """Fold ``other`` into this sketch and return self."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        if not other.count:
+            return self
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def copy(self) -> "DDSketch":
+        return DDSketch(self.relative_accuracy, self.max_bins).merge(self)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile ``q`` (0..1), or None when the sketch is empty."""
+        if not self.count:
+            return None
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                value = 2 * self._gamma ** key / (self._gamma + 1)
+                # The bucket midpoint can fall outside the observed range at the edges
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    @property
+    def avg(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def summary(self) -> Dict[str, Any]:
+        """Compact, JSON-friendly statistics used in the API payloads."""
+        return {
+            "count": self.count,
+            "avg": self.avg,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
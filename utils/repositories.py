@@ -0,0 +1,224 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.timeparse import EPOCH_FIELD
+
+# Optional: pip install motor (falls back to pymongo calls in worker threads)
+try:
+    from motor.motor_asyncio import AsyncIOMotorClient
+except ImportError:
+    AsyncIOMotorClient = None
+
+
+class _ThreadedCursor:
+    """Awaitable subset of a motor cursor backed by a pymongo cursor."""
+
+    def __init__(self, collection, filter: Dict[str, Any], projection: Optional[Dict[str, Any]] = None):
+        self._collection = collection
+        self._filter = filter
+        self._projection = projection
+        self._sort: Optional[List[Tuple[str, int]]] = None
+        self._limit = 0
+
+    def sort(self, key, direction: Optional[int] = None) -> "_ThreadedCursor":
+        self._sort = key if isinstance(key, list) else [(key, direction if direction is not None else 1)]
+        return self
+
+    def limit(self, limit: int) -> "_ThreadedCursor":
+        self._limit = limit
+        return self
+
+    def _fetch(self, length: Optional[int]) -> List[Dict[str, Any]]:
+        cursor = self._collection.find(self._filter, self._projection)
+        if self._sort:
+            cursor = cursor.sort(self._sort)
+        limit = min(x for x in (self._limit, length) if x) if (self._limit or length) else 0
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._fetch, length)
+
+
+class ThreadedCollection:
+    """Motor-style facade over a pymongo collection; every call runs in a worker thread."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None):
+        return _ThreadedCursor(self._collection, filter or {}, projection)
+
+    def __getattr__(self, name: str):
+        method = getattr(self._collection, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+        return call
+
+
+class _Repository:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def _list(self, filter: Dict[str, Any], sort: Optional[List[Tuple[str, int]]] = None,
+                    limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        cursor = self.collection.find(filter)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        return await cursor.to_list(length=None)
+
+
+class UserRepository(_Repository):
+    async def get_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"email": email})
+
+    async def create(self, doc: Dict[str, Any]) -> Any:
+        result = await self.collection.insert_one(doc)
+        return result.inserted_id
+
+    async def record_login(self, user_id: Any, when) -> None:
+        await self.collection.update_one({"_id": user_id}, {"$set": {"lastLoginAt": when}, "$inc": {"sessionCount": 1}})
+
+
+class ServiceRepository(_Repository):
+    async def list_all(self) -> List[Dict[str, Any]]:
+        return await self._list({})
+
+    async def list_for_owner(self, owner: str) -> List[Dict[str, Any]]:
+        return await self._list({"owner": owner})
+
+    async def get(self, name: str, owner: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        query = {"name": name}
+        if owner is not None:
+            query["owner"] = owner
+        return await self.collection.find_one(query)
+
+    async def create(self, doc: Dict[str, Any]) -> Any:
+        result = await self.collection.insert_one(doc)
+        return result.inserted_id
+
+    async def update(self, name: str, owner: str, update: Dict[str, Any]) -> int:
+        """Apply an update document; returns the number of matched services."""
+        result = await self.collection.update_one({"name": name, "owner": owner}, update)
+        return result.matched_count
+
+    async def delete(self, name: str, owner: str) -> int:
+        result = await self.collection.delete_one({"name": name, "owner": owner})
+        return result.deleted_count
+
+
+class DatabaseRepository(_Repository):
+    async def list_all(self) -> List[Dict[str, Any]]:
+        return await self._list({})
+
+    async def list_for_owner(self, owner: str) -> List[Dict[str, Any]]:
+        return await self._list({"owner": owner})
+
+    async def get(self, name: str, owner: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"name": name, "owner": owner})
+
+    async def create(self, doc: Dict[str, Any]) -> Any:
+        result = await self.collection.insert_one(doc)
+        return result.inserted_id
+
+    async def delete(self, name: str, owner: str) -> int:
+        result = await self.collection.delete_one({"name": name, "owner": owner})
+        return result.deleted_count
+
+    async def update_health(self, db_id: Any, health: Dict[str, Any]) -> None:
+        await self.collection.update_one({"_id": db_id}, {"$set": health})
+
+
+class LogRepository(_Repository):
+    async def insert_many(self, logs: List[Dict[str, Any]], ordered: bool = False) -> int:
+        if not logs:
+            return 0
+        result = await self.collection.insert_many(logs, ordered=ordered)
+        return len(result.inserted_ids)
+
+    async def insert_one(self, log: Dict[str, Any]) -> Any:
+        result = await self.collection.insert_one(log)
+        return result.inserted_id
+
+    async def page(self, limit: int, service: Optional[str] = None, level: Optional[str] = None,
+                   since: Optional[float] = None, until: Optional[float] = None, text: Optional[str] = None,
+                   before_id: Any = None) -> Tuple[List[Dict[str, Any]], Any]:
+        """Newest-first page of stored logs and the ``_id`` to pass as ``before_id`` for the next page.
+
+        Pages are keyed on ``_id`` (insertion order), so every page is an
+        index range scan however deep it is; ``text`` needs the text index on
+        ``message``.
+        """
+        query: Dict[str, Any] = {}
+        if service:
+            query["service"] = service
+        if level:
+            query["level"] = level.upper()
+        if since is not None or until is not None:
+            query[EPOCH_FIELD] = {}
+            if since is not None:
+                query[EPOCH_FIELD]["$gte"] = since
+            if until is not None:
+                query[EPOCH_FIELD]["$lte"] = until
+        if text:
+            query["$text"] = {"$search": text}
+        if before_id is not None:
+            query["_id"] = {"$lt": before_id}
+        docs = await self._list(query, sort=[("_id", -1)], limit=limit + 1)
+        next_id = docs[limit - 1]["_id"] if len(docs) > limit else None
+        return docs[:limit], next_id
+
+
+class MetricsHistoryRepository(_Repository):
+    async def insert_many(self, docs: List[Dict[str, Any]], ordered: bool = False) -> int:
+        if not docs:
+            return 0
+        result = await self.collection.insert_many(docs, ordered=ordered)
+        return len(result.inserted_ids)
+
+    async def for_service_since(self, service: str, since: str) -> List[Dict[str, Any]]:
+        """History documents of ``service`` with ``timestamp`` >= ``since`` (IST string), oldest first."""
+        return await self._list({"service": service, "timestamp": {"$gte": since}}, sort=[("timestamp", 1)])
+
+    async def by_metric_type(self, service: str, metric_type: str, start, end) -> List[Dict[str, Any]]:
+        return await self._list({
+            "service_name": service,
+            "metric_type": metric_type,
+            "timestamp": {"$gte": start, "$lte": end}
+        }, sort=[("timestamp", 1)])
+
+    async def delete_older_than(self, cutoff) -> int:
+        result = await self.collection.delete_many({"timestamp": {"$lt": cutoff}})
+        return result.deleted_count
+
+
+class Repositories:
+    """Async data access for the monitoring engine's MongoDB collections.
+
+    Uses motor when it is installed; otherwise the synchronous pymongo
+    collections are wrapped so every call runs in a worker thread. Either
+    way request handlers never block the event loop on Mongo.
+    """
+
+    def __init__(self, uri: str, db_name: str, sync_db=None, **client_kwargs):
+        if AsyncIOMotorClient is not None:
+            self.client = AsyncIOMotorClient(uri, **client_kwargs)
+            db = self.client[db_name]
+            wrap = lambda name: db[name]  # noqa: E731
+            self.backend = "motor"
+        else:
+            if sync_db is None:
+                from pymongo import MongoClient
+                sync_db = MongoClient(uri, **client_kwargs)[db_name]
+            self.client = sync_db.client
+            wrap = lambda name: ThreadedCollection(sync_db[name])  # noqa: E731
+            self.backend = "pymongo-threads"
+        self.users = UserRepository(wrap("users"))
+        self.services = ServiceRepository(wrap("registered_services"))
+        self.databases = DatabaseRepository(wrap("registered_databases"))
+        self.logs = LogRepository(wrap("logs"))
+        self.metrics_history = MetricsHistoryRepository(wrap("metrics_history"))
@@ -0,0 +1,141 @@
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from utils.timeparse import log_epoch
+
+# (bucket seconds, retention seconds) for each resolution kept by the rollup engine
+DEFAULT_RESOLUTIONS = (
+    (60, 6 * 3600),
+    (300, 48 * 3600),
+    (3600, 14 * 86400),
+    (86400, 90 * 86400),
+)
+
+
+class RollupBucket:
+    """Aggregated request statistics for one (service, time bucket)."""
+    __slots__ = ("requests", "errors", "latency_sum", "latency_count", "status_codes")
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.status_codes: Dict[str, int] = {}
+
+    def merge(self, other: "RollupBucket") -> None:
+        self.requests += other.requests
+        self.errors += other.errors
+        self.latency_sum += other.latency_sum
+        self.latency_count += other.latency_count
+        for code, n in other.status_codes.items():
+            self.status_codes[code] = self.status_codes.get(code, 0) + n
+
+
+class RollupEngine:
+    """Pre-aggregated time buckets per service at several fixed resolutions.
+
+    Every log updates the bucket it falls into at each resolution (1m, 5m, 1h
+    and 1d by default), so a window/interval query is answered by merging a
+    handful of precomputed buckets instead of re-bucketing raw logs. Buckets
+    older than their resolution's retention are dropped by ``prune``.
+    """
+
+    def __init__(self, resolutions: Tuple[Tuple[int, int], ...] = DEFAULT_RESOLUTIONS):
+        self.resolutions = tuple(sorted(resolutions))
+        # resolution -> service -> bucket start -> RollupBucket
+        self._cubes: Dict[int, Dict[str, Dict[int, RollupBucket]]] = {res: {} for res, _ in self.resolutions}
+
+    def add(self, log: Dict[str, Any]) -> None:
+        ts = log_epoch(log)
+        if ts is None:
+            return
+        service = log.get("service") or "unknown"
+        is_error = log.get("is_error")
+        if is_error is None:
+            is_error = log.get("level") == "ERROR" or "error" in (log.get("message") or "").lower()
+        latency = log.get("latency_ms")
+        if latency is None:
+            latency = log.get("duration_ms")
+        if latency is not None:
+            try:
+                latency = float(latency)
+            except (TypeError, ValueError):
+                latency = None
+        code = str(log.get("status_code"))
+        for res, _ in self.resolutions:
+            buckets = self._cubes[res].get(service)
+            if buckets is None:
+                buckets = self._cubes[res][service] = {}
+            start = int(ts // res) * res
+            bucket = buckets.get(start)
+            if bucket is None:
+                bucket = buckets[start] = RollupBucket()
+            bucket.requests += 1
+            if is_error:
+                bucket.errors += 1
+            if latency is not None:
+                bucket.latency_sum += latency
+                bucket.latency_count += 1
+            bucket.status_codes[code] = bucket.status_codes.get(code, 0) + 1
+
+    def add_many(self, logs: Iterable[Dict[str, Any]]) -> None:
+        for log in logs:
+            self.add(log)
+
+    def prune(self, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        for res, retention in self.resolutions:
+            cutoff = now - retention
+            for buckets in self._cubes[res].values():
+                for start in [s for s in buckets if s + res < cutoff]:
+                    del buckets[start]
+
+    def _pick_resolution(self, window_seconds: int, interval_seconds: int) -> int:
+        """Coarsest resolution that divides the interval, preferring one whose retention covers the window."""
+        fitting = [(res, retention) for res, retention in self.resolutions if interval_seconds % res == 0]
+        if not fitting:
+            return self.resolutions[0][0]
+        covering = [res for res, retention in fitting if retention >= window_seconds]
+        if covering:
+            return covering[-1]
+        return max(fitting, key=lambda r: r[1])[0]
+
+    def query(self, window_seconds: int, interval_seconds: int, service: Optional[str] = None,
+              now: Optional[float] = None) -> Dict[int, RollupBucket]:
+        """Merged buckets keyed by interval start (epoch seconds) covering the last ``window_seconds``."""
+        now = time.time() if now is None else now
+        res = self._pick_resolution(window_seconds, interval_seconds)
+        cube = self._cubes[res]
+        services = [service] if service is not None else list(cube)
+        first = int((now - window_seconds) // res) * res
+        last = int(now // res) * res
+        result: Dict[int, RollupBucket] = {}
+        for name in services:
+            buckets = cube.get(name)
+            if not buckets:
+                continue
+            if (last - first) // res > len(buckets):
+                starts = (s for s in buckets if first <= s <= last)
+            else:
+                starts = range(first, last + res, res)
+            for start in starts:
+                bucket = buckets.get(start)
+                if bucket is None:
+                    continue
+                key = (start // interval_seconds) * interval_seconds
+                merged = result.get(key)
+                if merged is None:
+                    merged = result[key] = RollupBucket()
+                merged.merge(bucket)
+        return result
+
+    def total(self, window_seconds: int, service: Optional[str] = None,
+              now: Optional[float] = None) -> RollupBucket:
+        """Single bucket aggregating everything in the last ``window_seconds``."""
+        covering = [res for res, retention in self.resolutions if retention >= window_seconds]
+        res = covering[0] if covering else self.resolutions[-1][0]
+        merged = RollupBucket()
+        for bucket in self.query(window_seconds, res, service=service, now=now).values():
+            merged.merge(bucket)
+        return merged
@@ -0,0 +1,252 @@
+import asyncio
+import random
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import httpx
+
+
+class ScrapeTarget:
+    """One /metrics endpoint and its scheduling state."""
+    __slots__ = ("name", "url", "owner", "interval", "timeout", "doc", "next_due",
+                 "in_flight", "last_started", "last_duration", "last_error", "scrapes", "failures")
+
+    def __init__(self, name: str, url: str, owner: Optional[str], interval: float, timeout: float,
+                 doc: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.url = url
+        self.owner = owner
+        self.interval = interval
+        self.timeout = timeout
+        self.doc = doc or {}
+        self.next_due = 0.0
+        self.in_flight = False
+        self.last_started: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.scrapes = 0
+        self.failures = 0
+
+    @property
+    def metrics_url(self) -> str:
+        return f"{self.url}/metrics"
+
+
+# on_result(target, response or None, error or None, started_at, duration_seconds)
+ResultHandler = Callable[[ScrapeTarget, Optional[httpx.Response], Optional[str], float, float], Any]
+
+
+class ScrapeScheduler:
+    """Scrapes many /metrics targets concurrently over one pooled HTTP client.
+
+    Every target is scheduled on its own (jittered) interval, so a cycle is no
+    longer a sequential walk over all services: due targets are dispatched as
+    tasks, at most ``max_concurrency`` are in flight at once, and each request
+    is cut off after the target's own timeout. A slow or dead target therefore
+    only costs its own slot. The wall-clock duration of every scrape is kept
+    on the target and passed to ``on_result``.
+
+    ``load_targets`` is a blocking callable returning service documents
+    (``name``, ``url``, ``owner`` and optionally ``scrape_interval`` /
+    ``scrape_timeout`` in seconds); it is run in a worker thread every
+    ``refresh_interval`` seconds.
+
+    At most one scrape per target is in flight: scheduled scrapes and
+    on-demand refreshes (``refresh_stale``) for the same target share it.
+    """
+
+    def __init__(self, load_targets: Callable[[], Iterable[Dict[str, Any]]], on_result: ResultHandler,
+                 default_interval: float = 30.0, default_timeout: float = 5.0, max_concurrency: int = 50,
+                 jitter: float = 0.1, refresh_interval: float = 30.0, max_connections: int = 100):
+        self.load_targets = load_targets
+        self.on_result = on_result
+        self.default_interval = default_interval
+        self.default_timeout = default_timeout
+        self.max_concurrency = max_concurrency
+        self.jitter = jitter
+        self.refresh_interval = refresh_interval
+        self.max_connections = max_connections
+        self.targets: Dict[str, ScrapeTarget] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._last_refresh = 0.0
+
+    # --- Client / targets ---
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            self._client = httpx.AsyncClient(limits=limits, timeout=self.default_timeout)
+        return self._client
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def get_target(self, doc: Dict[str, Any]) -> ScrapeTarget:
+        """The scheduled target for a service document, registering it if it is new."""
+        target = self.targets.get(doc["name"])
+        if target is None:
+            target = self.targets[doc["name"]] = self.make_target(doc)
+            target.next_due = time.time() + random.uniform(0, target.interval)
+        return target
+
+    def make_target(self, doc: Dict[str, Any]) -> ScrapeTarget:
+        return ScrapeTarget(
+            name=doc["name"],
+            url=doc["url"].rstrip("/"),
+            owner=doc.get("owner"),
+            interval=float(doc.get("scrape_interval") or self.default_interval),
+            timeout=float(doc.get("scrape_timeout") or self.default_timeout),
+            doc=doc,
+        )
+
+    def sync_targets(self, docs: Iterable[Dict[str, Any]], now: Optional[float] = None) -> None:
+        """Add new services, drop removed ones and pick up changed URL/interval/timeout."""
+        now = time.time() if now is None else now
+        seen = set()
+        for doc in docs:
+            target = self.make_target(doc)
+            seen.add(target.name)
+            current = self.targets.get(target.name)
+            if current is None:
+                # Spread first scrapes over one interval instead of firing all at once
+                target.next_due = now + random.uniform(0, target.interval)
+                self.targets[target.name] = target
+            else:
+                current.url, current.owner, current.doc = target.url, target.owner, target.doc
+                current.timeout = target.timeout
+                if current.interval != target.interval:
+                    current.interval = target.interval
+                    current.next_due = min(current.next_due, now + target.interval)
+        for name in [n for n in self.targets if n not in seen]:
+            del self.targets[name]
+
+    async def refresh_targets(self) -> None:
+        docs = await asyncio.to_thread(lambda: list(self.load_targets()))
+        self.sync_targets(docs)
+        self._last_refresh = time.time()
+
+    def _next_interval(self, target: ScrapeTarget) -> float:
+        spread = target.interval * self.jitter
+        return target.interval + random.uniform(-spread, spread)
+
+    # --- Scraping ---
+    async def scrape(self, target: ScrapeTarget) -> None:
+        """Scrape a single target (bounded by the concurrency limit) and report the result."""
+        target.in_flight = True
+        try:
+            async with self._get_semaphore():
+                started = time.time()
+                clock = time.perf_counter()
+                response, error = None, None
+                try:
+                    response = await asyncio.wait_for(
+                        self._get_client().get(target.metrics_url, timeout=target.timeout),
+                        timeout=target.timeout,
+                    )
+                except asyncio.TimeoutError:
+                    error = f"Scrape timed out after {target.timeout}s"
+                except Exception as e:
+                    error = str(e) or e.__class__.__name__
+                duration = time.perf_counter() - clock
+            target.scrapes += 1
+            target.last_started = started
+            target.last_duration = duration
+            target.last_error = error if error else (
+                None if response.status_code == 200 else f"Status {response.status_code}")
+            if target.last_error:
+                target.failures += 1
+            result = self.on_result(target, response, error, started, duration)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            print(f"[Scrape Scheduler] Error handling scrape of {target.name}: {e}")
+        finally:
+            target.in_flight = False
+
+    def scrape_shared(self, target: ScrapeTarget) -> asyncio.Task:
+        """Start a scrape of ``target`` or join the one already in flight."""
+        task = self._inflight.get(target.name)
+        if task is None:
+            task = asyncio.create_task(self.scrape(target))
+            self._inflight[target.name] = task
+            task.add_done_callback(lambda _, name=target.name: self._inflight.pop(name, None))
+        return task
+
+    async def refresh_stale(self, docs: Iterable[Dict[str, Any]], max_age: float) -> int:
+        """Re-scrape services whose last scrape is older than ``max_age`` seconds.
+
+        Callers only wait for targets that have never been scraped; targets
+        with stale data are refreshed in the background so the cached values
+        can be served right away. Returns the number of refreshes started or
+        joined.
+        """
+        now = time.time()
+        waiting, refreshed = [], 0
+        for doc in docs:
+            target = self.get_target(doc)
+            if target.last_started is not None and now - target.last_started <= max_age:
+                continue
+            task = self.scrape_shared(target)
+            refreshed += 1
+            if target.last_started is None:
+                waiting.append(task)
+        if waiting:
+            await asyncio.gather(*waiting)
+        return refreshed
+
+    def _dispatch_due(self, now: float) -> None:
+        for target in list(self.targets.values()):
+            if target.in_flight or target.next_due > now:
+                continue
+            target.next_due = now + self._next_interval(target)
+            self.scrape_shared(target)
+
+    async def run(self, tick: float = 1.0) -> None:
+        """Scheduling loop; runs until cancelled, then closes the pooled client."""
+        try:
+            while True:
+                now = time.time()
+                if now - self._last_refresh >= self.refresh_interval:
+                    try:
+                        await self.refresh_targets()
+                    except Exception as e:
+                        print(f"[Scrape Scheduler] Failed to load targets: {e}")
+                        self._last_refresh = now
+                self._dispatch_due(time.time())
+                next_due = min((t.next_due for t in self.targets.values() if not t.in_flight), default=now + tick)
+                await asyncio.sleep(min(max(next_due - time.time(), 0.05), tick))
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        for task in list(self._inflight.values()):
+            task.cancel()
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        targets: List[Dict[str, Any]] = []
+        for t in self.targets.values():
+            targets.append({
+                "name": t.name,
+                "interval_seconds": t.interval,
+                "timeout_seconds": t.timeout,
+                "last_scraped": t.last_started,
+                "last_duration_ms": round(t.last_duration * 1000, 2) if t.last_duration is not None else None,
+                "last_error": t.last_error,
+                "scrapes": t.scrapes,
+                "failures": t.failures,
+            })
+        durations = [t.last_duration for t in self.targets.values() if t.last_duration is not None]
+        return {
+            "targets": len(self.targets),
+            "in_flight": sum(1 for t in self.targets.values() if t.in_flight),
+            "max_concurrency": self.max_concurrency,
+            "max_scrape_duration_ms": round(max(durations) * 1000, 2) if durations else None,
+            "per_target": targets,
+        }
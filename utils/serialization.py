@@ -0,0 +1,106 @@
+import json
+from collections import deque
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Tuple
+
+from fastapi.responses import JSONResponse
+
+# Optional: pip install orjson (preferred) or msgspec; the stdlib json module is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _default(obj: Any) -> Any:
+    """Encode what the JSON libraries don't know natively (ObjectId, sets, deques, ...)."""
+    if isinstance(obj, (set, frozenset, deque)):
+        return list(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return str(obj)
+
+
+def _orjson_backend() -> Tuple[Callable[[Any], Any], Callable[[Any], bytes]]:
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=options)
+    return orjson.loads, dumps
+
+
+def _msgspec_backend() -> Tuple[Callable[[Any], Any], Callable[[Any], bytes]]:
+    encoder = msgspec.json.Encoder(enc_hook=_default)
+    decoder = msgspec.json.Decoder()
+    return decoder.decode, encoder.encode
+
+
+def _stdlib_backend() -> Tuple[Callable[[Any], Any], Callable[[Any], bytes]]:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.loads, dumps
+
+
+_BACKENDS = {
+    "orjson": (lambda: orjson is not None, _orjson_backend),
+    "msgspec": (lambda: msgspec is not None, _msgspec_backend),
+    "json": (lambda: True, _stdlib_backend),
+}
+_PREFERENCE = ("orjson", "msgspec", "json")
+
+# Errors raised by any backend's decoder on malformed input
+DECODE_ERRORS: Tuple[type, ...] = (ValueError,) + ((msgspec.DecodeError,) if msgspec is not None else ())
+
+backend = "json"
+_loads, _dumps = _stdlib_backend()
+
+
+def use_backend(name: str = "auto") -> str:
+    """Select the JSON backend ("auto", "orjson", "msgspec" or "json"); returns the one in use.
+
+    An unavailable choice falls back to the next one in preference order.
+    """
+    global backend, _loads, _dumps
+    name = (name or "auto").lower()
+    candidates = _PREFERENCE if name == "auto" else (name,) + _PREFERENCE
+    for candidate in candidates:
+        entry = _BACKENDS.get(candidate)
+        if entry and entry[0]():
+            backend = candidate
+            _loads, _dumps = entry[1]()
+            return backend
+    return backend
+
+
+def loads(data: Any) -> Any:
+    """Decode JSON from ``str`` or ``bytes`` with the selected backend."""
+    return _loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode ``obj`` to compact UTF-8 JSON bytes with the selected backend."""
+    return _dumps(obj)
+
+
+def available_backends() -> Dict[str, bool]:
+    return {name: entry[0]() for name, entry in _BACKENDS.items()}
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by the selected backend.
+
+    Return it directly from a handler (``return FastJSONResponse(payload)``)
+    to also skip FastAPI's ``jsonable_encoder`` pass, which dominates the
+    cost of large nested responses.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return _dumps(content)
+
+
+use_backend()
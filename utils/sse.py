@@ -0,0 +1,11 @@
+from typing import Any
+
+from utils.serialization import dumps
+
+# Headers for text/event-stream responses: no caching, and no buffering by a reverse proxy (nginx)
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    """One Server-Sent Events message with ``data`` as a single line of JSON."""
+    return b"event: " + event.encode("utf-8") + b"\ndata: " + dumps(data) + b"\n\n"
@@ -0,0 +1,84 @@
+import math
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from dateutil import parser as dateutil_parser
+
+# Field under which the parsed timestamp is stored on each log entry
+EPOCH_FIELD = "timestamp_epoch"
+# Epochs past this (2100-01-01) are taken to be in finer units than seconds
+_MAX_EPOCH = 4102444800.0
+
+
+def _parse_iso(text: str) -> Optional[datetime]:
+    """Fast path for ISO-8601 (with ``Z``) and logging's ``%Y-%m-%d %H:%M:%S,%f`` form."""
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    # Older interpreters reject a trailing Z and comma decimal separators
+    if text.endswith("Z") or "," in text:
+        try:
+            return datetime.fromisoformat(text[:-1] + "+00:00" if text.endswith("Z") else text.replace(",", ".", 1))
+        except ValueError:
+            return None
+    return None
+
+
+def _epoch_seconds(value: float) -> Optional[float]:
+    """``value`` as epoch seconds (millisecond, microsecond and nanosecond epochs are scaled down),
+    or None when it isn't a finite time between 1970 and 2100."""
+    if not math.isfinite(value) or value < 0:
+        return None
+    for _ in range(4):
+        if value < _MAX_EPOCH:
+            return value
+        value /= 1000.0
+    return None
+
+
+def parse_timestamp(value: Any) -> Optional[float]:
+    """Convert a log timestamp to a UTC epoch float (naive timestamps are taken as UTC).
+
+    ISO-8601 strings take the ``datetime.fromisoformat`` fast path; dateutil is
+    only used for formats it can't handle. Numbers are epochs in seconds,
+    milliseconds, microseconds or nanoseconds; anything that doesn't come out
+    as a finite time between 1970 and 2100 gives None.
+    """
+    if value is None or value == "" or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        try:
+            return _epoch_seconds(float(value))
+        except OverflowError:
+            return None
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        text = str(value).strip()
+        dt = _parse_iso(text)
+        if dt is None:
+            try:
+                dt = dateutil_parser.parse(text)
+            except Exception:
+                return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    try:
+        epoch = dt.timestamp()
+    except (OverflowError, OSError, ValueError):
+        return None
+    return epoch if 0 <= epoch < _MAX_EPOCH else None
+
+
+def log_epoch(log: Dict[str, Any]) -> Optional[float]:
+    """Epoch seconds of a log entry's timestamp.
+
+    The value is parsed once and stored on the entry under ``EPOCH_FIELD`` so
+    later filtering and bucketing only compare floats.
+    """
+    if EPOCH_FIELD in log:
+        return log[EPOCH_FIELD]
+    epoch = parse_timestamp(log.get("timestamp"))
+    log[EPOCH_FIELD] = epoch
+    return epoch
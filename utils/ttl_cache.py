@@ -0,0 +1,111 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire ``ttl_seconds`` after they were stored.
+
+    ``get`` refreshes an entry's recency but not its age. With ``path`` set,
+    entries are written to a JSON file on every ``set`` (values must be
+    JSON-serializable) and loaded back at construction, skipping the ones
+    that expired in the meantime, so results survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 600, path: Optional[str] = None,
+                 name: str = "Cache"):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = Path(path) if path else None
+        self.name = name
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (stored_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.path is not None:
+            self._load()
+
+    def get(self, key: str, now: Optional[float] = None) -> Any:
+        """Cached value, or None when missing or expired."""
+        now = time.time() if now is None else now
+        entry = self._entries.get(key)
+        if entry is None or now - entry[0] >= self.ttl_seconds:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value: Any, now: Optional[float] = None) -> None:
+        self._entries[key] = (time.time() if now is None else now, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        if self.path is not None:
+            self._save()
+
+    def age(self, key: str, now: Optional[float] = None) -> Optional[float]:
+        """Seconds since ``key`` was stored, or None if it isn't cached."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return (time.time() if now is None else now) - entry[0]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        if self.path is not None:
+            self._save()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and time.time() - entry[0] < self.ttl_seconds
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"[{self.name}] Could not load {self.path}: {e}")
+            return
+        now = time.time()
+        for key, stored_at, value in data.get("entries", []):
+            if now - stored_at < self.ttl_seconds:
+                self._entries[key] = (stored_at, value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        print(f"[{self.name}] Loaded {len(self._entries)} cached entries from {self.path}")
+
+    def _save(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp, "w") as f:
+                json.dump({"entries": [[key, stored_at, value] for key, (stored_at, value) in self._entries.items()]},
+                          f, default=str)
+            os.replace(tmp, self.path)  # readers never see a half-written file
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[{self.name}] Could not save {self.path}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "persisted_to": str(self.path) if self.path else None,
+        }
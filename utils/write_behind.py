@@ -0,0 +1,192 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from pymongo.errors import BulkWriteError
+except ImportError:
+    BulkWriteError = None
+
+
+class WriteBehindBuffer:
+    """Collects documents in memory and writes them to Mongo in batches.
+
+    Producers ``await put``, which waits up to ``put_timeout`` for room when
+    the buffer is full and so slows them down while Mongo is slow. ``run``
+    flushes with ``insert_many(ordered=False)`` once ``batch_size`` documents
+    are pending or ``flush_interval`` seconds have passed. The blocking
+    pymongo call runs in a worker thread and only one flush is in flight at a
+    time, so a slow database shows up as a growing buffer instead of a
+    stalled event loop.
+    Batches that fail outright are put back at the front of the buffer (as
+    far as room allows) and retried on the next flush.
+    """
+
+    def __init__(self, insert_many: Callable[..., Any], batch_size: int = 500, flush_interval: float = 2.0,
+                 max_pending: int = 20000, put_timeout: float = 1.0, name: str = "write-behind"):
+        self.insert_many = insert_many
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+        self.name = name
+        self._pending = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._room: Optional[asyncio.Condition] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush_ms: Optional[float] = None
+        self.max_flush_ms = 0.0
+        self._flush_ms_total = 0.0
+
+    def _event(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    def _condition(self) -> asyncio.Condition:
+        if self._room is None:
+            self._room = asyncio.Condition()
+        return self._room
+
+    def _lock(self) -> asyncio.Lock:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        return self._flush_lock
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    # --- Producers ---
+    async def put(self, doc: Dict[str, Any]) -> bool:
+        """Queue a document, waiting up to ``put_timeout`` for room; returns False if it was dropped."""
+        if len(self._pending) >= self.max_pending:
+            room = self._condition()
+            try:
+                async with room:
+                    await asyncio.wait_for(room.wait_for(lambda: len(self._pending) < self.max_pending),
+                                           timeout=self.put_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                return False
+        self._pending.append(doc)
+        self.enqueued += 1
+        if len(self._pending) >= self.batch_size:
+            self._event().set()
+        return True
+
+    # --- Flushing ---
+    async def flush(self) -> int:
+        """Write out everything pending (in ``batch_size`` chunks); returns documents written."""
+        written = 0
+        async with self._lock():
+            while self._pending:
+                batch: List[Dict[str, Any]] = []
+                while self._pending and len(batch) < self.batch_size:
+                    batch.append(self._pending.popleft())
+                ok = await self._write(batch)
+                await self._notify_room()
+                if ok is None:
+                    break  # database unavailable; the batch was requeued
+                written += ok
+        return written
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> Optional[int]:
+        started = time.perf_counter()
+        write = asyncio.ensure_future(asyncio.to_thread(self.insert_many, batch, ordered=False))
+        cancelled = False
+        try:
+            try:
+                await asyncio.shield(write)
+            except asyncio.CancelledError:
+                # The thread keeps going regardless; wait for it so the batch is accounted for
+                cancelled = True
+                await write
+            inserted = len(batch)
+        except Exception as e:
+            if BulkWriteError is not None and isinstance(e, BulkWriteError):
+                # ordered=False: everything except the rejected documents was written
+                rejected = len(e.details.get("writeErrors", []))
+                inserted = len(batch) - rejected
+                self.failed += rejected
+            else:
+                self.flush_errors += 1
+                print(f"[{self.name}] Flush of {len(batch)} documents failed: {e}")
+                self._requeue(batch)
+                self._record_latency(started)
+                if cancelled:
+                    raise asyncio.CancelledError()
+                return None
+        self.written += inserted
+        self.flushes += 1
+        self._record_latency(started)
+        if cancelled:
+            raise asyncio.CancelledError()
+        return inserted
+
+    def _requeue(self, batch: List[Dict[str, Any]]) -> None:
+        room = max(self.max_pending - len(self._pending), 0)
+        keep = batch[len(batch) - room:] if room < len(batch) else batch
+        self.dropped += len(batch) - len(keep)
+        self._pending.extendleft(reversed(keep))
+
+    def _record_latency(self, started: float) -> None:
+        elapsed = (time.perf_counter() - started) * 1000
+        self.last_flush_ms = round(elapsed, 2)
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+        self._flush_ms_total += elapsed
+
+    async def _notify_room(self) -> None:
+        if self._room is not None:
+            async with self._room:
+                self._room.notify_all()
+
+    async def run(self) -> None:
+        """Flush loop; runs until cancelled and then writes out what is left."""
+        wakeup = self._event()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear()
+                if self._pending:
+                    before = self.flush_errors
+                    await self.flush()
+                    if self.flush_errors > before:
+                        # Back off instead of hammering a database that just failed
+                        await asyncio.sleep(self.flush_interval)
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        if self._pending:
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[{self.name}] Final flush failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        attempts = self.flushes + self.flush_errors
+        return {
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "batch_size": self.batch_size,
+            "flush_interval_seconds": self.flush_interval,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self._flush_ms_total / attempts, 2) if attempts else None,
+        }